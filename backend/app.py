@@ -1,31 +1,138 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import os
 import sys
 import json
+import time
 import logging
 
-# Add the parent directory to the path so we can import our utils
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Put the parent directory first on the path so we import the shared utils package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Import our existing utility modules
-from utils.database import init_db, save_research_project, get_research_projects, get_project_details, delete_project
-from utils.persona_generator import generate_personas
-from utils.focus_group import simulate_focus_group
+from utils.database import (
+    migrate, check_schema, SchemaOutOfDateError, save_research_project, get_research_projects_page,
+    get_project_details, delete_project, get_pool_stats, get_persona_panels, get_persona_panel,
+    get_persona_panel_stats, get_usage_summary, DEFAULT_PAGE_SIZE, DEFAULT_PREVIEW_LENGTH
+)
+from utils.persona_generator import get_or_generate_personas
+from utils.focus_group import simulate_focus_group, stream_focus_group
 from utils.analysis import analyze_transcript
-from utils.openai_service import validate_api_key
+from utils.pipeline import run_research_pipeline, run_research_batch, STAGES, BATCH_STAGES, BATCH_MAX_COMBINATIONS
+from utils.usage import usage_context, new_run_id, usage_ledger, get_usage_ledger_stats
+from utils.metrics import counter, gauge, histogram, render_metrics, instrument_sqlalchemy, CONTENT_TYPE
+from utils.jobs import get_job_manager, JobQueueFullError, STATUS_COMPLETED, STATUS_FAILED
+from utils.openai_service import (
+    validate_api_key, get_api_key_cache_stats, get_client_pool_stats, get_response_cache_stats,
+    get_retry_stats, get_rate_limit_stats
+)
+
+# Request metrics, exposed on /metrics
+REQUEST_DURATION = histogram("http_request_duration_seconds", "Duration of HTTP requests", ("route", "method"))
+REQUESTS_TOTAL = counter("http_requests_total", "HTTP requests by status code", ("route", "method", "status"))
+REQUEST_ERRORS = counter("http_request_errors_total", "HTTP requests that failed with a 5xx status", ("route",))
+REQUESTS_IN_FLIGHT = gauge("http_requests_in_flight", "HTTP requests currently being handled")
+JSON_DURATION = histogram(
+    "json_serialization_duration_seconds", "Time spent serializing JSON responses",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+)
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider that records how long jsonify spends serializing"""
+    
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            JSON_DURATION.observe(time.perf_counter() - started)
 
 # Initialize Flask app
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 CORS(app)  # Enable CORS for all routes
 
+# Time every database statement, and report the connection pool with the metrics
+instrument_sqlalchemy()
+gauge("db_pool_checked_out", "Database connections currently checked out").set_function(
+    lambda: get_pool_stats()["checked_out"]
+)
+gauge("db_pool_overflow", "Database connections open beyond the pool size").set_function(
+    lambda: get_pool_stats()["overflow"]
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Initialize database
-init_db()
+# Schema check at startup: "warn" (default) logs pending migrations, "strict" refuses
+# to start, "migrate" applies them, and "off" skips the check
+DB_SCHEMA_CHECK = os.environ.get("DB_SCHEMA_CHECK", "warn")
+
+def _check_database_schema():
+    """Check (or migrate) the database schema according to DB_SCHEMA_CHECK"""
+    if DB_SCHEMA_CHECK == "off":
+        return
+    if DB_SCHEMA_CHECK == "migrate":
+        applied = migrate()
+        if applied:
+            logger.info(f"Applied database migrations: {applied}")
+        return
+    try:
+        check_schema()
+    except SchemaOutOfDateError as e:
+        if DB_SCHEMA_CHECK == "strict":
+            raise
+        logger.warning(str(e))
+
+_check_database_schema()
+
+def _optional_bool(value):
+    """Interpret an optional boolean request field, where None means use the default"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+def _persona_panel_stats():
+    """Persona panel library statistics, or the error if the database is unavailable"""
+    try:
+        return get_persona_panel_stats()
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.before_request
+def _start_request_timer():
+    g.metrics_started = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc()
+
+@app.after_request
+def _record_request_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def _record_request_metrics(exception=None):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return
+    REQUESTS_IN_FLIGHT.dec()
+    
+    # The URL rule, not the path, so that IDs in the path do not create new series;
+    # a streamed response is timed until its body has been sent
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    status = 500 if exception is not None else g.pop('metrics_status', 500)
+    REQUEST_DURATION.labels(route, request.method).observe(time.perf_counter() - started)
+    REQUESTS_TOTAL.labels(route, request.method, status).inc()
+    if status >= 500:
+        REQUEST_ERRORS.labels(route).inc()
+
+def _sse_event(event, data):
+    """Format a server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 # Default route
 @app.route('/')
@@ -35,16 +142,49 @@ def index():
         "version": "1.0.0"
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose request, pipeline, OpenAI and database metrics in the Prometheus text format"""
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
 # API Routes
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Get runtime statistics for caches and connection pools"""
+    return jsonify({
+        "success": True,
+        "api_key_cache": get_api_key_cache_stats(),
+        "openai_clients": get_client_pool_stats(),
+        "response_cache": get_response_cache_stats(),
+        "retries": get_retry_stats(),
+        "rate_limits": get_rate_limit_stats(),
+        "jobs": get_job_manager().stats(),
+        "database_pool": get_pool_stats(),
+        "persona_panels": _persona_panel_stats(),
+        "usage_ledger": get_usage_ledger_stats()
+    })
+
 @app.route('/api/projects', methods=['GET'])
 def get_projects():
-    """Get all saved research projects"""
+    """Get a page of saved research projects, newest first"""
     try:
-        projects = get_research_projects()
+        fields = request.args.get('fields')
+        page = get_research_projects_page(
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+            cursor=request.args.get('cursor'),
+            fields=fields.split(',') if fields else None,
+            preview_length=request.args.get('preview', DEFAULT_PREVIEW_LENGTH, type=int)
+        )
         return jsonify({
             "success": True,
-            "projects": projects
+            "projects": page['projects'],
+            "next_cursor": page['next_cursor']
         })
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Error getting projects: {str(e)}")
         return jsonify({
@@ -110,6 +250,7 @@ def create_project():
         personas = data.get('personas', [])
         transcript = data.get('transcript', '')
         analysis = data.get('analysis', {})
+        run_ids = data.get('run_ids') or ([data['run_id']] if data.get('run_id') else [])
         
         # Validate required fields
         if not all([name, product_concept, target_segment]):
@@ -126,7 +267,8 @@ def create_project():
             research_questions=research_questions,
             personas=personas,
             transcript=transcript,
-            analysis=analysis
+            analysis=analysis,
+            run_ids=run_ids
         )
         
         return jsonify({
@@ -141,6 +283,74 @@ def create_project():
             "error": str(e)
         }), 500
 
+@app.route('/api/usage/<group_by>', methods=['GET'])
+def get_usage(group_by):
+    """Aggregate recorded OpenAI usage by project, day, key, stage or model, broken down by stage"""
+    try:
+        # Include calls still waiting to be written
+        usage_ledger.flush()
+        usage = get_usage_summary(
+            group_by=group_by,
+            days=request.args.get('days', type=int),
+            project_id=request.args.get('project_id', type=int),
+            key_hash=request.args.get('key_hash')
+        )
+        return jsonify({
+            "success": True,
+            "group_by": group_by,
+            "usage": usage
+        })
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Error getting usage: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/persona-panels', methods=['GET'])
+def list_persona_panels():
+    """List stored persona panels, most reused first"""
+    try:
+        panels = get_persona_panels(limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int))
+        return jsonify({
+            "success": True,
+            "panels": panels,
+            "stats": get_persona_panel_stats()
+        })
+    except Exception as e:
+        logger.error(f"Error getting persona panels: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/persona-panels/<int:panel_id>', methods=['GET'])
+def get_persona_panel_details(panel_id):
+    """Get a stored persona panel with its personas"""
+    try:
+        panel = get_persona_panel(panel_id)
+        if not panel:
+            return jsonify({
+                "success": False,
+                "error": "Persona panel not found"
+            }), 404
+        
+        return jsonify({
+            "success": True,
+            "panel": panel
+        })
+    except Exception as e:
+        logger.error(f"Error getting persona panel: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
 @app.route('/api/generate/personas', methods=['POST'])
 def create_personas():
     """Generate personas based on target segment"""
@@ -155,8 +365,7 @@ def create_personas():
                 "error": "Missing API key"
             }), 401
         
-        os.environ['OPENAI_API_KEY'] = api_key
-        valid_api_key = validate_api_key()
+        valid_api_key = validate_api_key(api_key)
         if not valid_api_key:
             return jsonify({
                 "success": False,
@@ -174,13 +383,19 @@ def create_personas():
                 "error": "Missing target segment"
             }), 400
             
-        # Generate personas
-        personas, token_count = generate_personas(target_segment, num_personas)
+        # Generate personas, or reuse a stored panel for the same segment
+        run_id = data.get('run_id') or new_run_id()
+        with usage_context(stage="personas", run_id=run_id):
+            personas, token_count, panel = get_or_generate_personas(
+                target_segment, num_personas, api_key=api_key, reuse=_optional_bool(data.get('reuse_panel'))
+            )
         
         return jsonify({
             "success": True,
+            "run_id": run_id,
             "personas": personas,
-            "token_count": token_count
+            "token_count": token_count,
+            "persona_panel": panel
         })
     except Exception as e:
         logger.error(f"Error generating personas: {str(e)}")
@@ -203,8 +418,7 @@ def create_focus_group():
                 "error": "Missing API key"
             }), 401
         
-        os.environ['OPENAI_API_KEY'] = api_key
-        valid_api_key = validate_api_key()
+        valid_api_key = validate_api_key(api_key)
         if not valid_api_key:
             return jsonify({
                 "success": False,
@@ -213,21 +427,38 @@ def create_focus_group():
             
         # Extract data
         personas = data.get('personas')
+        panel_id = data.get('panel_id')
         product_concept = data.get('product_concept')
         research_questions = data.get('research_questions')
+        parallel = bool(data.get('parallel', False))
+        
+        # A stored persona panel can be referenced instead of sending the personas
+        if not personas and panel_id is not None:
+            panel = get_persona_panel(int(panel_id))
+            if not panel:
+                return jsonify({
+                    "success": False,
+                    "error": "Persona panel not found"
+                }), 404
+            personas = panel['personas']
         
         # Validate data
         if not all([personas, product_concept, research_questions]):
             return jsonify({
                 "success": False,
-                "error": "Missing required fields: personas, product_concept, research_questions"
+                "error": "Missing required fields: personas (or panel_id), product_concept, research_questions"
             }), 400
             
         # Generate focus group transcript
-        transcript, token_count = simulate_focus_group(personas, product_concept, research_questions)
+        run_id = data.get('run_id') or new_run_id()
+        with usage_context(stage="focus_group", run_id=run_id):
+            transcript, token_count = simulate_focus_group(
+                personas, product_concept, research_questions, api_key=api_key, parallel=parallel
+            )
         
         return jsonify({
             "success": True,
+            "run_id": run_id,
             "transcript": transcript,
             "token_count": token_count
         })
@@ -238,6 +469,69 @@ def create_focus_group():
             "error": str(e)
         }), 500
 
+@app.route('/api/generate/focus-group/stream', methods=['POST'])
+def stream_focus_group_transcript():
+    """Simulate a focus group discussion, streaming the transcript as server-sent events"""
+    try:
+        data = request.json
+        api_key = request.headers.get('X-API-KEY')
+        
+        # Validate API key
+        if not api_key:
+            return jsonify({
+                "success": False,
+                "error": "Missing API key"
+            }), 401
+        
+        valid_api_key = validate_api_key(api_key)
+        if not valid_api_key:
+            return jsonify({
+                "success": False,
+                "error": "Invalid OpenAI API key"
+            }), 401
+            
+        # Extract data
+        personas = data.get('personas')
+        product_concept = data.get('product_concept')
+        research_questions = data.get('research_questions')
+        run_id = data.get('run_id') or new_run_id()
+        
+        # Validate data
+        if not all([personas, product_concept, research_questions]):
+            return jsonify({
+                "success": False,
+                "error": "Missing required fields: personas, product_concept, research_questions"
+            }), 400
+    except Exception as e:
+        logger.error(f"Error starting focus group stream: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+    
+    def generate_events():
+        # "chunk" events carry transcript text as it is generated; the final "done"
+        # event carries the assembled transcript and token count
+        try:
+            with usage_context(stage="focus_group", run_id=run_id):
+                for event in stream_focus_group(personas, product_concept, research_questions, api_key=api_key):
+                    event_type = event.pop("type")
+                    if event_type == "done":
+                        event["run_id"] = run_id
+                    yield _sse_event(event_type, event)
+        except Exception as e:
+            logger.error(f"Error streaming focus group: {str(e)}")
+            yield _sse_event("error", {"error": str(e)})
+    
+    return Response(
+        stream_with_context(generate_events()),
+        mimetype='text/event-stream',
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
 @app.route('/api/generate/analysis', methods=['POST'])
 def create_analysis():
     """Analyze focus group transcript"""
@@ -252,8 +546,7 @@ def create_analysis():
                 "error": "Missing API key"
             }), 401
         
-        os.environ['OPENAI_API_KEY'] = api_key
-        valid_api_key = validate_api_key()
+        valid_api_key = validate_api_key(api_key)
         if not valid_api_key:
             return jsonify({
                 "success": False,
@@ -273,10 +566,15 @@ def create_analysis():
             }), 400
             
         # Generate analysis
-        analysis, token_count = analyze_transcript(transcript, product_concept, research_questions)
+        run_id = data.get('run_id') or new_run_id()
+        with usage_context(stage="analysis", run_id=run_id):
+            analysis, token_count = analyze_transcript(
+                transcript, product_concept, research_questions, api_key=api_key, chunked=_optional_bool(data.get('chunked'))
+            )
         
         return jsonify({
             "success": True,
+            "run_id": run_id,
             "analysis": analysis,
             "token_count": token_count
         })
@@ -301,8 +599,7 @@ def generate_complete_research():
                 "error": "Missing API key"
             }), 401
         
-        os.environ['OPENAI_API_KEY'] = api_key
-        valid_api_key = validate_api_key()
+        valid_api_key = validate_api_key(api_key)
         if not valid_api_key:
             return jsonify({
                 "success": False,
@@ -321,32 +618,17 @@ def generate_complete_research():
                 "error": "Missing required fields: target_segment, product_concept, research_questions"
             }), 400
         
-        # Generate personas
-        logger.info("Generating personas...")
-        personas, personas_tokens = generate_personas(target_segment)
-        
-        # Generate focus group transcript
-        logger.info("Simulating focus group...")
-        transcript, focus_group_tokens = simulate_focus_group(personas, product_concept, research_questions)
-        
-        # Generate analysis
-        logger.info("Analyzing transcript...")
-        analysis, analysis_tokens = analyze_transcript(transcript, product_concept, research_questions)
-        
-        # Combine token counts
-        token_count = {
-            "personas": personas_tokens,
-            "focus_group": focus_group_tokens,
-            "analysis": analysis_tokens,
-            "total": personas_tokens + focus_group_tokens + analysis_tokens
-        }
+        # Run personas, focus group, and analysis
+        result = run_research_pipeline(
+            target_segment, product_concept, research_questions,
+            api_key=api_key, parallel=bool(data.get('parallel', False)),
+            reuse_panel=_optional_bool(data.get('reuse_panel')), panel_id=data.get('panel_id'),
+            run_id=data.get('run_id')
+        )
         
         return jsonify({
             "success": True,
-            "personas": personas,
-            "transcript": transcript,
-            "analysis": analysis,
-            "token_count": token_count
+            **result
         })
     except Exception as e:
         logger.error(f"Error generating complete research: {str(e)}")
@@ -355,6 +637,196 @@ def generate_complete_research():
             "error": str(e)
         }), 500
 
+@app.route('/api/jobs/research', methods=['POST'])
+def submit_research_job():
+    """Queue complete research generation and return a job id immediately"""
+    try:
+        data = request.json
+        api_key = request.headers.get('X-API-KEY')
+        
+        # Validate API key
+        if not api_key:
+            return jsonify({
+                "success": False,
+                "error": "Missing API key"
+            }), 401
+        
+        valid_api_key = validate_api_key(api_key)
+        if not valid_api_key:
+            return jsonify({
+                "success": False,
+                "error": "Invalid OpenAI API key"
+            }), 401
+            
+        # Extract data
+        target_segment = data.get('target_segment')
+        product_concept = data.get('product_concept')
+        research_questions = data.get('research_questions')
+        num_personas = int(data.get('num_personas', 5))
+        
+        # Validate data
+        if not all([target_segment, product_concept, research_questions]):
+            return jsonify({
+                "success": False,
+                "error": "Missing required fields: target_segment, product_concept, research_questions"
+            }), 400
+        
+        job_id = get_job_manager().submit(
+            "research",
+            run_research_pipeline,
+            STAGES,
+            target_segment=target_segment,
+            product_concept=product_concept,
+            research_questions=research_questions,
+            num_personas=num_personas,
+            api_key=api_key,
+            parallel=bool(data.get('parallel', False)),
+            reuse_panel=_optional_bool(data.get('reuse_panel')),
+            panel_id=data.get('panel_id'),
+            run_id=data.get('run_id')
+        )
+        
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "status_url": f"/api/jobs/{job_id}"
+        }), 202
+    except JobQueueFullError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 503
+    except Exception as e:
+        logger.error(f"Error submitting research job: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/jobs/research/batch', methods=['POST'])
+def submit_research_batch_job():
+    """Queue research for every product concept against every target segment as one job"""
+    try:
+        data = request.json
+        api_key = request.headers.get('X-API-KEY')
+        
+        # Validate API key once for the whole batch
+        if not api_key:
+            return jsonify({
+                "success": False,
+                "error": "Missing API key"
+            }), 401
+        
+        valid_api_key = validate_api_key(api_key)
+        if not valid_api_key:
+            return jsonify({
+                "success": False,
+                "error": "Invalid OpenAI API key"
+            }), 401
+            
+        # Extract data
+        product_concepts = data.get('product_concepts')
+        target_segments = data.get('target_segments')
+        research_questions = data.get('research_questions')
+        num_personas = int(data.get('num_personas', 5))
+        max_concurrency = data.get('max_concurrency')
+        
+        # Validate data
+        if not all([product_concepts, target_segments, research_questions]):
+            return jsonify({
+                "success": False,
+                "error": "Missing required fields: product_concepts, target_segments, research_questions"
+            }), 400
+        
+        if not isinstance(product_concepts, list) or not isinstance(target_segments, list):
+            return jsonify({
+                "success": False,
+                "error": "product_concepts and target_segments must be lists"
+            }), 400
+        
+        combinations = len(product_concepts) * len(target_segments)
+        if combinations > BATCH_MAX_COMBINATIONS:
+            return jsonify({
+                "success": False,
+                "error": f"A batch may contain at most {BATCH_MAX_COMBINATIONS} combinations, got {combinations}"
+            }), 400
+        
+        job_id = get_job_manager().submit(
+            "research_batch",
+            run_research_batch,
+            BATCH_STAGES,
+            product_concepts=product_concepts,
+            target_segments=target_segments,
+            research_questions=research_questions,
+            num_personas=num_personas,
+            api_key=api_key,
+            parallel=bool(data.get('parallel', False)),
+            max_concurrency=int(max_concurrency) if max_concurrency else None,
+            reuse_panel=_optional_bool(data.get('reuse_panel'))
+        )
+        
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "combinations": combinations,
+            "status_url": f"/api/jobs/{job_id}"
+        }), 202
+    except JobQueueFullError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 503
+    except Exception as e:
+        logger.error(f"Error submitting research batch job: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the status, per-stage progress and (when finished) result of a job"""
+    job = get_job_manager().get(job_id)
+    if not job:
+        return jsonify({
+            "success": False,
+            "error": "Job not found"
+        }), 404
+    
+    return jsonify({
+        "success": True,
+        "job": job
+    })
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Get the result of a finished job"""
+    job = get_job_manager().get(job_id)
+    if not job:
+        return jsonify({
+            "success": False,
+            "error": "Job not found"
+        }), 404
+    
+    if job['status'] == STATUS_FAILED:
+        return jsonify({
+            "success": False,
+            "status": job['status'],
+            "error": job['error']
+        }), 500
+    
+    if job['status'] != STATUS_COMPLETED:
+        return jsonify({
+            "success": False,
+            "status": job['status'],
+            "error": "Job has not finished yet"
+        }), 409
+    
+    return jsonify({
+        "success": True,
+        **job['result']
+    })
+
 # Run the app
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5001, debug=True, threaded=True)
\ No newline at end of file
@@ -4,14 +4,10 @@ Script to delete a research project from the database.
 Called by the Express.js server to leverage our Python database implementation.
 """
 
-import os
 import sys
 import json
 
-# Add parent directories to path to import utils
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-
-from utils.database import delete_project
+from worker_client import call
 
 def main():
     try:
@@ -23,7 +19,7 @@ def main():
         project_id = int(sys.argv[1])
         
         # Delete the project
-        success = delete_project(project_id)
+        success = call("delete_project", {"project_id": project_id})["success"]
         
         # Return the result as JSON
         print(json.dumps({"success": success}))
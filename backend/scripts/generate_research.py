@@ -2,28 +2,43 @@
 """
 Script to generate complete market research using existing Python business logic.
 Called by the Express.js server to leverage our Python AI capabilities.
+
+Usage: generate_research.py [--input PATH | --input - | --input-fd FD] [--ndjson]
+
+The input JSON holds target_segment, product_concept and research_questions; any
+of them missing are taken from the TARGET_SEGMENT, PRODUCT_CONCEPT and
+RESEARCH_QUESTIONS environment variables. The API key is read from OPENAI_API_KEY.
+
+With --ndjson the result is written as newline-delimited JSON events while the
+pipeline runs: "stage" progress events, then "personas", "transcript" and
+"analysis" as each stage completes, and finally "done" with the token counts.
 """
 
 import os
 import sys
 import json
+import argparse
 
-# Add parent directories to path to import utils
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-
-from utils.persona_generator import generate_personas
-from utils.focus_group import simulate_focus_group
-from utils.analysis import analyze_transcript
+from worker_client import call
+from script_io import add_input_arguments, load_input, write_json, write_event
 
 def main():
-    # Get parameters from environment variables
-    api_key = os.environ.get('OPENAI_API_KEY')
-    target_segment = os.environ.get('TARGET_SEGMENT')
-    product_concept = os.environ.get('PRODUCT_CONCEPT')
-    research_questions = json.loads(os.environ.get('RESEARCH_QUESTIONS', '[]'))
+    parser = argparse.ArgumentParser(description="Generate personas, a focus group and its analysis")
+    add_input_arguments(parser)
+    parser.add_argument("--ndjson", action="store_true",
+                        help="write newline-delimited JSON events as each stage completes")
+    args = parser.parse_args()
     
-    # Set API key
-    os.environ['OPENAI_API_KEY'] = api_key
+    # Get parameters from the selected input, falling back to environment variables
+    try:
+        inputs = load_input(args) or {}
+    except ValueError as e:
+        sys.stderr.write(f"Error: Invalid input JSON: {str(e)}\n")
+        sys.exit(1)
+    api_key = os.environ.get('OPENAI_API_KEY')
+    target_segment = inputs.get('target_segment') or os.environ.get('TARGET_SEGMENT')
+    product_concept = inputs.get('product_concept') or os.environ.get('PRODUCT_CONCEPT')
+    research_questions = inputs.get('research_questions') or json.loads(os.environ.get('RESEARCH_QUESTIONS', '[]'))
     
     # Validate parameters
     if not api_key:
@@ -39,37 +54,30 @@ def main():
         sys.stderr.write("Error: RESEARCH_QUESTIONS not provided or empty\n")
         sys.exit(1)
     
+    params = {
+        "target_segment": target_segment,
+        "product_concept": product_concept,
+        "research_questions": research_questions,
+        "api_key": api_key
+    }
+    for option in ("reuse_panel", "panel_id"):
+        if inputs.get(option) is not None:
+            params[option] = inputs[option]
+    
     try:
-        # Generate personas
-        personas, personas_tokens = generate_personas(target_segment)
-        
-        # Generate focus group transcript
-        transcript, focus_group_tokens = simulate_focus_group(personas, product_concept, research_questions)
-        
-        # Generate analysis
-        analysis, analysis_tokens = analyze_transcript(transcript, product_concept, research_questions)
-        
-        # Combine token counts
-        token_count = {
-            "personas": personas_tokens,
-            "focus_group": focus_group_tokens,
-            "analysis": analysis_tokens,
-            "total": personas_tokens + focus_group_tokens + analysis_tokens
-        }
-        
-        # Return the results as JSON
-        result = {
-            "personas": personas,
-            "transcript": transcript,
-            "analysis": analysis,
-            "token_count": token_count
-        }
-        
-        print(json.dumps(result))
+        # Run personas, focus group, and analysis
+        if args.ndjson:
+            result = call("generate_research", dict(params, stream=True), on_event=write_event)
+            write_event({"type": "done", "token_count": result["token_count"],
+                         "persona_panel": result.get("persona_panel"), "run_id": result.get("run_id")})
+        else:
+            write_json(call("generate_research", params))
         
     except Exception as e:
+        if args.ndjson:
+            write_event({"type": "error", "error": str(e)})
         sys.stderr.write(f"Error: {str(e)}\n")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
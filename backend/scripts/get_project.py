@@ -4,14 +4,10 @@ Script to retrieve details of a specific research project from the database.
 Called by the Express.js server to access the database.
 """
 
-import os
 import sys
-import json
 
-# Add parent directories to path to import utils
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-
-from utils.database import get_project_details
+from worker_client import call
+from script_io import write_json
 
 def main():
     try:
@@ -23,7 +19,7 @@ def main():
         project_id = int(sys.argv[1])
         
         # Get project details
-        project = get_project_details(project_id)
+        project = call("get_project", {"project_id": project_id})
         
         if not project:
             # Return empty JSON if project not found
@@ -31,7 +27,7 @@ def main():
             sys.exit(0)
             
         # Return the results as JSON
-        print(json.dumps(project))
+        write_json(project)
         
     except Exception as e:
         sys.stderr.write(f"Error: {str(e)}\n")
@@ -1,29 +1,42 @@
 #!/usr/bin/env python
 """
-Script to retrieve all saved research projects from the database.
+Script to retrieve a page of saved research projects from the database.
 Called by the Express.js server to access the database.
+
+Usage: get_projects.py [--limit N] [--cursor CURSOR] [--fields id,name,...] [--preview N]
 """
 
-import os
 import sys
 import json
+import argparse
 
-# Add parent directories to path to import utils
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-
-from utils.database import get_research_projects
+from worker_client import call
 
 def main():
+    parser = argparse.ArgumentParser(description="List saved research projects, newest first")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--cursor")
+    parser.add_argument("--fields", help="comma-separated fields to include")
+    parser.add_argument("--preview", type=int,
+                        help="maximum characters of long text fields (0 for full text)")
+    args = parser.parse_args()
+    
     try:
-        # Get all projects
-        projects = get_research_projects()
+        # Get one page of projects
+        options = {
+            "limit": args.limit,
+            "cursor": args.cursor,
+            "fields": args.fields.split(',') if args.fields else None,
+            "preview": args.preview
+        }
+        page = call("get_projects", {key: value for key, value in options.items() if value is not None})
         
         # Return the results as JSON
-        print(json.dumps(projects))
+        print(json.dumps(page))
         
     except Exception as e:
         sys.stderr.write(f"Error: {str(e)}\n")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Script to aggregate recorded OpenAI usage from the database.
+Called by the Express.js server to access the database.
+
+Usage: get_usage.py GROUP_BY [--days N] [--project-id ID] [--key-hash HASH]
+
+GROUP_BY is one of project, day, key, stage or model.
+"""
+
+import sys
+import json
+import argparse
+
+from worker_client import call
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate recorded OpenAI usage, broken down by stage")
+    parser.add_argument("group_by")
+    parser.add_argument("--days", type=int)
+    parser.add_argument("--project-id", type=int)
+    parser.add_argument("--key-hash")
+    args = parser.parse_args()
+    
+    try:
+        options = {
+            "group_by": args.group_by,
+            "days": args.days,
+            "project_id": args.project_id,
+            "key_hash": args.key_hash
+        }
+        usage = call("get_usage", {key: value for key, value in options.items() if value is not None})
+        
+        # Return the results as JSON
+        print(json.dumps(usage))
+        
+    except Exception as e:
+        sys.stderr.write(f"Error: {str(e)}\n")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Script to bring the database schema up to date.
+Run once per deployment (and before first use) instead of on every import.
+Also downloads the NLTK VADER lexicon used for turn sentiment if it is missing
+(unless NLTK_AUTO_DOWNLOAD=0), so requests never download it.
+
+Usage: migrate_db.py [--check] [--target VERSION]
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# Add parent directories to path to import utils
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.database import migrate, get_schema_version, SCHEMA_VERSION
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending database schema migrations")
+    parser.add_argument("--check", action="store_true",
+                        help="only report the schema version; exit 1 if migrations are pending")
+    parser.add_argument("--target", type=int, help="version to migrate to (defaults to the latest)")
+    args = parser.parse_args()
+    
+    try:
+        if args.check:
+            version = get_schema_version()
+            print(json.dumps({"version": version, "latest": SCHEMA_VERSION, "up_to_date": version >= SCHEMA_VERSION}))
+            sys.exit(0 if version >= SCHEMA_VERSION else 1)
+        
+        # Apply pending migrations
+        applied = migrate(target=args.target)
+        
+        # Install the sentiment lexicon; turn sentiment is skipped without it
+        from utils.analysis import download_sentiment_lexicon
+        sentiment_lexicon = download_sentiment_lexicon()
+        
+        # Return the result as JSON
+        print(json.dumps({"success": True, "applied": applied, "version": get_schema_version(),
+                          "sentiment_lexicon": sentiment_lexicon}))
+        
+    except Exception as e:
+        sys.stderr.write(f"Error: {str(e)}\n")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
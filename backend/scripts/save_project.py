@@ -2,27 +2,31 @@
 """
 Script to save a research project to the database.
 Called by the Express.js server to leverage our Python database implementation.
+
+Usage: save_project.py [--input PATH | --input - | --input-fd FD]
+
+The project JSON is read from a file, stdin or an inherited file descriptor, or
+from the PROJECT_DATA environment variable when none of these is given.
 """
 
-import os
 import sys
 import json
+import argparse
 
-# Add parent directories to path to import utils
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-
-from utils.database import save_research_project
+from worker_client import call
+from script_io import add_input_arguments, load_input
 
 def main():
+    parser = argparse.ArgumentParser(description="Save a research project")
+    add_input_arguments(parser)
+    args = parser.parse_args()
+    
     try:
-        # Get project data from environment variable
-        project_data_str = os.environ.get('PROJECT_DATA')
-        if not project_data_str:
-            sys.stderr.write("Error: PROJECT_DATA not provided\n")
+        # Get project data from the selected input
+        project_data = load_input(args, env_var='PROJECT_DATA')
+        if not project_data:
+            sys.stderr.write("Error: Project data not provided (use --input or PROJECT_DATA)\n")
             sys.exit(1)
-            
-        # Parse project data
-        project_data = json.loads(project_data_str)
         
         # Extract fields
         name = project_data.get('name')
@@ -32,6 +36,7 @@ def main():
         personas = project_data.get('personas', [])
         transcript = project_data.get('transcript', '')
         analysis = project_data.get('analysis', {})
+        run_ids = project_data.get('run_ids') or ([project_data['run_id']] if project_data.get('run_id') else [])
         
         # Validate required fields
         if not name or not product_concept or not target_segment:
@@ -39,15 +44,16 @@ def main():
             sys.exit(1)
             
         # Save the project
-        project_id = save_research_project(
-            name=name,
-            product_concept=product_concept,
-            target_segment=target_segment,
-            research_questions=research_questions,
-            personas=personas,
-            transcript=transcript,
-            analysis=analysis
-        )
+        project_id = call("save_project", {
+            "name": name,
+            "product_concept": product_concept,
+            "target_segment": target_segment,
+            "research_questions": research_questions,
+            "personas": personas,
+            "transcript": transcript,
+            "analysis": analysis,
+            "run_ids": run_ids
+        })["project_id"]
         
         # Return the project ID as JSON
         print(json.dumps({"project_id": project_id}))
@@ -57,4 +63,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
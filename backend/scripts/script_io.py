@@ -0,0 +1,56 @@
+"""
+Input and output helpers for the backend scripts.
+
+Large payloads (whole projects with their transcripts) are read from stdin, a file
+or an inherited file descriptor rather than environment variables, which are
+limited in size, and results can be written as newline-delimited JSON events so
+the caller can process them as they arrive.
+"""
+
+import os
+import sys
+import json
+
+def add_input_arguments(parser):
+    """Add --input and --input-fd options to an argument parser."""
+    parser.add_argument("--input", metavar="PATH",
+                        help="read the JSON input from this file ('-' for stdin)")
+    parser.add_argument("--input-fd", type=int, metavar="FD",
+                        help="read the JSON input from this inherited file descriptor")
+
+def load_input(args, env_var=None):
+    """
+    Load the JSON input selected by add_input_arguments.
+
+    Falls back to the ``env_var`` environment variable. Stdin is only read when
+    asked for with ``--input -``, so callers that leave it open do not hang.
+
+    Args:
+        args (Namespace): Parsed arguments
+        env_var (str): Environment variable holding the JSON input, for older callers
+
+    Returns:
+        The parsed input, or None if none was provided
+    """
+    if args.input_fd is not None:
+        with os.fdopen(args.input_fd, "r", encoding="utf-8") as f:
+            return json.load(f)
+    if args.input == "-":
+        return json.load(sys.stdin)
+    if args.input:
+        with open(args.input, "r", encoding="utf-8") as f:
+            return json.load(f)
+    if env_var and os.environ.get(env_var):
+        return json.loads(os.environ[env_var])
+    return None
+
+def write_json(value):
+    """Write a JSON document to stdout without building it as one string first."""
+    json.dump(value, sys.stdout)
+    sys.stdout.write("\n")
+    sys.stdout.flush()
+
+def write_event(event):
+    """Write one newline-delimited JSON event to stdout and flush it."""
+    sys.stdout.write(json.dumps(event) + "\n")
+    sys.stdout.flush()
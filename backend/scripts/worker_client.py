@@ -0,0 +1,75 @@
+"""
+Client for the long-lived Python worker (backend/worker.py).
+
+When WORKER_SOCKET names the socket of a running worker, calls are sent to it and
+the script only pays for its own (standard library) imports. Otherwise, or if the
+worker cannot be reached, the operation runs in this process.
+"""
+
+import os
+import sys
+import json
+import socket
+import itertools
+
+# Unix socket of a worker started with ``worker.py --socket PATH``
+WORKER_SOCKET = os.environ.get("WORKER_SOCKET")
+
+_ids = itertools.count(1)
+
+class WorkerError(Exception):
+    """Error returned by the worker."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+def _call_socket(path, method, params, on_event=None):
+    request_id = next(_ids)
+    request = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path)
+        connection.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with connection.makefile("r", encoding="utf-8") as reader:
+            for line in reader:
+                response = json.loads(line)
+                if response.get("method") == "event":
+                    if on_event is not None and response["params"].get("id") == request_id:
+                        on_event(response["params"]["event"])
+                    continue
+                if response.get("id") != request_id:
+                    continue
+                if "error" in response:
+                    raise WorkerError(response["error"]["code"], response["error"]["message"])
+                return response["result"]
+    raise WorkerError(None, "Worker closed the connection without responding")
+
+def _call_in_process(method, params, on_event=None):
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    import worker
+    try:
+        return worker.dispatch(method, params, emit=on_event)
+    except worker.RPCError as e:
+        raise WorkerError(e.code, e.message)
+
+def call(method, params=None, on_event=None):
+    """
+    Call a worker method, in the worker if one is running or in this process otherwise.
+
+    Args:
+        method (str): Method name (see worker.METHODS)
+        params (dict): Keyword arguments for the method
+        on_event (callable): Receives events from streaming methods as they arrive
+
+    Returns:
+        The method's result
+
+    Raises:
+        WorkerError: If the call fails
+    """
+    if WORKER_SOCKET:
+        try:
+            return _call_socket(WORKER_SOCKET, method, params or {}, on_event)
+        except (FileNotFoundError, ConnectionRefusedError):
+            pass
+    return _call_in_process(method, params or {}, on_event)
@@ -15,28 +15,71 @@ const PORT = 5001;
 app.use(cors());
 app.use(bodyParser.json());
 
-// Helper function to run Python scripts
-function runPythonScript(scriptPath, args = [], env = {}) {
+// Helper function to run Python scripts. `input` is written to the script's stdin;
+// with `onEvent` the output is read as newline-delimited JSON events as they arrive.
+function runPythonScript(scriptPath, args = [], env = {}, { input, onEvent } = {}) {
   return new Promise((resolve, reject) => {
     const fullEnv = { ...process.env, ...env };
     const pythonProcess = spawn('python', [scriptPath, ...args], { env: fullEnv });
     
     let result = '';
     let error = '';
+    let failed = false;
     
+    // Rejects the request once and stops the script, e.g. when it writes a line that is not JSON
+    const fail = (reason) => {
+      if (!failed) {
+        failed = true;
+        reject(reason);
+        pythonProcess.kill();
+      }
+    };
+    
+    pythonProcess.stdout.setEncoding('utf8');
     pythonProcess.stdout.on('data', (data) => {
-      result += data.toString();
+      if (failed) {
+        return;
+      }
+      result += data;
+      if (onEvent) {
+        let newline;
+        while ((newline = result.indexOf('\n')) !== -1) {
+          const line = result.slice(0, newline);
+          result = result.slice(newline + 1);
+          if (!line.trim()) {
+            continue;
+          }
+          let event;
+          try {
+            event = JSON.parse(line);
+          } catch (e) {
+            console.error(`Invalid event from ${path.basename(scriptPath)}: ${line}`);
+            fail(new Error(`Python script wrote invalid output: ${line.slice(0, 200)}`));
+            return;
+          }
+          onEvent(event);
+        }
+      }
     });
     
     pythonProcess.stderr.on('data', (data) => {
       error += data.toString();
     });
     
+    // A script that cannot be started, or exits before reading its input, must not crash the server
+    pythonProcess.on('error', (e) => fail(e));
+    pythonProcess.stdin.on('error', (e) => console.error(`Could not write to ${path.basename(scriptPath)}: ${e.message}`));
+    
     pythonProcess.on('close', (code) => {
+      if (failed) {
+        return;
+      }
       if (code !== 0) {
         console.error(`Python script exited with code ${code}`);
         console.error(`Error: ${error}`);
         reject(new Error(`Python script exited with code ${code}: ${error}`));
+      } else if (onEvent) {
+        resolve();
       } else {
         try {
           // Try to parse the result as JSON
@@ -48,9 +91,180 @@ function runPythonScript(scriptPath, args = [], env = {}) {
         }
       }
     });
+    
+    if (input !== undefined) {
+      pythonProcess.stdin.write(input);
+    }
+    pythonProcess.stdin.end();
   });
 }
 
+// Long-lived Python worker (backend/worker.py) serving JSON-RPC requests on stdin/stdout.
+// Set PYTHON_WORKER=0 to run a fresh script process per request instead.
+const USE_WORKER = process.env.PYTHON_WORKER !== '0';
+const INVALID_PARAMS = -32602;
+const QUEUE_FULL = -32001;
+// Requests the worker has not answered within this many milliseconds are rejected
+const WORKER_TIMEOUT_MS = parseInt(process.env.WORKER_TIMEOUT_MS || '600000', 10);
+let worker = null;
+let nextRequestId = 1;
+const pendingRequests = new Map();
+
+function startWorker() {
+  const workerProcess = spawn('python', [path.join(__dirname, 'worker.py')], {
+    env: process.env,
+    stdio: ['pipe', 'pipe', 'inherit']
+  });
+  
+  // Responses are newline-delimited JSON, matched to requests by id
+  let buffer = '';
+  workerProcess.stdout.setEncoding('utf8');
+  workerProcess.stdout.on('data', (data) => {
+    buffer += data;
+    let newline;
+    while ((newline = buffer.indexOf('\n')) !== -1) {
+      const line = buffer.slice(0, newline);
+      buffer = buffer.slice(newline + 1);
+      if (!line.trim()) {
+        continue;
+      }
+      
+      let message;
+      try {
+        message = JSON.parse(line);
+      } catch (e) {
+        console.error(`Invalid message from Python worker: ${line}`);
+        continue;
+      }
+      
+      // Events streamed by a method before its response
+      if (message.method === 'event') {
+        const request = pendingRequests.get(message.params.id);
+        if (request && request.onEvent) {
+          request.onEvent(message.params.event);
+        }
+        continue;
+      }
+      
+      const request = pendingRequests.get(message.id);
+      if (!request) {
+        continue;
+      }
+      pendingRequests.delete(message.id);
+      if (message.error) {
+        const error = new Error(message.error.message);
+        error.code = message.error.code;
+        request.reject(error);
+      } else {
+        request.resolve(message.result);
+      }
+    }
+  });
+  
+  // Fail in-flight requests; the next call starts a new worker
+  const failWorker = (message) => {
+    console.error(message);
+    if (worker === workerProcess) {
+      worker = null;
+    }
+    for (const request of pendingRequests.values()) {
+      request.reject(new Error(message));
+    }
+    pendingRequests.clear();
+  };
+  workerProcess.on('exit', (code) => {
+    failWorker(`Python worker exited with code ${code}`);
+  });
+  // Without these listeners a failed spawn, or a write (EPIPE) after the worker died,
+  // would be an unhandled 'error' event and crash the server
+  workerProcess.on('error', (error) => {
+    failWorker(`Python worker failed: ${error.message}`);
+  });
+  workerProcess.stdin.on('error', (error) => {
+    failWorker(`Could not write to Python worker: ${error.message}`);
+  });
+  
+  return workerProcess;
+}
+
+// Helper function to call a method on the Python worker. `onEvent` receives any
+// events the method streams before it responds.
+function callWorker(method, params = {}, onEvent = null) {
+  if (!worker) {
+    worker = startWorker();
+  }
+  const id = nextRequestId++;
+  return new Promise((resolve, reject) => {
+    // A hung worker must not leave the HTTP request waiting forever
+    const timer = setTimeout(() => {
+      if (pendingRequests.delete(id)) {
+        reject(new Error(`Python worker did not answer ${method} within ${WORKER_TIMEOUT_MS} ms`));
+      }
+    }, WORKER_TIMEOUT_MS);
+    pendingRequests.set(id, {
+      resolve: (result) => { clearTimeout(timer); resolve(result); },
+      reject: (error) => { clearTimeout(timer); reject(error); },
+      onEvent
+    });
+    worker.stdin.write(JSON.stringify({ jsonrpc: '2.0', id, method, params }) + '\n');
+  });
+}
+
+// Collects the research pipeline's streamed events into a single result, so that
+// neither side holds the whole result as one JSON string
+function researchCollector() {
+  const result = {};
+  const onEvent = (event) => {
+    switch (event.type) {
+      case 'stage':
+        console.log(`Research stage ${event.stage} ${event.status}`);
+        break;
+      case 'personas':
+        result.personas = event.personas;
+        break;
+      case 'transcript':
+        result.transcript = event.transcript;
+        break;
+      case 'analysis':
+        result.analysis = event.analysis;
+        break;
+      case 'done':
+        result.token_count = event.token_count;
+        result.persona_panel = event.persona_panel;
+        result.run_id = event.run_id;
+        break;
+    }
+  };
+  return { result, onEvent };
+}
+
+// Status code for a failed worker or script call
+function errorStatus(error) {
+  if (error.code === INVALID_PARAMS) {
+    return 400;
+  }
+  return error.code === QUEUE_FULL ? 503 : 500;
+}
+
+// Background jobs run on the long-lived worker's job manager (a per-request script
+// would exit before its job finished), and streaming has no script. Sends a 503 and
+// returns false without a worker.
+function requireWorker(res, feature = "Background jobs") {
+  if (!USE_WORKER) {
+    res.status(503).json({
+      success: false,
+      error: `${feature} need the Python worker; unset PYTHON_WORKER=0 to enable them`
+    });
+    return false;
+  }
+  return true;
+}
+
+// Format a server-sent event with a JSON payload
+function sseEvent(event, data) {
+  return `event: ${event}\ndata: ${JSON.stringify(data)}\n\n`;
+}
+
 // API Routes
 
 // Default route
@@ -64,7 +278,7 @@ app.get('/', (req, res) => {
 // Generate research (personas, focus group, analysis)
 app.post('/api/generate/research', async (req, res) => {
   try {
-    const { target_segment, product_concept, research_questions } = req.body;
+    const { target_segment, product_concept, research_questions, reuse_panel, panel_id } = req.body;
     const apiKey = req.headers['x-api-key'];
     
     if (!apiKey) {
@@ -82,19 +296,31 @@ app.post('/api/generate/research', async (req, res) => {
       });
     }
     
-    // Run Python script to generate personas
-    console.log("Generating personas...");
-    const scriptPath = path.join(__dirname, 'scripts', 'generate_research.py');
-    const result = await runPythonScript(
-      scriptPath,
-      [],
-      {
-        OPENAI_API_KEY: apiKey,
-        TARGET_SEGMENT: target_segment,
-        PRODUCT_CONCEPT: product_concept,
-        RESEARCH_QUESTIONS: JSON.stringify(research_questions)
-      }
-    );
+    // Run personas, focus group, and analysis in Python, collecting each stage's
+    // output as it is streamed back
+    console.log("Generating research...");
+    const { result, onEvent } = researchCollector();
+    const inputs = { target_segment, product_concept, research_questions };
+    // Stored persona panels are only reused when the client asks for it
+    if (reuse_panel !== undefined) inputs.reuse_panel = reuse_panel;
+    if (panel_id !== undefined && panel_id !== null) inputs.panel_id = panel_id;
+    if (USE_WORKER) {
+      const { token_count, persona_panel, run_id } = await callWorker(
+        'generate_research',
+        { ...inputs, api_key: apiKey, stream: true },
+        onEvent
+      );
+      result.token_count = token_count;
+      result.persona_panel = persona_panel;
+      result.run_id = run_id;
+    } else {
+      await runPythonScript(
+        path.join(__dirname, 'scripts', 'generate_research.py'),
+        ['--input', '-', '--ndjson'],
+        { OPENAI_API_KEY: apiKey },
+        { input: JSON.stringify(inputs), onEvent }
+      );
+    }
     
     res.json({
       success: true,
@@ -102,26 +328,250 @@ app.post('/api/generate/research', async (req, res) => {
     });
   } catch (error) {
     console.error("Error generating research:", error);
-    res.status(500).json({
+    res.status(errorStatus(error)).json({
       success: false,
       error: error.message || "An error occurred while generating research"
     });
   }
 });
 
-// Get all projects
+// Simulate a focus group, streaming the transcript as server-sent events
+app.post('/api/generate/focus-group/stream', async (req, res) => {
+  const { personas, product_concept, research_questions, run_id } = req.body;
+  const apiKey = req.headers['x-api-key'];
+  
+  if (!apiKey) {
+    return res.status(401).json({
+      success: false,
+      error: "Missing API key"
+    });
+  }
+  if (!personas || !product_concept || !research_questions || research_questions.length === 0) {
+    return res.status(400).json({
+      success: false,
+      error: "Missing required fields: personas, product_concept, research_questions"
+    });
+  }
+  if (!requireWorker(res, "Streaming transcripts")) {
+    return;
+  }
+  
+  res.writeHead(200, {
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'
+  });
+  // "chunk" events carry transcript text as it is generated; the final "done"
+  // event carries the assembled transcript, token count and run id
+  try {
+    const params = { personas, product_concept, research_questions, api_key: apiKey };
+    if (run_id) params.run_id = run_id;
+    const result = await callWorker('stream_focus_group', params, (event) => {
+      const { type, ...data } = event;
+      res.write(sseEvent(type, data));
+    });
+    res.write(sseEvent('done', result));
+  } catch (error) {
+    console.error("Error streaming focus group:", error);
+    res.write(sseEvent('error', { error: error.message || "An error occurred while streaming the focus group" }));
+  }
+  res.end();
+});
+
+// Queue complete research generation and return a job id immediately
+app.post('/api/jobs/research', async (req, res) => {
+  try {
+    const { target_segment, product_concept, research_questions, num_personas, parallel, reuse_panel, panel_id,
+            run_id } = req.body;
+    const apiKey = req.headers['x-api-key'];
+    
+    if (!apiKey) {
+      return res.status(401).json({
+        success: false,
+        error: "Missing API key"
+      });
+    }
+    if (!requireWorker(res)) {
+      return;
+    }
+    
+    const params = { target_segment, product_concept, research_questions, api_key: apiKey };
+    for (const [option, value] of Object.entries({ num_personas, parallel, reuse_panel, panel_id, run_id })) {
+      if (value !== undefined && value !== null) params[option] = value;
+    }
+    const { job_id } = await callWorker('submit_research_job', params);
+    
+    res.status(202).json({
+      success: true,
+      job_id,
+      status_url: `/api/jobs/${job_id}`
+    });
+  } catch (error) {
+    console.error("Error submitting research job:", error);
+    res.status(errorStatus(error)).json({
+      success: false,
+      error: error.message || "An error occurred while submitting the research job"
+    });
+  }
+});
+
+// Queue research for every product concept against every target segment as one job
+app.post('/api/jobs/research/batch', async (req, res) => {
+  try {
+    const { product_concepts, target_segments, research_questions, num_personas, parallel, max_concurrency,
+            reuse_panel } = req.body;
+    const apiKey = req.headers['x-api-key'];
+    
+    if (!apiKey) {
+      return res.status(401).json({
+        success: false,
+        error: "Missing API key"
+      });
+    }
+    if (!requireWorker(res)) {
+      return;
+    }
+    
+    const params = { product_concepts, target_segments, research_questions, api_key: apiKey };
+    for (const [option, value] of Object.entries({ num_personas, parallel, max_concurrency, reuse_panel })) {
+      if (value !== undefined && value !== null) params[option] = value;
+    }
+    const { job_id, combinations } = await callWorker('submit_research_batch_job', params);
+    
+    res.status(202).json({
+      success: true,
+      job_id,
+      combinations,
+      status_url: `/api/jobs/${job_id}`
+    });
+  } catch (error) {
+    console.error("Error submitting research batch job:", error);
+    res.status(errorStatus(error)).json({
+      success: false,
+      error: error.message || "An error occurred while submitting the research batch job"
+    });
+  }
+});
+
+// Get the status, per-stage progress and (when finished) result of a job
+app.get('/api/jobs/:id', async (req, res) => {
+  try {
+    if (!requireWorker(res)) {
+      return;
+    }
+    const job = await callWorker('get_job', { job_id: req.params.id });
+    if (!job) {
+      return res.status(404).json({
+        success: false,
+        error: "Job not found"
+      });
+    }
+    res.json({
+      success: true,
+      job
+    });
+  } catch (error) {
+    console.error(`Error fetching job ${req.params.id}:`, error);
+    res.status(errorStatus(error)).json({
+      success: false,
+      error: error.message || "An error occurred while fetching the job"
+    });
+  }
+});
+
+// Get the result of a finished job
+app.get('/api/jobs/:id/result', async (req, res) => {
+  try {
+    if (!requireWorker(res)) {
+      return;
+    }
+    const job = await callWorker('get_job', { job_id: req.params.id });
+    if (!job) {
+      return res.status(404).json({
+        success: false,
+        error: "Job not found"
+      });
+    }
+    if (job.status === 'failed') {
+      return res.status(500).json({
+        success: false,
+        status: job.status,
+        error: job.error
+      });
+    }
+    if (job.status !== 'completed') {
+      return res.status(409).json({
+        success: false,
+        status: job.status,
+        error: "Job has not finished yet"
+      });
+    }
+    res.json({
+      success: true,
+      ...job.result
+    });
+  } catch (error) {
+    console.error(`Error fetching result of job ${req.params.id}:`, error);
+    res.status(errorStatus(error)).json({
+      success: false,
+      error: error.message || "An error occurred while fetching the job result"
+    });
+  }
+});
+
+// Aggregate recorded OpenAI usage by project, day, key, stage or model, broken down by stage
+app.get('/api/usage/:groupBy', async (req, res) => {
+  try {
+    const groupBy = req.params.groupBy;
+    const options = { group_by: groupBy };
+    const args = [groupBy];
+    for (const [option, flag] of [['days', '--days'], ['project_id', '--project-id'], ['key_hash', '--key-hash']]) {
+      if (req.query[option] !== undefined) {
+        options[option] = String(req.query[option]);
+        args.push(flag, String(req.query[option]));
+      }
+    }
+    const usage = USE_WORKER
+      ? await callWorker('get_usage', options)
+      : await runPythonScript(path.join(__dirname, 'scripts', 'get_usage.py'), args);
+    
+    res.json({
+      success: true,
+      group_by: groupBy,
+      usage
+    });
+  } catch (error) {
+    console.error("Error getting usage:", error);
+    res.status(errorStatus(error)).json({
+      success: false,
+      error: error.message || "An error occurred while getting usage"
+    });
+  }
+});
+
+// Get a page of projects
 app.get('/api/projects', async (req, res) => {
   try {
-    const scriptPath = path.join(__dirname, 'scripts', 'get_projects.py');
-    const result = await runPythonScript(scriptPath);
+    const options = {};
+    const args = [];
+    for (const option of ['limit', 'cursor', 'fields', 'preview']) {
+      if (req.query[option] !== undefined) {
+        options[option] = String(req.query[option]);
+        args.push(`--${option}`, String(req.query[option]));
+      }
+    }
+    const result = USE_WORKER
+      ? await callWorker('get_projects', options)
+      : await runPythonScript(path.join(__dirname, 'scripts', 'get_projects.py'), args);
     
     res.json({
       success: true,
-      projects: result
+      projects: result.projects,
+      next_cursor: result.next_cursor
     });
   } catch (error) {
     console.error("Error fetching projects:", error);
-    res.status(500).json({
+    res.status(errorStatus(error)).json({
       success: false,
       error: error.message || "An error occurred while fetching projects"
     });
@@ -132,10 +582,11 @@ app.get('/api/projects', async (req, res) => {
 app.get('/api/projects/:id', async (req, res) => {
   try {
     const projectId = req.params.id;
-    const scriptPath = path.join(__dirname, 'scripts', 'get_project.py');
-    const result = await runPythonScript(scriptPath, [projectId]);
+    const result = USE_WORKER
+      ? await callWorker('get_project', { project_id: projectId })
+      : await runPythonScript(path.join(__dirname, 'scripts', 'get_project.py'), [projectId]);
     
-    if (result) {
+    if (result && result.id !== undefined) {
       res.json({
         success: true,
         project: result
@@ -148,7 +599,7 @@ app.get('/api/projects/:id', async (req, res) => {
     }
   } catch (error) {
     console.error(`Error fetching project ${req.params.id}:`, error);
-    res.status(500).json({
+    res.status(errorStatus(error)).json({
       success: false,
       error: error.message || "An error occurred while fetching the project"
     });
@@ -165,7 +616,9 @@ app.post('/api/projects', async (req, res) => {
       research_questions,
       personas,
       transcript,
-      analysis
+      analysis,
+      run_id,
+      run_ids
     } = req.body;
     
     // Validate required fields
@@ -176,22 +629,24 @@ app.post('/api/projects', async (req, res) => {
       });
     }
     
-    const scriptPath = path.join(__dirname, 'scripts', 'save_project.py');
-    const result = await runPythonScript(
-      scriptPath,
-      [],
-      {
-        PROJECT_DATA: JSON.stringify({
-          name,
-          product_concept,
-          target_segment,
-          research_questions,
-          personas,
-          transcript,
-          analysis
-        })
-      }
-    );
+    const project = {
+      name,
+      product_concept,
+      target_segment,
+      research_questions,
+      personas,
+      transcript,
+      analysis,
+      run_ids: run_ids || (run_id ? [run_id] : [])
+    };
+    const result = USE_WORKER
+      ? await callWorker('save_project', project)
+      : await runPythonScript(
+          path.join(__dirname, 'scripts', 'save_project.py'),
+          ['--input', '-'],
+          {},
+          { input: JSON.stringify(project) }
+        );
     
     res.json({
       success: true,
@@ -200,7 +655,7 @@ app.post('/api/projects', async (req, res) => {
     });
   } catch (error) {
     console.error("Error creating project:", error);
-    res.status(500).json({
+    res.status(errorStatus(error)).json({
       success: false,
       error: error.message || "An error occurred while creating the project"
     });
@@ -211,8 +666,9 @@ app.post('/api/projects', async (req, res) => {
 app.delete('/api/projects/:id', async (req, res) => {
   try {
     const projectId = req.params.id;
-    const scriptPath = path.join(__dirname, 'scripts', 'delete_project.py');
-    const result = await runPythonScript(scriptPath, [projectId]);
+    const result = USE_WORKER
+      ? await callWorker('delete_project', { project_id: projectId })
+      : await runPythonScript(path.join(__dirname, 'scripts', 'delete_project.py'), [projectId]);
     
     if (result.success) {
       res.json({
@@ -227,7 +683,7 @@ app.delete('/api/projects/:id', async (req, res) => {
     }
   } catch (error) {
     console.error(`Error deleting project ${req.params.id}:`, error);
-    res.status(500).json({
+    res.status(errorStatus(error)).json({
       success: false,
       error: error.message || "An error occurred while deleting the project"
     });
@@ -1 +0,0 @@
-# Empty init file to make utils a package
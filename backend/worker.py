@@ -0,0 +1,492 @@
+#!/usr/bin/env python
+"""
+Long-lived Python worker for the Express.js server.
+
+Serves the operations of backend/scripts/*.py over a JSON-RPC 2.0 protocol so that
+each call does not pay for interpreter startup, imports and engine creation.
+Messages are newline-delimited JSON objects:
+
+    {"jsonrpc": "2.0", "id": 1, "method": "get_project", "params": {"project_id": 7}}
+    {"jsonrpc": "2.0", "id": 1, "result": {...}}
+
+Requests are dispatched to a thread pool as they arrive, so a slow call (such as
+generate_research) does not hold up the others; responses are written as soon as
+they are ready and matched to requests by id. Methods that stream (generate_research
+with ``"stream": true``) send ``event`` notifications before their response:
+
+    {"jsonrpc": "2.0", "method": "event", "params": {"id": 1, "event": {"type": "stage", ...}}}
+
+Usage: worker.py [--socket PATH] [--threads N]
+
+Without --socket the worker serves a single client on stdin/stdout (how server.js
+runs it). With --socket it listens on a Unix domain socket and serves any number of
+clients, such as the scripts in backend/scripts when WORKER_SOCKET is set.
+"""
+
+import os
+import sys
+import json
+import socket
+import inspect
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Put the parent directory first on the path so we import the shared utils package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Maximum number of requests handled concurrently
+WORKER_THREADS = int(os.environ.get("WORKER_THREADS", "8"))
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+QUEUE_FULL = -32001  # the job queue is at capacity; try again later
+
+class RPCError(Exception):
+    """Error returned to the client as a JSON-RPC error object."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+def _int_param(name, value):
+    """Convert a parameter to an int, rejecting it as an invalid parameter if it is not one."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RPCError(INVALID_PARAMS, f"{name} must be an integer")
+
+def _optional_bool_param(name, value):
+    """
+    Convert an optional boolean parameter, where None means use the default.
+
+    Accepts the same spellings as the Flask backend's _optional_bool and rejects
+    anything else as an invalid parameter.
+    """
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in ('1', 'true', 'yes', 'on'):
+            return True
+        if text in ('0', 'false', 'no', 'off', ''):
+            return False
+    raise RPCError(INVALID_PARAMS, f"{name} must be a boolean")
+
+# Methods validate their own parameters and raise RPCError(INVALID_PARAMS, ...) for bad
+# ones; any other exception they raise is a server error.
+#
+# Methods import what they need when first called, so a script running a method
+# in-process (see scripts/worker_client.py) only loads that method's dependencies.
+# The long-lived worker loads everything up front with preload().
+
+def _get_projects(limit=None, cursor=None, fields=None, preview=None):
+    """Return one page of saved projects."""
+    from utils.database import (
+        get_research_projects_page, decode_cursor, PROJECT_LIST_FIELDS, DEFAULT_PAGE_SIZE, DEFAULT_PREVIEW_LENGTH
+    )
+
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    unknown = [field for field in fields or [] if field not in PROJECT_LIST_FIELDS]
+    if unknown:
+        raise RPCError(INVALID_PARAMS, f"Unknown project fields: {', '.join(map(str, unknown))}")
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise RPCError(INVALID_PARAMS, str(e))
+    return get_research_projects_page(
+        limit=_int_param("limit", DEFAULT_PAGE_SIZE if limit is None else limit),
+        cursor=cursor,
+        fields=fields,
+        preview_length=_int_param("preview", DEFAULT_PREVIEW_LENGTH if preview is None else preview)
+    )
+
+def _get_project(project_id):
+    """Return a project's details, or None if it does not exist."""
+    from utils.database import get_project_details
+
+    return get_project_details(_int_param("project_id", project_id))
+
+def _save_project(name=None, product_concept=None, target_segment=None, research_questions=None,
+                  personas=None, transcript='', analysis=None, run_ids=None):
+    """Save a research project and return its ID."""
+    from utils.database import save_research_project
+
+    if not name or not product_concept or not target_segment:
+        raise RPCError(INVALID_PARAMS, "Missing required fields: name, product_concept, target_segment")
+    project_id = save_research_project(
+        name=name,
+        product_concept=product_concept,
+        target_segment=target_segment,
+        research_questions=research_questions or [],
+        personas=personas or [],
+        transcript=transcript or '',
+        analysis=analysis or {},
+        run_ids=run_ids
+    )
+    return {"project_id": project_id}
+
+def _delete_project(project_id):
+    """Delete a project."""
+    from utils.database import delete_project
+
+    return {"success": delete_project(_int_param("project_id", project_id))}
+
+def _get_usage(group_by="stage", days=None, project_id=None, key_hash=None):
+    """Aggregate recorded OpenAI usage by project, day, key, stage or model, broken down by stage."""
+    from utils.database import get_usage_summary, USAGE_GROUPS
+    from utils.usage import usage_ledger
+
+    if group_by not in USAGE_GROUPS:
+        raise RPCError(INVALID_PARAMS, f"group_by must be one of: {', '.join(USAGE_GROUPS)}")
+    # Include calls still waiting to be written
+    usage_ledger.flush()
+    return get_usage_summary(
+        group_by=group_by,
+        days=None if days is None else _int_param("days", days),
+        project_id=None if project_id is None else _int_param("project_id", project_id),
+        key_hash=key_hash
+    )
+
+# Name of the event each pipeline stage's output is streamed as
+STAGE_RESULT_EVENTS = {"personas": "personas", "focus_group": "transcript", "analysis": "analysis"}
+
+def _generate_research(target_segment=None, product_concept=None, research_questions=None, api_key=None,
+                       num_personas=5, parallel=False, reuse_panel=None, panel_id=None, run_id=None, stream=False,
+                       emit=None):
+    """
+    Run the complete research pipeline.
+
+    With ``stream`` set, stage progress and each stage's output are sent as events
+    while the pipeline runs, and the result only holds the token counts, so the
+    full result is never held in a single message.
+    """
+    from utils.pipeline import run_research_pipeline
+
+    options = _research_options(target_segment, product_concept, research_questions, api_key,
+                                num_personas, parallel, reuse_panel, panel_id, run_id)
+    if not (stream and emit):
+        return run_research_pipeline(**options)
+
+    def on_result(stage, value):
+        event = STAGE_RESULT_EVENTS[stage]
+        emit({"type": event, event: value})
+
+    result = run_research_pipeline(
+        **options,
+        on_stage=lambda stage, status: emit({"type": "stage", "stage": stage, "status": status}),
+        on_result=on_result
+    )
+    return {"token_count": result["token_count"], "persona_panel": result["persona_panel"], "run_id": result["run_id"]}
+
+def _research_options(target_segment, product_concept, research_questions, api_key, num_personas, parallel,
+                      reuse_panel, panel_id, run_id):
+    """Validate research parameters and return them as run_research_pipeline arguments."""
+    if not api_key:
+        raise RPCError(INVALID_PARAMS, "api_key not provided")
+    if not target_segment or not product_concept or not research_questions:
+        raise RPCError(INVALID_PARAMS, "Missing required fields: target_segment, product_concept, research_questions")
+    return {
+        "target_segment": target_segment,
+        "product_concept": product_concept,
+        "research_questions": research_questions,
+        "api_key": api_key,
+        "num_personas": _int_param("num_personas", num_personas),
+        "parallel": bool(_optional_bool_param("parallel", parallel)),
+        "reuse_panel": _optional_bool_param("reuse_panel", reuse_panel),
+        "panel_id": None if panel_id is None else _int_param("panel_id", panel_id),
+        "run_id": run_id
+    }
+
+def _submit_research_job(target_segment=None, product_concept=None, research_questions=None, api_key=None,
+                         num_personas=5, parallel=False, reuse_panel=None, panel_id=None, run_id=None):
+    """
+    Queue the complete research pipeline on the worker's job manager.
+
+    Jobs run in this process, so they need the long-lived worker; a script running
+    the method in-process would exit before the job finished.
+    """
+    from utils.pipeline import run_research_pipeline, STAGES
+    from utils.jobs import get_job_manager, JobQueueFullError
+
+    options = _research_options(target_segment, product_concept, research_questions, api_key,
+                                num_personas, parallel, reuse_panel, panel_id, run_id)
+    try:
+        job_id = get_job_manager().submit("research", run_research_pipeline, STAGES, **options)
+    except JobQueueFullError as e:
+        raise RPCError(QUEUE_FULL, str(e))
+    return {"job_id": job_id}
+
+def _submit_research_batch_job(product_concepts=None, target_segments=None, research_questions=None, api_key=None,
+                               num_personas=5, parallel=False, max_concurrency=None, reuse_panel=None):
+    """Queue research for every product concept against every target segment as one job."""
+    from utils.pipeline import run_research_batch, BATCH_STAGES, BATCH_MAX_COMBINATIONS
+    from utils.jobs import get_job_manager, JobQueueFullError
+
+    if not api_key:
+        raise RPCError(INVALID_PARAMS, "api_key not provided")
+    if not product_concepts or not target_segments or not research_questions:
+        raise RPCError(INVALID_PARAMS, "Missing required fields: product_concepts, target_segments, research_questions")
+    if not isinstance(product_concepts, list) or not isinstance(target_segments, list):
+        raise RPCError(INVALID_PARAMS, "product_concepts and target_segments must be lists")
+    combinations = len(product_concepts) * len(target_segments)
+    if combinations > BATCH_MAX_COMBINATIONS:
+        raise RPCError(INVALID_PARAMS,
+                       f"A batch may contain at most {BATCH_MAX_COMBINATIONS} combinations, got {combinations}")
+    try:
+        job_id = get_job_manager().submit(
+            "research_batch",
+            run_research_batch,
+            BATCH_STAGES,
+            product_concepts=product_concepts,
+            target_segments=target_segments,
+            research_questions=research_questions,
+            num_personas=_int_param("num_personas", num_personas),
+            api_key=api_key,
+            parallel=bool(_optional_bool_param("parallel", parallel)),
+            max_concurrency=_int_param("max_concurrency", max_concurrency) if max_concurrency else None,
+            reuse_panel=_optional_bool_param("reuse_panel", reuse_panel)
+        )
+    except JobQueueFullError as e:
+        raise RPCError(QUEUE_FULL, str(e))
+    return {"job_id": job_id, "combinations": combinations}
+
+def _get_job(job_id):
+    """Return a job's status, stage progress and result, or None if it does not exist."""
+    from utils.jobs import get_job_manager
+
+    return get_job_manager().get(str(job_id))
+
+def _stream_focus_group(personas=None, product_concept=None, research_questions=None, api_key=None, run_id=None,
+                        emit=None):
+    """
+    Simulate a focus group, sending the transcript as ``chunk`` events while it is generated.
+
+    The result holds the assembled transcript, its token count and the run id.
+    """
+    from utils.focus_group import stream_focus_group
+    from utils.usage import usage_context, new_run_id
+
+    if not api_key:
+        raise RPCError(INVALID_PARAMS, "api_key not provided")
+    if not personas or not product_concept or not research_questions:
+        raise RPCError(INVALID_PARAMS, "Missing required fields: personas, product_concept, research_questions")
+    run_id = run_id or new_run_id()
+
+    with usage_context(stage="focus_group", run_id=run_id):
+        for event in stream_focus_group(personas, product_concept, research_questions, api_key=api_key):
+            if event["type"] == "done":
+                return {"transcript": event["transcript"], "token_count": event["token_count"], "run_id": run_id}
+            if emit:
+                emit(event)
+
+# Methods that can stream events while they run (they receive an ``emit`` callback)
+STREAMING_METHODS = {"generate_research", "stream_focus_group"}
+
+# Methods callable over the protocol
+METHODS = {
+    "ping": lambda: "pong",
+    "get_projects": _get_projects,
+    "get_project": _get_project,
+    "save_project": _save_project,
+    "delete_project": _delete_project,
+    "get_usage": _get_usage,
+    "generate_research": _generate_research,
+    "submit_research_job": _submit_research_job,
+    "submit_research_batch_job": _submit_research_batch_job,
+    "get_job": _get_job,
+    "stream_focus_group": _stream_focus_group,
+}
+
+def preload():
+    """Import every method's dependencies so that no call pays for them."""
+    import utils.database
+    import utils.pipeline
+    import utils.jobs
+    import openai
+    from utils.analysis import download_sentiment_lexicon, get_sentiment_analyzer
+    download_sentiment_lexicon()
+    get_sentiment_analyzer()
+
+def dispatch(method, params=None, emit=None):
+    """
+    Call a worker method in the current thread.
+
+    Args:
+        method (str): Method name
+        params (dict or list): Keyword or positional arguments
+        emit (callable): Receives events from streaming methods
+
+    Returns:
+        The method's result
+
+    Raises:
+        RPCError: If the method does not exist or the parameters are invalid. Errors
+            raised while the method runs are passed through unchanged.
+    """
+    func = METHODS.get(method)
+    if func is None:
+        raise RPCError(METHOD_NOT_FOUND, f"Method not found: {method}")
+    args, kwargs = [], {}
+    if isinstance(params, list):
+        args = params
+    elif isinstance(params, dict) or params is None:
+        kwargs = dict(params or {})
+        kwargs.pop("emit", None)
+    else:
+        raise RPCError(INVALID_PARAMS, "params must be an object or an array")
+    if method in STREAMING_METHODS:
+        kwargs["emit"] = emit
+
+    # Only a mismatch with the method's signature is the caller's fault; a TypeError
+    # raised inside the method is a server error
+    try:
+        inspect.signature(func).bind(*args, **kwargs)
+    except TypeError as e:
+        raise RPCError(INVALID_PARAMS, str(e))
+    return func(*args, **kwargs)
+
+def handle_message(line, send=None):
+    """
+    Handle one request line and return the response object.
+
+    Args:
+        line (str): Request line
+        send (callable): Sends a message to the client before the response; events
+            from streaming methods are sent as ``event`` notifications carrying the
+            request id
+
+    Returns:
+        dict: JSON-RPC response, or None for notifications (requests without an id)
+    """
+    try:
+        message = json.loads(line)
+    except ValueError as e:
+        return {"jsonrpc": "2.0", "id": None, "error": {"code": PARSE_ERROR, "message": f"Parse error: {str(e)}"}}
+    if not isinstance(message, dict) or not isinstance(message.get("method"), str):
+        return {"jsonrpc": "2.0", "id": None, "error": {"code": INVALID_REQUEST, "message": "Invalid request"}}
+
+    request_id = message.get("id")
+
+    def emit(event):
+        if send is not None and request_id is not None:
+            send({"jsonrpc": "2.0", "method": "event", "params": {"id": request_id, "event": event}})
+
+    try:
+        result = dispatch(message["method"], message.get("params"), emit=emit)
+        response = {"jsonrpc": "2.0", "id": request_id, "result": result}
+    except RPCError as e:
+        response = {"jsonrpc": "2.0", "id": request_id, "error": {"code": e.code, "message": e.message}}
+    except Exception as e:
+        logger.exception(f"Error handling {message['method']}")
+        response = {"jsonrpc": "2.0", "id": request_id, "error": {"code": SERVER_ERROR, "message": str(e)}}
+    return response if "id" in message else None
+
+def serve(reader, write, executor):
+    """
+    Read request lines until EOF, handling each on the executor.
+
+    Args:
+        reader (iterable): Yields request lines
+        write (callable): Writes one encoded message line; called under a lock
+        executor (ThreadPoolExecutor): Pool the requests run on
+    """
+    write_lock = threading.Lock()
+    pending = []
+
+    def send(message):
+        data = json.dumps(message) + "\n"
+        with write_lock:
+            write(data)
+
+    def respond(line):
+        response = handle_message(line, send)
+        if response is not None:
+            send(response)
+
+    for line in reader:
+        if line.strip():
+            pending.append(executor.submit(respond, line))
+        pending = [future for future in pending if not future.done()]
+
+    # Finish in-flight requests before the connection closes
+    for future in pending:
+        future.result()
+
+def serve_stdio(executor):
+    """Serve a single client on stdin/stdout."""
+    # Anything else printed to stdout would corrupt the protocol, so send it to stderr
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    def write(data):
+        protocol_out.write(data)
+        protocol_out.flush()
+
+    serve(sys.stdin, write, executor)
+
+def serve_socket(path, executor):
+    """Serve any number of clients on a Unix domain socket."""
+    if os.path.exists(path):
+        os.remove(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.chmod(path, 0o600)
+    server.listen()
+    logger.info(f"Worker listening on {path}")
+
+    def handle_connection(connection):
+        with connection:
+            reader = connection.makefile("r", encoding="utf-8")
+            writer = connection.makefile("w", encoding="utf-8")
+
+            def write(data):
+                writer.write(data)
+                writer.flush()
+
+            try:
+                serve(reader, write, executor)
+            except OSError:
+                pass
+
+    try:
+        while True:
+            connection, _ = server.accept()
+            threading.Thread(target=handle_connection, args=(connection,), daemon=True).start()
+    finally:
+        server.close()
+        os.remove(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Python operations to the Express.js server")
+    parser.add_argument("--socket", help="listen on this Unix socket instead of stdin/stdout")
+    parser.add_argument("--threads", type=int, default=WORKER_THREADS)
+    args = parser.parse_args()
+
+    preload()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        try:
+            if args.socket:
+                serve_socket(args.socket, executor)
+            else:
+                serve_stdio(executor)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Benchmark a research batch run as one step graph against running its combinations one after another.
+
+OpenAI calls are replaced by a simulated model whose latency grows with the
+number of prompt and output tokens, and projects are saved to a throwaway SQLite
+database, so the benchmark needs no API key or server and measures only how the
+calls are scheduled:
+
+    python benchmarks/bench_pipeline.py [--concepts 3] [--segments 2] [--questions 4] [--personas 5]
+                                        [--ms-per-token 2] [--ms-per-prompt-token 0.2] [--base-ms 300]
+
+"serial" does the same work as the batch one call chain at a time: each segment's
+panel once, then the focus group and analysis of every concept against it.
+"batch" runs run_research_batch, where PipelineEngine overlaps the steps of
+independent combinations. A single research run is a chain of dependent stages
+(see run_research_pipeline), so the graph only pays off across combinations.
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import argparse
+import tempfile
+from types import SimpleNamespace
+
+# Point the database module at a scratch SQLite file before it is imported
+_db_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import persona_generator, focus_group, analysis
+from utils.database import migrate
+from utils.pipeline import run_research_batch
+
+# Simulated output sizes (tokens) for each kind of call. Focus group segments vary
+# between these bounds, as real ones do, and are about 4 characters per token.
+OUTPUT_TOKENS = {"personas": 1200, "chunk": 300, "analysis": 1200}
+SEGMENT_TOKENS = (500, 1500)
+
+def simulated_model(base_ms, ms_per_token, ms_per_prompt_token, num_personas):
+    """Return a stand-in for generate_openai_response that sleeps like a real call."""
+
+    def generate_openai_response(messages, model=None, temperature=0.7, as_json=False, max_tokens=None,
+                                 api_key=None, **kwargs):
+        system, user = messages[0]["content"], messages[1]["content"]
+        if as_json and "JSON array" in system:
+            tokens = OUTPUT_TOKENS["personas"]
+            content = json.dumps({"personas": [
+                {"name": f"Persona {i}", "age": 30 + i, "occupation": f"Job {i}"} for i in range(num_personas)
+            ]})
+        elif not as_json:
+            # Deterministic, per-segment length
+            low, high = SEGMENT_TOKENS
+            tokens = low + zlib.crc32(user.encode("utf-8")) % (high - low)
+            turn = "Persona 1: It sounds useful, but honestly the price worries me a little.\n"
+            content = turn * (tokens * 4 // len(turn))
+        elif "EXCERPT NOTES" in user or "TRANSCRIPT:" in user:
+            tokens = OUTPUT_TOKENS["analysis"]
+            content = json.dumps({"summary": "Summary", "themes": {"price": 5}})
+        else:
+            tokens = OUTPUT_TOKENS["chunk"]
+            content = json.dumps({"themes": {"price": 5}, "objections": ["price"]})
+
+        prompt_tokens = (len(system) + len(user)) // 4
+        time.sleep((base_ms + ms_per_prompt_token * prompt_tokens + ms_per_token * tokens) / 1000)
+        response = SimpleNamespace(choices=[SimpleNamespace(
+            message=SimpleNamespace(content=content), finish_reason="stop"
+        )])
+        return response, tokens
+
+    return generate_openai_response
+
+def run_serial(product_concepts, target_segments, research_questions, num_personas):
+    """Generate each panel once, then run every combination's stages one after another."""
+    for target_segment in target_segments:
+        personas, _ = persona_generator.generate_personas(target_segment, num_personas)
+        for product_concept in product_concepts:
+            transcript, _ = focus_group.simulate_focus_group(
+                personas, product_concept, research_questions, parallel=True
+            )
+            analysis.analyze_transcript(transcript, product_concept, research_questions)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concepts", type=int, default=3)
+    parser.add_argument("--segments", type=int, default=2)
+    parser.add_argument("--questions", type=int, default=4)
+    parser.add_argument("--personas", type=int, default=5)
+    parser.add_argument("--base-ms", type=float, default=300, help="simulated latency per call")
+    parser.add_argument("--ms-per-token", type=float, default=2, help="simulated latency per output token")
+    parser.add_argument("--ms-per-prompt-token", type=float, default=0.2,
+                        help="simulated latency per prompt token")
+    args = parser.parse_args()
+
+    fake = simulated_model(args.base_ms, args.ms_per_token, args.ms_per_prompt_token, args.personas)
+    for module in (persona_generator, focus_group, analysis):
+        module.generate_openai_response = fake
+    migrate()
+
+    product_concepts = [f"Concept {i + 1}: a meal-kit subscription with {15 + i}-minute recipes"
+                        for i in range(args.concepts)]
+    target_segments = [f"Segment {i + 1}: urban professionals aged {25 + 5 * i}-{40 + 5 * i}"
+                       for i in range(args.segments)]
+    research_questions = [f"Question {i + 1}?" for i in range(args.questions)]
+
+    started = time.perf_counter()
+    run_serial(product_concepts, target_segments, research_questions, args.personas)
+    serial_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = run_research_batch(product_concepts, target_segments, research_questions,
+                                num_personas=args.personas, parallel=True, reuse_panel=False)
+    batch_seconds = time.perf_counter() - started
+
+    combinations = args.concepts * args.segments
+    print(f"{combinations} combinations, {result['saved']} saved, {result['failed']} failed")
+    print(f"{'runner':<8} {'seconds':>8}")
+    print(f"{'serial':<8} {serial_seconds:>8.2f}")
+    print(f"{'batch':<8} {batch_seconds:>8.2f}")
+    print(f"speedup: {serial_seconds / batch_seconds:.2f}x")
+    print("batch stage timings (s from start):")
+    for stage, timing in result["timings"]["stages"].items():
+        print(f"  {stage:<12} {timing['started']:>6.2f} -> {timing['finished']:>6.2f}")
+
+if __name__ == "__main__":
+    main()
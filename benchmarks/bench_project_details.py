@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Benchmark get_project_details against the previous lazy-loading implementation.
+
+Runs against a throwaway SQLite database, so it needs no PostgreSQL server:
+
+    python benchmarks/bench_project_details.py [--projects 50] [--repeat 20] [--rtt-ms 1.0]
+
+Each project is seeded with several transcripts and analyses (only the latest of
+each is shown) to reproduce the cost of loading rows that are never used. SQLite
+runs in-process, so statements cost no network round trip; results are reported
+both as measured and with ``--rtt-ms`` of simulated latency added per statement,
+as a networked PostgreSQL server would.
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# Point the database module at a scratch SQLite file before it is imported
+_db_dir = tempfile.mkdtemp(prefix="bench_project_details_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import event
+from utils import database
+from utils.database import (
+    get_session, ResearchProject, ResearchQuestion, Persona, Transcript, Analysis, get_project_details
+)
+
+def legacy_get_project_details(project_id):
+    """The lazy-loading implementation get_project_details replaced, kept for comparison."""
+    session = get_session()
+    try:
+        project = session.query(ResearchProject).filter(ResearchProject.id == project_id).first()
+        if not project:
+            return None
+        questions = [q.question_text for q in project.questions]
+        personas = [{'name': p.name, 'age': p.age, 'background': p.background} for p in project.personas]
+        transcript = project.transcripts[0].content if project.transcripts else ""
+        analysis = {'summary': project.analyses[0].summary} if project.analyses else {}
+        return {'id': project.id, 'research_questions': questions, 'personas': personas,
+                'transcript': transcript, 'analysis': analysis}
+    finally:
+        session.close()
+
+def seed(num_projects, personas_per_project=20, revisions=5):
+    """Create projects with personas, questions and several transcript/analysis revisions."""
+    session = get_session()
+    ids = []
+    for i in range(num_projects):
+        project = ResearchProject(name=f"Project {i}", product_concept="Concept " * 50,
+                                  target_segment="Segment " * 20)
+        project.questions = [ResearchQuestion(question_text=f"Question {q}?") for q in range(5)]
+        project.personas = [
+            Persona(name=f"Persona {p}", age=30 + p, occupation="Analyst", background="Background " * 40)
+            for p in range(personas_per_project)
+        ]
+        project.transcripts = [Transcript(content="Moderator: Hello\n" * 2000) for _ in range(revisions)]
+        project.analyses = [Analysis(summary="Summary " * 100, themes={"a": 1}) for _ in range(revisions)]
+        session.add(project)
+        session.flush()
+        ids.append(project.id)
+    session.commit()
+    session.close()
+    return ids
+
+def measure(loader, project_ids, repeat, rtt_ms=0.0):
+    """Return (milliseconds per call, queries per call) for a loader."""
+    queries = [0]
+
+    def count(*args):
+        queries[0] += 1
+        if rtt_ms:
+            time.sleep(rtt_ms / 1000)
+
+    event.listen(database.get_engine(), "before_cursor_execute", count)
+    try:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for project_id in project_ids:
+                loader(project_id)
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(database.get_engine(), "before_cursor_execute", count)
+
+    calls = repeat * len(project_ids)
+    return 1000 * elapsed / calls, queries[0] / calls
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--rtt-ms", type=float, default=1.0,
+                        help="simulated network round trip per statement")
+    args = parser.parse_args()
+
+    database.migrate()
+
+    project_ids = seed(args.projects)
+
+    # Warm up both paths before timing
+    measure(legacy_get_project_details, project_ids[:5], 1)
+    measure(get_project_details, project_ids[:5], 1)
+
+    legacy_ms, legacy_queries = measure(legacy_get_project_details, project_ids, args.repeat)
+    eager_ms, eager_queries = measure(get_project_details, project_ids, args.repeat)
+    legacy_rtt_ms, _ = measure(legacy_get_project_details, project_ids, args.repeat, args.rtt_ms)
+    eager_rtt_ms, _ = measure(get_project_details, project_ids, args.repeat, args.rtt_ms)
+
+    rtt_header = f"ms/call @{args.rtt_ms:g}ms rtt"
+    print(f"{'loader':<8} {'queries/call':>12} {'ms/call':>10} {rtt_header:>20}")
+    print(f"{'lazy':<8} {legacy_queries:>12.1f} {legacy_ms:>10.2f} {legacy_rtt_ms:>20.2f}")
+    print(f"{'eager':<8} {eager_queries:>12.1f} {eager_ms:>10.2f} {eager_rtt_ms:>20.2f}")
+    print(f"speedup: {legacy_ms / eager_ms:.1f}x in-process, {legacy_rtt_ms / eager_rtt_ms:.1f}x with rtt")
+
+if __name__ == "__main__":
+    main()
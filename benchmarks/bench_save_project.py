@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""
+Benchmark save_research_project against the previous per-row ORM implementation.
+
+Runs against a throwaway SQLite database, so it needs no PostgreSQL server:
+
+    python benchmarks/bench_save_project.py [--projects 50] [--personas 20] [--questions 5] [--rtt-ms 1.0]
+
+Three writers are compared: the legacy save (one ORM object per row), the bulk
+save_research_project (one INSERT per table), and save_research_projects saving
+every project in a single transaction. Throughput is reported in rows per second,
+counting the project, its questions, personas, transcript and analysis. SQLite
+runs in-process, so results are reported both as measured and with ``--rtt-ms``
+of simulated latency added per statement, as a networked PostgreSQL server would.
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# Point the database module at a scratch SQLite file before it is imported
+_db_dir = tempfile.mkdtemp(prefix="bench_save_project_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import event
+from utils import database
+from utils.database import (
+    get_session, ResearchProject, ResearchQuestion, Persona, Transcript, Analysis,
+    save_research_project, save_research_projects
+)
+
+def legacy_save_research_project(name, product_concept, target_segment, research_questions, personas,
+                                 transcript, analysis):
+    """The per-row ORM implementation save_research_project replaced, kept for comparison."""
+    session = get_session()
+    try:
+        project = ResearchProject(name=name, product_concept=product_concept, target_segment=target_segment)
+        session.add(project)
+        session.flush()
+        for question in research_questions:
+            session.add(ResearchQuestion(project_id=project.id, question_text=question))
+        for persona_data in personas:
+            session.add(Persona(project_id=project.id, **{
+                key: value for key, value in database._persona_row(project.id, persona_data).items()
+                if key != 'project_id'
+            }))
+        session.add(Transcript(project_id=project.id, content=transcript))
+        session.add(Analysis(project_id=project.id, **{
+            key: value for key, value in database._analysis_row(project.id, analysis).items()
+            if key != 'project_id'
+        }))
+        session.commit()
+        return project.id
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def make_projects(num_projects, personas_per_project, questions_per_project):
+    """Build project dictionaries shaped like the research pipeline output."""
+    persona = {
+        'name': "Persona", 'age': 35, 'occupation': "Analyst", 'background': "Background " * 40,
+        'interests and hobbies': "Hiking, reading", 'media consumption habits': "Podcasts",
+        'values and motivations': "Security", 'spending habits and income level': "Moderate",
+        'pain points relevant to product research': "Time", 'communication style': "Direct"
+    }
+    return [
+        {
+            'name': f"Project {i}",
+            'product_concept': "Concept " * 50,
+            'target_segment': "Segment " * 20,
+            'research_questions': [f"Question {q}?" for q in range(questions_per_project)],
+            'personas': [dict(persona, name=f"Persona {p}") for p in range(personas_per_project)],
+            'transcript': "Moderator: Hello\n" * 2000,
+            'analysis': {'summary': "Summary " * 100, 'themes': {"a": 1}, 'objections': ["Price"]}
+        }
+        for i in range(num_projects)
+    ]
+
+def measure(writer, projects, rows, rtt_ms=0.0):
+    """Return (rows per second, statements per project) for a writer."""
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+        if rtt_ms:
+            time.sleep(rtt_ms / 1000)
+
+    event.listen(database.get_engine(), "before_cursor_execute", count)
+    try:
+        started = time.perf_counter()
+        writer(projects)
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(database.get_engine(), "before_cursor_execute", count)
+
+    return rows / elapsed, statements[0] / len(projects)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--personas", type=int, default=20)
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--rtt-ms", type=float, default=1.0,
+                        help="simulated network round trip per statement")
+    args = parser.parse_args()
+
+    database.migrate()
+
+    projects = make_projects(args.projects, args.personas, args.questions)
+    rows = args.projects * (1 + args.questions + args.personas + 2)
+
+    writers = [
+        ("legacy", lambda batch: [legacy_save_research_project(**project) for project in batch]),
+        ("bulk", lambda batch: [save_research_project(**project) for project in batch]),
+        ("batch", save_research_projects),
+    ]
+
+    # Warm up every path before timing
+    for _, writer in writers:
+        measure(writer, projects[:2], 1)
+
+    rtt_header = f"rows/s @{args.rtt_ms:g}ms rtt"
+    print(f"{'writer':<8} {'stmts/project':>13} {'rows/s':>10} {rtt_header:>18}")
+    results = {}
+    for label, writer in writers:
+        rate, stmts = measure(writer, projects, rows)
+        rtt_rate, _ = measure(writer, projects, rows, args.rtt_ms)
+        results[label] = (rate, rtt_rate)
+        print(f"{label:<8} {stmts:>13.1f} {rate:>10.0f} {rtt_rate:>18.0f}")
+
+    legacy_rate, legacy_rtt_rate = results["legacy"]
+    for label in ("bulk", "batch"):
+        rate, rtt_rate = results[label]
+        print(f"{label} speedup: {rate / legacy_rate:.1f}x in-process, {rtt_rate / legacy_rtt_rate:.1f}x with rtt")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+"""
+Measure the import cost of each backend script and check it against a budget.
+
+Each script is run with ``python -X importtime`` against a throwaway SQLite
+database, with no worker running, so the operation executes in-process.
+generate_research.py gets a dummy API key and an OpenAI base URL that refuses
+connections, so it imports the pipeline, the OpenAI SDK and SQLAlchemy as a real
+run does and then fails on its first call without reaching the network:
+
+    python benchmarks/bench_startup.py [--budget benchmarks/startup_budget.json] [--top 5] [--update]
+
+The import time reported for a script is the sum of the cumulative times of its
+top-level imports, including those made lazily while it ran, as the median of
+``--repeat`` runs. Budgets are multiples of a baseline measured the same way on
+the same host: importing a fixed set of standard library modules (BASELINE_CODE).
+A slower machine slows the baseline and the scripts alike, so a budget holds
+across hosts and only a relative regression fails. A script fails when its
+ratio to the baseline exceeds its budget by more than ``--tolerance``; the exit
+status is 1 if any script fails. ``--update`` rewrites the budget file from the
+measured ratios with ``--headroom`` added.
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SCRIPTS_DIR = os.path.join(ROOT, 'backend', 'scripts')
+DEFAULT_BUDGET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_budget.json')
+
+# Script invocations that exercise each entry point without calling OpenAI
+SCRIPTS = {
+    "get_projects": ["get_projects.py", "--limit", "10"],
+    "get_project": ["get_project.py", "1"],
+    "save_project": ["save_project.py", "--input", "-"],
+    "delete_project": ["delete_project.py", "999999"],
+    "get_usage": ["get_usage.py", "stage"],
+    "generate_research": ["generate_research.py", "--input", "-"],
+    "migrate_db": ["migrate_db.py", "--check"],
+}
+
+# Extra environment per script. Port 9 (discard) on localhost refuses connections,
+# so the first OpenAI call fails at once and is not retried.
+SCRIPT_ENV = {
+    "generate_research": {
+        "OPENAI_API_KEY": "sk-bench-startup",
+        "OPENAI_BASE_URL": "http://127.0.0.1:9/v1",
+        "OPENAI_MAX_RETRIES": "0",
+        "OPENAI_RESPONSE_CACHE": "0",
+    },
+}
+
+SAMPLE_PROJECT = {
+    "name": "Startup benchmark",
+    "product_concept": "Concept",
+    "target_segment": "Segment",
+    "research_questions": ["Question?"],
+}
+
+SAMPLE_RESEARCH = {
+    "target_segment": "Segment",
+    "product_concept": "Concept",
+    "research_questions": ["Question?"],
+}
+
+# Reference import workload that budgets are expressed as multiples of
+BASELINE_CODE = "import argparse, asyncio, decimal, email.message, json, logging, sqlite3"
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def parse_importtime(stderr):
+    """
+    Parse ``-X importtime`` output.
+
+    Returns:
+        dict: Cumulative microseconds of each top-level import, by module name
+    """
+    top_level = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and len(match.group(3)) == 1:
+            top_level[match.group(4)] = top_level.get(match.group(4), 0) + int(match.group(2))
+    return top_level
+
+def measure(name, env):
+    """Run one script with -X importtime and return its top-level import times."""
+    argv = SCRIPTS[name]
+    stdin = json.dumps(SAMPLE_RESEARCH if name == "generate_research" else SAMPLE_PROJECT)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.join(SCRIPTS_DIR, argv[0]), *argv[1:]],
+        input=stdin, capture_output=True, text=True, env=dict(env, **SCRIPT_ENV.get(name, {})), cwd=ROOT
+    )
+    return parse_importtime(completed.stderr)
+
+def measure_baseline(env, repeat):
+    """Return the median milliseconds BASELINE_CODE takes to import on this host."""
+    times = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", BASELINE_CODE],
+            capture_output=True, text=True, env=env, cwd=ROOT
+        )
+        times.append(sum(parse_importtime(completed.stderr).values()) / 1000)
+    return statistics.median(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget", default=DEFAULT_BUDGET,
+                        help="JSON file of per-script budgets, as multiples of the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="fraction a script may exceed its budget by before failing")
+    parser.add_argument("--top", type=int, default=3, help="heaviest imports to list per script")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (the median is used)")
+    parser.add_argument("--update", action="store_true", help="rewrite the budget file from this run")
+    parser.add_argument("--headroom", type=float, default=0.3,
+                        help="fraction added to measured times when updating the budget")
+    args = parser.parse_args()
+
+    # Run against a scratch database with no worker, so every script imports its own dependencies
+    db_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    # NLTK_AUTO_DOWNLOAD=0 keeps migrate_db.py from fetching the sentiment lexicon
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(db_dir, 'bench.db')}", NLTK_AUTO_DOWNLOAD="0")
+    env.pop("WORKER_SOCKET", None)
+    env.pop("OPENAI_API_KEY", None)
+    subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, "migrate_db.py")],
+                   env=env, capture_output=True, check=True)
+
+    budget = {}
+    if os.path.exists(args.budget):
+        with open(args.budget, "r", encoding="utf-8") as f:
+            budget = json.load(f)
+
+    baseline_ms = measure_baseline(env, args.repeat)
+    print(f"baseline: {baseline_ms:.1f} ms ({BASELINE_CODE})")
+    print(f"{'script':<18} {'import ms':>10} {'x base':>7} {'budget':>7}  heaviest imports")
+    measured = {}
+    failures = []
+    for name in SCRIPTS:
+        runs = [measure(name, env) for _ in range(args.repeat)]
+        totals = [sum(imports.values()) / 1000 for imports in runs]
+        total_ms = statistics.median(totals)
+        # List the heaviest imports of the run closest to the median
+        imports = runs[min(range(len(totals)), key=lambda i: abs(totals[i] - total_ms))]
+        ratio = total_ms / baseline_ms
+        measured[name] = ratio
+        heaviest = sorted(imports.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        heaviest_text = ", ".join(f"{module} {us / 1000:.0f}" for module, us in heaviest)
+
+        limit = budget.get(name)
+        status = ""
+        if limit is not None and ratio > limit * (1 + args.tolerance):
+            failures.append(name)
+            status = "  OVER BUDGET"
+        limit_text = f"{limit:.2f}" if limit is not None else "-"
+        print(f"{name:<18} {total_ms:>10.1f} {ratio:>7.2f} {limit_text:>7}  {heaviest_text}{status}")
+
+    if args.update:
+        with open(args.budget, "w", encoding="utf-8") as f:
+            json.dump({name: round(ratio * (1 + args.headroom), 2) for name, ratio in measured.items()}, f,
+                      indent=2)
+            f.write("\n")
+        print(f"Wrote {args.budget}")
+        return
+
+    if failures:
+        print(f"Import time regression: {', '.join(failures)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
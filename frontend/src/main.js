@@ -27,9 +27,10 @@ const apiService = {
     }
   },
   
-  async getProjects() {
+  async getProjects(cursor = null) {
     try {
-      const response = await fetch(`${this.baseUrl}/projects`);
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`${this.baseUrl}/projects${query}`);
       return await response.json();
     } catch (error) {
       console.error('Error fetching projects:', error);
@@ -96,9 +97,11 @@ const App = {
       personas: null,
       transcript: null,
       analysis: null,
+      runId: null,  // usage ledger run of the generated research, sent back on save
       
       // Projects data
       projects: [],
+      nextProjectsCursor: null,
       selectedProjectId: null,
       loadedProject: null,
       
@@ -190,6 +193,7 @@ const App = {
           this.personas = response.personas;
           this.transcript = response.transcript;
           this.analysis = response.analysis;
+          this.runId = response.run_id || null;
           this.tokenCount = response.token_count || {
             personas: 0,
             focus_group: 0,
@@ -225,7 +229,8 @@ const App = {
           research_questions: this.researchQuestions.filter(q => q.trim() !== ''),
           personas: this.personas,
           transcript: this.transcript,
-          analysis: this.analysis
+          analysis: this.analysis,
+          run_id: this.runId
         });
         
         if (response.success) {
@@ -240,17 +245,19 @@ const App = {
       }
     },
     
-    async loadProjects() {
+    async loadProjects(more = false) {
       this.isLoading = true;
       this.loadingMessage = 'Loading projects...';
       this.errorMessage = '';
       
       try {
-        const response = await apiService.getProjects();
+        // The API returns one page at a time; "Load More" appends the next page
+        const response = await apiService.getProjects(more ? this.nextProjectsCursor : null);
         
         if (response.success) {
-          this.projects = response.projects;
-          if (this.projects.length > 0) {
+          this.projects = more ? this.projects.concat(response.projects) : response.projects;
+          this.nextProjectsCursor = response.next_cursor || null;
+          if (!more && this.projects.length > 0) {
             this.selectedProjectId = this.projects[0].id;
           }
         } else {
@@ -281,6 +288,7 @@ const App = {
           this.personas = response.project.personas;
           this.transcript = response.project.transcript;
           this.analysis = response.project.analysis;
+          this.runId = null;
           this.productConcept = response.project.product_concept;
           this.targetSegment = response.project.target_segment;
           this.researchQuestions = response.project.research_questions;
@@ -333,6 +341,7 @@ const App = {
       this.personas = null;
       this.transcript = null;
       this.analysis = null;
+      this.runId = null;
       this.productConcept = '';
       this.targetSegment = '';
       this.researchQuestions = [''];
@@ -806,6 +815,7 @@ const App = {
                       </tbody>
                     </table>
                   </div>
+                  <button v-if="nextProjectsCursor" @click="loadProjects(true)" class="btn btn-outline-secondary w-100">Load More Projects</button>
                 </div>
               </div>
               
@@ -24,9 +24,10 @@ const apiService = {
     }
   },
   
-  async getProjects() {
+  async getProjects(cursor = null) {
     try {
-      const response = await fetch(`${this.baseUrl}/projects`);
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`${this.baseUrl}/projects${query}`);
       return await response.json();
     } catch (error) {
       console.error('Error fetching projects:', error);
@@ -1,57 +1,449 @@
 """Analysis module for the Synthetic Market Research Engine."""
 
+import os
+import re
+import json
 import logging
-from .openai_service import generate_openai_response, get_response_json, DEFAULT_ANALYSIS_MODEL
+import threading
+from .openai_service import (
+    generate_openai_response, get_response_json, DEFAULT_ANALYSIS_MODEL, MODEL_CONTEXT_TOKENS, DEFAULT_CONTEXT_TOKENS
+)
+from .concurrency import map_concurrently
+from .metrics import timed_step
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def analyze_transcript(transcript, product_concept, research_questions):
+# Transcripts are analyzed in map-reduce chunks only when they would fill more than this
+# share of the analysis model's context window, at roughly four characters per token.
+# The rest of the window is left for the instructions and the analysis itself.
+ANALYSIS_CONTEXT_SHARE = 0.5
+CHARS_PER_TOKEN = 4
+ANALYSIS_CHUNK_CHARS = int(os.environ.get("ANALYSIS_CHUNK_CHARS") or (
+    MODEL_CONTEXT_TOKENS.get(DEFAULT_ANALYSIS_MODEL, DEFAULT_CONTEXT_TOKENS) * CHARS_PER_TOKEN * ANALYSIS_CONTEXT_SHARE
+))
+
+# A Markdown heading starts a new section; "Name:" at the start of a line starts a new speaker turn
+SECTION_PATTERN = re.compile(r'^#{1,6}\s', re.MULTILINE)
+TURN_PATTERN = re.compile(r'^\s*(?:\[[^\]]*\]\s*)?\**[A-Z][\w .\'-]{0,40}?\**\s*:', re.MULTILINE)
+
+# The same structure matched line by line, capturing the section title and the speaker's name and text
+SECTION_HEADING = re.compile(r'^\s*#{1,6}\s+(.*?)\s*$')
+SPEAKER_TURN = re.compile(r'^\s*(?:\[[^\]]*\]\s*)?\**([A-Z][\w .\'-]{0,40}?)\**\s*:\s*(.*)$')
+MODERATOR_NAMES = {"moderator", "facilitator"}
+SENTIMENT_COLUMNS = ["compound", "pos", "neu", "neg"]
+
+# Let setup (migrate_db.py and the worker's preload) download the VADER lexicon if it is
+# missing; requests never download it, and skip turn sentiment while it is absent
+NLTK_AUTO_DOWNLOAD = os.environ.get("NLTK_AUTO_DOWNLOAD", "1") == "1"
+
+ANALYSIS_SYSTEM_MESSAGE = """You are an expert market research analyst who specializes in analyzing focus group transcripts.
+    Your task is to analyze a focus group transcript and extract key insights about the discussed product/service concept.
+    
+    Analyze the transcript and provide the following:
+    
+    1. EMOTIONAL TONE: Quantify the emotional reactions of participants (surprise, interest, confusion, enthusiasm, skepticism, etc.)
+       with numerical values from 0.0-1.0, and provide a brief summary of the overall emotional response.
+    
+    2. KEY THEMES: Identify 3-5 key themes or patterns in the discussion, and provide a detailed explanation of each theme.
+    
+    3. OBJECTIONS: List the main objections or concerns raised about the product/service.
+    
+    4. PRAISE: List the main positive points or aspects praised about the product/service.
+    
+    5. PRICING SENSITIVITY: Analyze mentions of pricing or value, and provide a summary of price sensitivity and a suggested price range if discussed.
+    
+    6. PARTICIPANT ALIGNMENT: Analyze how well each participant aligns with or seems interested in the product/service concept.
+    
+    7. SUMMARY: Provide a concise summary of the overall market research findings.
+    
+    8. RECOMMENDATIONS: Provide 3-5 concrete recommendations for improving the product/service concept based on the focus group feedback.
+    
+    Structure your response as a JSON object with appropriate keys for each section of the analysis.
     """
-    Analyze the focus group transcript for sentiment, themes, objections/praise, and pricing.
+
+CHUNK_SYSTEM_MESSAGE = """You are an expert market research analyst. You are reading ONE excerpt of a longer
+    focus group transcript. Extract only what this excerpt shows; do not speculate about the rest of the session.
+    
+    Return a JSON object with these keys:
+    - "themes": list of {"name": short theme name, "evidence": one-sentence example from the excerpt}
+    - "objections": list of objections or concerns raised
+    - "praise": list of positive points raised
+    - "pricing_signals": list of statements about price, value, or willingness to pay (include any amounts mentioned)
+    - "emotional_signals": object mapping emotions (e.g. enthusiasm, skepticism, confusion, interest) to 0.0-1.0 intensity
+    - "participant_stances": object mapping each participant who speaks to a one-sentence summary of their stance
+    
+    Keep every item short. Use empty lists or objects when the excerpt has nothing relevant.
+    """
+
+_analyzer = None
+_analyzer_loaded = False
+_analyzer_lock = threading.Lock()
+
+def get_sentiment_analyzer():
+    """
+    Return the shared VADER sentiment analyzer, or None if NLTK or its lexicon is unavailable.
+    
+    NLTK is imported and the lexicon loaded once per process on first use, and a
+    missing lexicon is logged once; it is never downloaded here (see
+    download_sentiment_lexicon). The analyzer only reads its lexicon, so it is
+    shared between threads.
+    """
+    global _analyzer, _analyzer_loaded
+    if not _analyzer_loaded:
+        with _analyzer_lock:
+            if not _analyzer_loaded:
+                try:
+                    import nltk
+                    from nltk.sentiment import SentimentIntensityAnalyzer
+                    
+                    nltk.data.find('sentiment/vader_lexicon.zip')
+                    _analyzer = SentimentIntensityAnalyzer()
+                except ImportError as e:
+                    logger.warning(f"NLTK is not available, skipping turn sentiment: {str(e)}")
+                except LookupError:
+                    logger.warning("VADER lexicon is not installed, skipping turn sentiment; "
+                                   "run backend/scripts/migrate_db.py to download it")
+                _analyzer_loaded = True
+    return _analyzer
+
+def download_sentiment_lexicon():
+    """
+    Download the VADER lexicon if it is missing and NLTK_AUTO_DOWNLOAD allows it.
+    
+    Called from setup steps, never while serving a request.
+    
+    Returns:
+        bool: True if the lexicon is installed
+    """
+    try:
+        import nltk
+    except ImportError:
+        return False
+    try:
+        nltk.data.find('sentiment/vader_lexicon.zip')
+        return True
+    except LookupError:
+        pass
+    if not NLTK_AUTO_DOWNLOAD:
+        return False
+    logger.info("Downloading the VADER lexicon for turn sentiment")
+    return bool(nltk.download('vader_lexicon', quiet=True))
+
+def split_turns(transcript):
+    """
+    Split a transcript into speaker turns.
+    
+    Lines that do not start a new turn or section are treated as continuations of
+    the current turn.
+    
+    Args:
+        transcript (str): The focus group transcript
+        
+    Returns:
+        list: (section, speaker, text) tuples in transcript order
+    """
+    turns = []
+    section = ""
+    speaker = None
+    lines = []
+    
+    def close_turn():
+        if speaker is not None and any(line.strip() for line in lines):
+            turns.append((section, speaker, " ".join(line.strip() for line in lines if line.strip())))
+    
+    for line in transcript.splitlines():
+        heading = SECTION_HEADING.match(line)
+        if heading:
+            close_turn()
+            section, speaker, lines = heading.group(1), None, []
+            continue
+        turn = SPEAKER_TURN.match(line)
+        if turn:
+            close_turn()
+            speaker, lines = turn.group(1).strip(), [turn.group(2)]
+        elif speaker is not None:
+            lines.append(line)
+    close_turn()
+    return turns
+
+def score_turns(transcripts):
+    """
+    Score every speaker turn of one or more transcripts with VADER.
+    
+    Args:
+        transcripts (dict): Transcript text by transcript ID (e.g. project ID)
+        
+    Returns:
+        DataFrame: One row per turn with transcript_id, section, speaker, text,
+        is_moderator and the compound/pos/neu/neg scores, or None if the
+        sentiment analyzer is unavailable
+    """
+    sia = get_sentiment_analyzer()
+    if sia is None:
+        return None
+    
+    import pandas as pd
+    
+    rows = [
+        (transcript_id, section, speaker, text)
+        for transcript_id, transcript in transcripts.items()
+        for section, speaker, text in split_turns(transcript or "")
+    ]
+    turns = pd.DataFrame(rows, columns=["transcript_id", "section", "speaker", "text"])
+    
+    # Identical turns (greetings, "I agree.") are scored once
+    unique_texts = turns["text"].unique()
+    scores = pd.DataFrame([sia.polarity_scores(text) for text in unique_texts],
+                          index=unique_texts, columns=SENTIMENT_COLUMNS)
+    turns = turns.join(scores, on="text")
+    turns["is_moderator"] = turns["speaker"].str.lower().isin(MODERATOR_NAMES)
+    return turns
+
+def _summarize(frame, key=None):
+    """Mean scores and turn counts of a turn frame, optionally grouped by a column."""
+    if key is None:
+        summary = frame[SENTIMENT_COLUMNS].mean().round(4).to_dict() if len(frame) else {}
+        return {"turns": int(len(frame)), **summary}
+    grouped = frame.groupby(key, sort=False)[SENTIMENT_COLUMNS].mean().round(4)
+    grouped["turns"] = frame.groupby(key, sort=False).size()
+    return {
+        name: {"turns": int(row["turns"]), **{column: float(row[column]) for column in SENTIMENT_COLUMNS}}
+        for name, row in grouped.iterrows()
+    }
+
+@timed_step("turn_sentiment")
+def turn_sentiment(transcript):
+    """
+    Summarize VADER sentiment of a transcript's speaker turns.
+    
+    Scoring turn by turn (rather than the transcript as one string) keeps one
+    participant's enthusiasm from cancelling out another's objections. Moderator
+    turns are reported by speaker but left out of the overall and per-section scores.
     
     Args:
         transcript (str): The focus group transcript
+        
+    Returns:
+        dict: overall, by_speaker and by_section mean scores with turn counts, or
+        an empty dict if the sentiment analyzer is unavailable
+    """
+    turns = score_turns({0: transcript})
+    if turns is None:
+        return {}
+    participants = turns[~turns["is_moderator"]]
+    return {
+        "overall": _summarize(participants),
+        "by_speaker": _summarize(turns, "speaker"),
+        "by_section": _summarize(participants, "section")
+    }
+
+def add_turn_sentiment(analysis, transcript):
+    """
+    Add per-turn VADER sentiment of a transcript to an analysis dictionary.
+    
+    Sets ``nltk_sentiment`` to the overall participant scores and ``turn_sentiment``
+    to the by_speaker and by_section breakdowns (both empty if the analyzer is
+    unavailable), and returns the analysis.
+    """
+    sentiment = turn_sentiment(transcript)
+    analysis['nltk_sentiment'] = sentiment.get('overall', {})
+    analysis['turn_sentiment'] = {
+        'by_speaker': sentiment.get('by_speaker', {}),
+        'by_section': sentiment.get('by_section', {})
+    }
+    return analysis
+
+def _split_at(pattern, text):
+    """Split text at every match of a pattern, keeping the matched text with the following piece."""
+    starts = sorted({0} | {match.start() for match in pattern.finditer(text)})
+    pieces = [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)])]
+    return [piece for piece in pieces if piece.strip()]
+
+def split_transcript(transcript, max_chars=ANALYSIS_CHUNK_CHARS):
+    """
+    Split a transcript into chunks of at most ``max_chars`` characters.
+    
+    The transcript is split at section headings first; sections that are still too
+    long are split between speaker turns. Consecutive small pieces are packed back
+    together so chunks stay close to the size limit.
+    
+    Args:
+        transcript (str): The focus group transcript
+        max_chars (int): Maximum characters per chunk
+        
+    Returns:
+        list: Transcript chunks in order
+    """
+    pieces = []
+    for section in _split_at(SECTION_PATTERN, transcript):
+        if len(section) <= max_chars:
+            pieces.append(section)
+            continue
+        for turn in _split_at(TURN_PATTERN, section):
+            # A single oversized turn is cut at the size limit
+            while len(turn) > max_chars:
+                pieces.append(turn[:max_chars])
+                turn = turn[max_chars:]
+            pieces.append(turn)
+    
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+@timed_step("extract_chunk_insights")
+def extract_chunk_insights(chunk, product_concept, research_questions, api_key=None):
+    """
+    Extract partial themes, objections, praise and pricing signals from one transcript chunk.
+    
+    Args:
+        chunk (str): An excerpt of the focus group transcript
         product_concept (str): Description of the product or service
         research_questions (list): List of research questions discussed
+        api_key (str): OpenAI API key for this request
         
     Returns:
-        dict: Analysis results
+        dict: Partial insights for the chunk
         int: Number of tokens used
     """
-    logger.info("Analyzing focus group transcript")
+    questions_text = "\n".join([f"{i+1}. {q}" for i, q in enumerate(research_questions)])
     
-    # Format the research questions as a string
+    user_message = f"""Extract insights from this focus group excerpt about the following product/service concept:
+    
+    PRODUCT/SERVICE CONCEPT:
+    {product_concept}
+    
+    RESEARCH QUESTIONS DISCUSSED:
+    {questions_text}
+    
+    TRANSCRIPT EXCERPT:
+    {chunk}
+    """
+    
+    messages = [
+        {"role": "system", "content": CHUNK_SYSTEM_MESSAGE},
+        {"role": "user", "content": user_message}
+    ]
+    
+    response, token_count = generate_openai_response(
+        messages=messages,
+        model=DEFAULT_ANALYSIS_MODEL,
+        temperature=0.3,
+        as_json=True,
+        api_key=api_key,
+        use_cache=True  # The same transcript may be analysed again, e.g. when a run is retried
+    )
+    
+    return get_response_json(response), token_count
+
+@timed_step("reduce_chunk_insights")
+def reduce_chunk_insights(partials, product_concept, research_questions, api_key=None):
+    """
+    Combine partial chunk insights into a complete analysis.
+    
+    Args:
+        partials (list): Partial insights from extract_chunk_insights, in transcript order
+        product_concept (str): Description of the product or service
+        research_questions (list): List of research questions discussed
+        api_key (str): OpenAI API key for this request
+        
+    Returns:
+        dict: Analysis results, in the same structure as analyze_transcript
+        int: Number of tokens used
+    """
     questions_text = "\n".join([f"{i+1}. {q}" for i, q in enumerate(research_questions)])
+    notes_text = "\n".join(
+        f"EXCERPT {i+1}: {json.dumps(partial, separators=(',', ':'))}" for i, partial in enumerate(partials)
+    )
     
-    # Construct the prompt for the OpenAI API
-    system_message = """You are an expert market research analyst who specializes in analyzing focus group transcripts.
-    Your task is to analyze a focus group transcript and extract key insights about the discussed product/service concept.
+    user_message = f"""Analyze a focus group about the following product/service concept. The transcript was too long
+    to read at once, so below are structured notes extracted from each of its {len(partials)} consecutive excerpts.
     
-    Analyze the transcript and provide the following:
+    PRODUCT/SERVICE CONCEPT:
+    {product_concept}
     
-    1. EMOTIONAL TONE: Quantify the emotional reactions of participants (surprise, interest, confusion, enthusiasm, skepticism, etc.)
-       with numerical values from 0.0-1.0, and provide a brief summary of the overall emotional response.
+    RESEARCH QUESTIONS DISCUSSED:
+    {questions_text}
     
-    2. KEY THEMES: Identify 3-5 key themes or patterns in the discussion, and provide a detailed explanation of each theme.
+    EXCERPT NOTES:
+    {notes_text}
     
-    3. OBJECTIONS: List the main objections or concerns raised about the product/service.
+    Merge duplicate themes and points across excerpts, weigh how often they recur, and provide a comprehensive
+    analysis of the whole session following the structure in your instructions.
+    Focus especially on extracting actionable insights and clear recommendations.
+    """
     
-    4. PRAISE: List the main positive points or aspects praised about the product/service.
+    messages = [
+        {"role": "system", "content": ANALYSIS_SYSTEM_MESSAGE},
+        {"role": "user", "content": user_message}
+    ]
     
-    5. PRICING SENSITIVITY: Analyze mentions of pricing or value, and provide a summary of price sensitivity and a suggested price range if discussed.
+    response, token_count = generate_openai_response(
+        messages=messages,
+        model=DEFAULT_ANALYSIS_MODEL,
+        temperature=0.5,
+        as_json=True,
+        api_key=api_key,
+        use_cache=True  # The same transcript may be analysed again, e.g. when a run is retried
+    )
     
-    6. PARTICIPANT ALIGNMENT: Analyze how well each participant aligns with or seems interested in the product/service concept.
+    return get_response_json(response), token_count
+
+@timed_step("analyze_transcript")
+def analyze_transcript(transcript, product_concept, research_questions, api_key=None, chunked=None):
+    """
+    Analyze the focus group transcript for sentiment, themes, objections/praise, and pricing.
     
-    7. SUMMARY: Provide a concise summary of the overall market research findings.
+    The result also carries VADER sentiment scored per speaker turn
+    (``nltk_sentiment`` and ``turn_sentiment``, see add_turn_sentiment).
     
-    8. RECOMMENDATIONS: Provide 3-5 concrete recommendations for improving the product/service concept based on the focus group feedback.
+    Transcripts too long to fit comfortably in the analysis model's context are
+    analyzed map-reduce style: insights are extracted from transcript chunks
+    concurrently and then combined into one analysis. Ordinary transcripts are
+    analyzed with a single call.
     
-    Structure your response as a JSON object with appropriate keys for each section of the analysis.
+    Args:
+        transcript (str): The focus group transcript
+        product_concept (str): Description of the product or service
+        research_questions (list): List of research questions discussed
+        api_key (str): OpenAI API key for this request
+        chunked (bool): Force (True) or disable (False) chunked analysis. By default
+            it is used when the transcript exceeds ANALYSIS_CHUNK_CHARS.
+        
+    Returns:
+        dict: Analysis results
+        int: Number of tokens used
     """
+    logger.info("Analyzing focus group transcript")
     
+    if chunked is None:
+        chunked = len(transcript) > ANALYSIS_CHUNK_CHARS
+    chunks = split_transcript(transcript) if chunked else [transcript]
+    if len(chunks) > 1:
+        partial_results = map_concurrently(
+            lambda chunk: extract_chunk_insights(chunk, product_concept, research_questions, api_key=api_key),
+            chunks
+        )
+        analysis, reduce_tokens = reduce_chunk_insights(
+            [partial for partial, _ in partial_results], product_concept, research_questions, api_key=api_key
+        )
+        token_count = reduce_tokens + sum(tokens for _, tokens in partial_results)
+        logger.info(f"Completed chunked analysis of {len(chunks)} chunks using {token_count} tokens")
+        return add_turn_sentiment(analysis, transcript), token_count
+    
+    # Format the research questions as a string
+    questions_text = "\n".join([f"{i+1}. {q}" for i, q in enumerate(research_questions)])
+    
+    # Construct the prompt for the OpenAI API
     user_message = f"""Analyze this focus group transcript about the following product/service concept:
     
     PRODUCT/SERVICE CONCEPT:
@@ -68,7 +460,7 @@ def analyze_transcript(transcript, product_concept, research_questions):
     """
     
     messages = [
-        {"role": "system", "content": system_message},
+        {"role": "system", "content": ANALYSIS_SYSTEM_MESSAGE},
         {"role": "user", "content": user_message}
     ]
     
@@ -77,11 +469,13 @@ def analyze_transcript(transcript, product_concept, research_questions):
         messages=messages,
         model=DEFAULT_ANALYSIS_MODEL,
         temperature=0.5,
-        as_json=True
+        as_json=True,
+        api_key=api_key,
+        use_cache=True  # The same transcript may be analysed again, e.g. when a run is retried
     )
     
-    # Parse and return the analysis results
-    analysis = get_response_json(response)
+    # Parse the analysis results and add per-turn sentiment, which needs no LLM call
+    analysis = add_turn_sentiment(get_response_json(response), transcript)
     
     logger.info(f"Completed transcript analysis using {token_count} tokens")
     return analysis, token_count
\ No newline at end of file
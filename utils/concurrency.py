@@ -0,0 +1,64 @@
+"""Concurrency helpers for fanning out OpenAI calls."""
+
+import os
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# Upper bound on concurrent OpenAI calls made by a single fan-out
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("MAX_CONCURRENT_REQUESTS", "8"))
+
+# Semaphore shared by every OpenAI call made inside limit_concurrent_calls
+_call_limit = contextvars.ContextVar("openai_call_limit", default=None)
+
+@contextmanager
+def limit_concurrent_calls(max_calls):
+    """
+    Allow at most ``max_calls`` OpenAI calls in flight across all work started in the block.
+
+    The limit follows the work onto threads started with map_concurrently and
+    PipelineEngine, so nested fan-outs (persona shards inside a batch step, say)
+    share it instead of each allowing MAX_CONCURRENT_REQUESTS of their own.
+    """
+    token = _call_limit.set(threading.BoundedSemaphore(max_calls))
+    try:
+        yield
+    finally:
+        _call_limit.reset(token)
+
+@contextmanager
+def call_slot():
+    """Hold one slot of the enclosing limit_concurrent_calls, if any, for the duration of a call."""
+    semaphore = _call_limit.get()
+    if semaphore is None:
+        yield
+    else:
+        with semaphore:
+            yield
+
+def map_concurrently(func, items, max_workers=None):
+    """
+    Apply a function to each item on a thread pool.
+
+    Args:
+        func (callable): Function taking a single item
+        items (iterable): Items to process
+        max_workers (int): Maximum number of concurrent calls
+            (defaults to MAX_CONCURRENT_REQUESTS)
+
+    Returns:
+        list: Results in the same order as ``items``. The first exception raised by
+        ``func`` is re-raised.
+
+    Each call runs in a copy of the caller's context variables, so labels such as
+    the usage ledger's stage and run id carry over to the worker threads.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+
+    workers = min(max_workers or MAX_CONCURRENT_REQUESTS, len(items))
+    contexts = [contextvars.copy_context() for _ in items]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda context, item: context.run(func, item), contexts, items))
@@ -1,18 +1,172 @@
 import os
 import json
-from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float, ForeignKey, JSON
+import time
+import re
+import base64
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import (
+    create_engine, event, inspect, select, insert, update, case, func, or_, and_, Column, Integer, String, Text, DateTime, Float, Boolean, ForeignKey, JSON, Index,
+    MetaData, Table
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.exc import IntegrityError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import sessionmaker, relationship, joinedload, selectinload
+from sqlalchemy.pool import QueuePool
 
 # Get database URL from environment variables
 DATABASE_URL = os.environ.get("DATABASE_URL")
 
-# Create engine and session
-engine = create_engine(DATABASE_URL)
-Session = sessionmaker(bind=engine)
+# Connection pool settings (ignored for SQLite, which manages its own pool)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a connection
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))  # seconds; -1 disables
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+
+class PoolMetrics:
+    """Thread-safe counters for connection pool checkouts and waits."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.invalidations = 0
+            self.timeouts = 0
+            self.wait_seconds_total = 0.0
+            self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def increment(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0
+            }
+
+_pool_metrics = PoolMetrics()
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            _pool_metrics.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        _pool_metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+def _engine_options(url):
+    """Return create_engine keyword arguments for a database URL."""
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+
+def _instrument_pool(engine):
+    """Count connects, checkouts, checkins and invalidations on an engine's pool."""
+    for name, counter in (
+        ("connect", "connects"),
+        ("checkout", "checkouts"),
+        ("checkin", "checkins"),
+        ("invalidate", "invalidations")
+    ):
+        event.listen(engine, name, lambda *args, counter=counter: _pool_metrics.increment(counter))
+
+# The engine is created on first use so that importing this module opens no connections
+_engine = None
+_engine_lock = threading.Lock()
+Session = sessionmaker()
+
+def get_engine():
+    """
+    Return the process-wide engine, creating it on first use.
+    
+    Returns:
+        Engine: SQLAlchemy engine for DATABASE_URL
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                if not DATABASE_URL:
+                    raise RuntimeError("DATABASE_URL environment variable is not set")
+                engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+                _instrument_pool(engine)
+                Session.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+def get_session():
+    """Return a new session bound to the process-wide engine."""
+    get_engine()
+    return Session()
+
+def get_pool_stats():
+    """
+    Return connection pool configuration, current usage and checkout metrics.
+    
+    Returns:
+        dict: Pool statistics (only the metrics if the engine has not been created)
+    """
+    stats = {"engine_created": _engine is not None}
+    if _engine is not None:
+        pool = _engine.pool
+        stats["pool_class"] = type(pool).__name__
+        if isinstance(pool, InstrumentedQueuePool):
+            stats.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "max_overflow": DB_MAX_OVERFLOW,
+                "timeout": DB_POOL_TIMEOUT,
+                "recycle": DB_POOL_RECYCLE,
+                "pre_ping": DB_POOL_PRE_PING
+            })
+    stats.update(_pool_metrics.stats())
+    return stats
+
 Base = declarative_base()
 
+# Project listing settings
+PROJECT_LIST_FIELDS = ('id', 'name', 'created_at', 'product_concept', 'target_segment')
+PREVIEW_FIELDS = ('product_concept', 'target_segment')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+DEFAULT_PREVIEW_LENGTH = 200
+
 class ResearchProject(Base):
     """Model for research projects"""
     __tablename__ = "research_projects"
@@ -24,17 +178,22 @@ class ResearchProject(Base):
     target_segment = Column(Text, nullable=False)
     
     # Relationships
-    personas = relationship("Persona", back_populates="project", cascade="all, delete-orphan")
-    questions = relationship("ResearchQuestion", back_populates="project", cascade="all, delete-orphan")
+    personas = relationship("Persona", back_populates="project", cascade="all, delete-orphan", order_by="Persona.id")
+    questions = relationship("ResearchQuestion", back_populates="project", cascade="all, delete-orphan",
+                             order_by="ResearchQuestion.id")
     transcripts = relationship("Transcript", back_populates="project", cascade="all, delete-orphan")
     analyses = relationship("Analysis", back_populates="project", cascade="all, delete-orphan")
+    runs = relationship("ProjectRun", cascade="all, delete-orphan")
+    
+    # Supports newest-first keyset pagination of the project list
+    __table_args__ = (Index("ix_research_projects_created_at_id", "created_at", "id"),)
 
 class Persona(Base):
     """Model for personas"""
     __tablename__ = "personas"
     
     id = Column(Integer, primary_key=True)
-    project_id = Column(Integer, ForeignKey("research_projects.id"))
+    project_id = Column(Integer, ForeignKey("research_projects.id"), index=True)
     name = Column(String(100), nullable=False)
     age = Column(Integer)
     occupation = Column(String(100))
@@ -54,7 +213,7 @@ class ResearchQuestion(Base):
     __tablename__ = "research_questions"
     
     id = Column(Integer, primary_key=True)
-    project_id = Column(Integer, ForeignKey("research_projects.id"))
+    project_id = Column(Integer, ForeignKey("research_projects.id"), index=True)
     question_text = Column(Text, nullable=False)
     
     # Relationships
@@ -65,7 +224,7 @@ class Transcript(Base):
     __tablename__ = "transcripts"
     
     id = Column(Integer, primary_key=True)
-    project_id = Column(Integer, ForeignKey("research_projects.id"))
+    project_id = Column(Integer, ForeignKey("research_projects.id"), index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     content = Column(Text, nullable=False)
     
@@ -77,7 +236,7 @@ class Analysis(Base):
     __tablename__ = "analyses"
     
     id = Column(Integer, primary_key=True)
-    project_id = Column(Integer, ForeignKey("research_projects.id"))
+    project_id = Column(Integer, ForeignKey("research_projects.id"), index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     emotional_tone = Column(JSON)
     emotional_summary = Column(Text)
@@ -93,11 +252,289 @@ class Analysis(Base):
     # Relationships
     project = relationship("ResearchProject", back_populates="analyses")
 
+class PersonaPanel(Base):
+    """Model for a reusable persona panel, shared by projects researching the same segment"""
+    __tablename__ = "persona_panels"
+    
+    id = Column(Integer, primary_key=True)
+    segment_hash = Column(String(64), nullable=False)
+    num_personas = Column(Integer, nullable=False)
+    target_segment = Column(Text, nullable=False)
+    personas = Column(JSON, nullable=False)
+    token_count = Column(Integer, default=0)  # tokens spent generating the panel
+    use_count = Column(Integer, default=0)  # times the panel was reused instead of regenerated
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime)
+    
+    # One panel per normalized segment and size
+    __table_args__ = (
+        Index("ix_persona_panels_segment", "segment_hash", "num_personas", unique=True),
+    )
+
+class UsageRecord(Base):
+    """Model for one OpenAI call in the token and cost ledger"""
+    __tablename__ = "usage_ledger"
+    
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    run_id = Column(String(32), index=True)
+    stage = Column(String(50))
+    model = Column(String(100))
+    key_hash = Column(String(64), index=True)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    total_tokens = Column(Integer, default=0)
+    cost_usd = Column(Float, default=0.0)
+    latency_ms = Column(Float)
+    cache_hit = Column(Boolean, default=False)
+
+class ProjectRun(Base):
+    """Model linking a saved project to the research runs that produced it"""
+    __tablename__ = "project_runs"
+    
+    run_id = Column(String(32), primary_key=True)
+    project_id = Column(Integer, ForeignKey("research_projects.id"), nullable=False, index=True)
+
+class SchemaMigration(Base):
+    """Model for applied schema migrations"""
+    __tablename__ = "schema_version"
+    
+    version = Column(Integer, primary_key=True)
+    description = Column(String(200), nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+class SchemaOutOfDateError(RuntimeError):
+    """Raised when the database schema is older than this code expects."""
+
+# Migrations build their own frozen table definitions instead of using the models above,
+# so a migration creates the schema of its version even after the models change.
+
+def _research_tables_v1(metadata):
+    """Define the research project tables as created by migration 1."""
+    return [
+        Table(
+            "research_projects", metadata,
+            Column("id", Integer, primary_key=True),
+            Column("name", String(200), nullable=False),
+            Column("created_at", DateTime),
+            Column("product_concept", Text, nullable=False),
+            Column("target_segment", Text, nullable=False)
+        ),
+        Table(
+            "personas", metadata,
+            Column("id", Integer, primary_key=True),
+            Column("project_id", Integer, ForeignKey("research_projects.id")),
+            Column("name", String(100), nullable=False),
+            Column("age", Integer),
+            Column("occupation", String(100)),
+            Column("background", Text),
+            Column("interests", Text),
+            Column("media_consumption", Text),
+            Column("values", Text),
+            Column("spending_habits", Text),
+            Column("pain_points", Text),
+            Column("communication_style", Text)
+        ),
+        Table(
+            "research_questions", metadata,
+            Column("id", Integer, primary_key=True),
+            Column("project_id", Integer, ForeignKey("research_projects.id")),
+            Column("question_text", Text, nullable=False)
+        ),
+        Table(
+            "transcripts", metadata,
+            Column("id", Integer, primary_key=True),
+            Column("project_id", Integer, ForeignKey("research_projects.id")),
+            Column("created_at", DateTime),
+            Column("content", Text, nullable=False)
+        ),
+        Table(
+            "analyses", metadata,
+            Column("id", Integer, primary_key=True),
+            Column("project_id", Integer, ForeignKey("research_projects.id")),
+            Column("created_at", DateTime),
+            Column("emotional_tone", JSON),
+            Column("emotional_summary", Text),
+            Column("themes", JSON),
+            Column("theme_details", JSON),
+            Column("objections", JSON),
+            Column("praise", JSON),
+            Column("pricing", JSON),
+            Column("participant_alignment", JSON),
+            Column("summary", Text),
+            Column("recommendations", JSON)
+        ),
+    ]
+
+def _create_research_tables(connection):
+    """Create the research project tables (existing tables are left untouched)."""
+    metadata = MetaData()
+    metadata.create_all(connection, tables=_research_tables_v1(metadata))
+
+def _create_lookup_indexes(connection):
+    """Add the project listing and child-row lookup indexes to databases created without them."""
+    metadata = MetaData()
+    projects, personas, questions, transcripts, analyses = _research_tables_v1(metadata)
+    indexes = [
+        Index("ix_research_projects_created_at_id", projects.c.created_at, projects.c.id),
+        Index("ix_personas_project_id", personas.c.project_id),
+        Index("ix_research_questions_project_id", questions.c.project_id),
+        Index("ix_transcripts_project_id", transcripts.c.project_id),
+        Index("ix_analyses_project_id", analyses.c.project_id),
+    ]
+    for index in indexes:
+        index.create(connection, checkfirst=True)
+
+def _create_persona_panel_table(connection):
+    """Create the persona panel library table."""
+    metadata = MetaData()
+    panels = Table(
+        "persona_panels", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("segment_hash", String(64), nullable=False),
+        Column("num_personas", Integer, nullable=False),
+        Column("target_segment", Text, nullable=False),
+        Column("personas", JSON, nullable=False),
+        Column("token_count", Integer),
+        Column("use_count", Integer),
+        Column("created_at", DateTime),
+        Column("last_used_at", DateTime),
+        Index("ix_persona_panels_segment", "segment_hash", "num_personas", unique=True)
+    )
+    metadata.create_all(connection, tables=[panels])
+
+def _create_usage_tables(connection):
+    """Create the usage ledger and the project run links."""
+    metadata = MetaData()
+    # Referenced by project_runs' foreign key; created by migration 1, not here
+    Table("research_projects", metadata, Column("id", Integer, primary_key=True))
+    ledger = Table(
+        "usage_ledger", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("created_at", DateTime, index=True),
+        Column("run_id", String(32), index=True),
+        Column("stage", String(50)),
+        Column("model", String(100)),
+        Column("key_hash", String(64), index=True),
+        Column("prompt_tokens", Integer),
+        Column("completion_tokens", Integer),
+        Column("total_tokens", Integer),
+        Column("cost_usd", Float),
+        Column("latency_ms", Float),
+        Column("cache_hit", Boolean)
+    )
+    runs = Table(
+        "project_runs", metadata,
+        Column("run_id", String(32), primary_key=True),
+        Column("project_id", Integer, ForeignKey("research_projects.id"), nullable=False, index=True)
+    )
+    metadata.create_all(connection, tables=[ledger, runs])
+
+# Schema migrations as (version, description, function taking a connection), in order.
+# Applied migrations are recorded in the schema_version table; never edit or reorder
+# a released migration, append a new one instead.
+MIGRATIONS = [
+    (1, "Create research project tables", _create_research_tables),
+    (2, "Index project listing and child lookups", _create_lookup_indexes),
+    (3, "Create persona panel library", _create_persona_panel_table),
+    (4, "Create usage ledger", _create_usage_tables),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version():
+    """
+    Return the version of the most recent migration applied to the database.
+    
+    Returns:
+        int: Schema version, or 0 if no migrations have been applied
+    """
+    engine = get_engine()
+    if not inspect(engine).has_table(SchemaMigration.__tablename__):
+        return 0
+    with engine.connect() as connection:
+        return connection.execute(select(func.max(SchemaMigration.version))).scalar() or 0
+
+def migrate(target=None):
+    """
+    Apply pending schema migrations, each in its own transaction.
+    
+    Args:
+        target (int): Version to migrate to (defaults to SCHEMA_VERSION)
+        
+    Returns:
+        list: Versions of the migrations that were applied
+    """
+    target = SCHEMA_VERSION if target is None else target
+    engine = get_engine()
+    SchemaMigration.__table__.create(engine, checkfirst=True)
+    
+    current = get_schema_version()
+    applied = []
+    for version, description, upgrade in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+        with engine.begin() as connection:
+            upgrade(connection)
+            connection.execute(insert(SchemaMigration).values(version=version, description=description))
+        applied.append(version)
+    return applied
+
+def check_schema():
+    """
+    Verify that the database schema is up to date.
+    
+    Returns:
+        int: Current schema version
+        
+    Raises:
+        SchemaOutOfDateError: If migrations are pending
+    """
+    current = get_schema_version()
+    if current < SCHEMA_VERSION:
+        raise SchemaOutOfDateError(
+            f"Database schema is at version {current}, expected {SCHEMA_VERSION}; "
+            "run backend/scripts/migrate_db.py"
+        )
+    return current
+
 def init_db():
-    """Initialize the database by creating all tables"""
-    Base.metadata.create_all(engine)
+    """Initialize the database by applying any pending migrations"""
+    return migrate()
+
+def _persona_row(project_id, persona_data):
+    """Map a persona dictionary to a personas table row."""
+    return {
+        'project_id': project_id,
+        'name': persona_data.get('name', ''),
+        'age': persona_data.get('age', 0),
+        'occupation': persona_data.get('occupation', ''),
+        'background': persona_data.get('background', ''),
+        'interests': persona_data.get('interests and hobbies', ''),
+        'media_consumption': persona_data.get('media consumption habits', ''),
+        'values': persona_data.get('values and motivations', ''),
+        'spending_habits': persona_data.get('spending habits and income level', ''),
+        'pain_points': persona_data.get('pain points relevant to product research', ''),
+        'communication_style': persona_data.get('communication style', '')
+    }
+
+def _analysis_row(project_id, analysis):
+    """Map an analysis dictionary to an analyses table row."""
+    return {
+        'project_id': project_id,
+        'emotional_tone': analysis.get('emotional_tone', {}),
+        'emotional_summary': analysis.get('emotional_summary', ''),
+        'themes': analysis.get('themes', {}),
+        'theme_details': analysis.get('theme_details', {}),
+        'objections': analysis.get('objections', []),
+        'praise': analysis.get('praise', []),
+        'pricing': analysis.get('pricing', {}),
+        'participant_alignment': analysis.get('participant_alignment', {}),
+        'summary': analysis.get('summary', ''),
+        'recommendations': analysis.get('recommendations', [])
+    }
 
-def save_research_project(name, product_concept, target_segment, research_questions, personas, transcript, analysis):
+def save_research_project(name, product_concept, target_segment, research_questions, personas, transcript, analysis,
+                          run_ids=None):
     """
     Save a complete research project to the database.
     
@@ -109,70 +546,88 @@ def save_research_project(name, product_concept, target_segment, research_questi
         personas (list): List of persona dictionaries
         transcript (str): Focus group transcript
         analysis (dict): Analysis results
+        run_ids (list): IDs of the research runs that produced the project, linking
+            their usage ledger records to it
         
     Returns:
         int: ID of the created research project
     """
-    session = Session()
+    return save_research_projects([{
+        'name': name,
+        'product_concept': product_concept,
+        'target_segment': target_segment,
+        'research_questions': research_questions,
+        'personas': personas,
+        'transcript': transcript,
+        'analysis': analysis,
+        'run_ids': run_ids
+    }])[0]
+
+def save_research_projects(projects):
+    """
+    Save several complete research projects in one transaction.
+    
+    Rows are written with bulk INSERT statements: one for the projects (returning
+    their ids) and one per child table covering every project, rather than one ORM
+    object per row. Either every project is saved or none is.
+    
+    Args:
+        projects (list): Project dictionaries with the keys accepted by
+            save_research_project (name, product_concept, target_segment,
+            research_questions, personas, transcript, analysis, run_ids)
+        
+    Returns:
+        list: IDs of the created research projects, in input order
+    """
+    if not projects:
+        return []
+    
+    session = get_session()
     
     try:
-        # Create research project
-        project = ResearchProject(
-            name=name,
-            product_concept=product_concept,
-            target_segment=target_segment
-        )
-        session.add(project)
-        session.flush()  # Generate ID for the project
+        # Create research projects
+        project_ids = session.scalars(
+            insert(ResearchProject).returning(ResearchProject.id, sort_by_parameter_order=True),
+            [
+                {
+                    'name': project['name'],
+                    'product_concept': project['product_concept'],
+                    'target_segment': project['target_segment']
+                }
+                for project in projects
+            ]
+        ).all()
         
-        # Add research questions
-        for question in research_questions:
-            q = ResearchQuestion(
-                project_id=project.id,
-                question_text=question
+        question_rows = []
+        persona_rows = []
+        transcript_rows = []
+        analysis_rows = []
+        run_rows = []
+        for project_id, project in zip(project_ids, projects):
+            question_rows.extend(
+                {'project_id': project_id, 'question_text': question}
+                for question in project.get('research_questions') or []
             )
-            session.add(q)
-        
-        # Add personas
-        for persona_data in personas:
-            persona = Persona(
-                project_id=project.id,
-                name=persona_data.get('name', ''),
-                age=persona_data.get('age', 0),
-                occupation=persona_data.get('occupation', ''),
-                background=persona_data.get('background', ''),
-                interests=persona_data.get('interests and hobbies', ''),
-                media_consumption=persona_data.get('media consumption habits', ''),
-                values=persona_data.get('values and motivations', ''),
-                spending_habits=persona_data.get('spending habits and income level', ''),
-                pain_points=persona_data.get('pain points relevant to product research', ''),
-                communication_style=persona_data.get('communication style', '')
+            persona_rows.extend(_persona_row(project_id, persona) for persona in project.get('personas') or [])
+            transcript_rows.append({'project_id': project_id, 'content': project.get('transcript') or ''})
+            analysis_rows.append(_analysis_row(project_id, project.get('analysis') or {}))
+            run_rows.extend(
+                {'run_id': run_id, 'project_id': project_id} for run_id in dict.fromkeys(project.get('run_ids') or [])
             )
-            session.add(persona)
         
-        # Add transcript
-        session.add(Transcript(
-            project_id=project.id,
-            content=transcript
-        ))
-        
-        # Add analysis
-        session.add(Analysis(
-            project_id=project.id,
-            emotional_tone=analysis.get('emotional_tone', {}),
-            emotional_summary=analysis.get('emotional_summary', ''),
-            themes=analysis.get('themes', {}),
-            theme_details=analysis.get('theme_details', {}),
-            objections=analysis.get('objections', []),
-            praise=analysis.get('praise', []),
-            pricing=analysis.get('pricing', {}),
-            participant_alignment=analysis.get('participant_alignment', {}),
-            summary=analysis.get('summary', ''),
-            recommendations=analysis.get('recommendations', [])
-        ))
+        # Add research questions, personas, transcripts, analyses and run links
+        for model, rows in (
+            (ResearchQuestion, question_rows),
+            (Persona, persona_rows),
+            (Transcript, transcript_rows),
+            (Analysis, analysis_rows),
+            (ProjectRun, run_rows)
+        ):
+            if rows:
+                session.execute(insert(model), rows)
         
         session.commit()
-        return project.id
+        return list(project_ids)
     
     except Exception as e:
         session.rollback()
@@ -181,30 +636,95 @@ def save_research_project(name, product_concept, target_segment, research_questi
     finally:
         session.close()
 
-def get_research_projects():
+def encode_cursor(created_at, project_id):
+    """Encode a project's position in the newest-first listing as an opaque cursor."""
+    raw = f"{created_at.isoformat()}|{project_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor into (created_at, project_id)."""
+    try:
+        created_at, project_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(created_at), int(project_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def get_research_projects_page(limit=DEFAULT_PAGE_SIZE, cursor=None, fields=None,
+                               preview_length=DEFAULT_PREVIEW_LENGTH):
     """
-    Get all research projects from the database.
+    Get one page of research projects, newest first.
     
+    Pages are fetched by keyset pagination on (created_at, id), so each page costs
+    the same regardless of how deep into the list it is. Only the requested columns
+    are selected, and long text fields are truncated in the database.
+    
+    Args:
+        limit (int): Maximum projects to return (capped at MAX_PAGE_SIZE)
+        cursor (str): The ``next_cursor`` from the previous page, or None for the first page
+        fields (list): Fields to include, from PROJECT_LIST_FIELDS ('id' is always included)
+        preview_length (int): Maximum characters of product_concept and target_segment
+            to return (0 returns the full text)
+        
     Returns:
-        list: List of project dictionaries with basic info
+        dict: ``projects`` (list of project dictionaries) and ``next_cursor``
+        (str, or None on the last page)
     """
-    session = Session()
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    fields = list(fields or PROJECT_LIST_FIELDS)
+    unknown = [field for field in fields if field not in PROJECT_LIST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown project fields: {', '.join(unknown)}")
+    if 'id' not in fields:
+        fields.insert(0, 'id')
     
-    try:
-        projects = session.query(ResearchProject).order_by(ResearchProject.created_at.desc()).all()
-        return [
-            {
-                'id': project.id,
-                'name': project.name,
-                'created_at': project.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'product_concept': project.product_concept,
-                'target_segment': project.target_segment
-            }
-            for project in projects
-        ]
+    # id and created_at are always selected because the cursor is built from them
+    columns = [ResearchProject.id, ResearchProject.created_at]
+    for field in fields:
+        if field in ('id', 'created_at'):
+            continue
+        column = getattr(ResearchProject, field)
+        if field in PREVIEW_FIELDS and preview_length:
+            column = func.substr(column, 1, preview_length).label(field)
+        columns.append(column)
     
+    query = (
+        select(*columns)
+        .order_by(ResearchProject.created_at.desc(), ResearchProject.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.where(or_(
+            ResearchProject.created_at < cursor_created_at,
+            and_(ResearchProject.created_at == cursor_created_at, ResearchProject.id < cursor_id)
+        ))
+    
+    session = get_session()
+    
+    try:
+        rows = session.execute(query).all()
     finally:
         session.close()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    projects = []
+    for row in rows:
+        values = row._mapping
+        project = {}
+        for field in fields:
+            if field == 'created_at':
+                project[field] = values['created_at'].strftime('%Y-%m-%d %H:%M:%S')
+            else:
+                project[field] = values[field]
+        projects.append(project)
+    
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+    return {
+        'projects': projects,
+        'next_cursor': next_cursor
+    }
 
 def get_project_details(project_id):
     """
@@ -216,13 +736,30 @@ def get_project_details(project_id):
     Returns:
         dict: Complete project data including personas, transcript, and analysis
     """
-    session = Session()
+    session = get_session()
     
     try:
-        # Get basic project info
-        project = session.query(ResearchProject).filter(ResearchProject.id == project_id).first()
-        if not project:
+        # Only the latest transcript and analysis are shown, so only those rows are loaded
+        latest_transcript_id = (
+            select(func.max(Transcript.id)).where(Transcript.project_id == project_id).scalar_subquery()
+        )
+        latest_analysis_id = (
+            select(func.max(Analysis.id)).where(Analysis.project_id == project_id).scalar_subquery()
+        )
+        
+        # One query for the project, its questions and the latest transcript and analysis,
+        # plus one for its personas
+        row = session.execute(
+            select(ResearchProject, Transcript.content, Analysis)
+            .select_from(ResearchProject)
+            .outerjoin(Transcript, Transcript.id == latest_transcript_id)
+            .outerjoin(Analysis, Analysis.id == latest_analysis_id)
+            .options(joinedload(ResearchProject.questions), selectinload(ResearchProject.personas))
+            .where(ResearchProject.id == project_id)
+        ).unique().first()
+        if not row:
             return None
+        project, transcript_content, analysis_obj = row
         
         # Get research questions
         questions = [q.question_text for q in project.questions]
@@ -245,12 +782,11 @@ def get_project_details(project_id):
             personas.append(persona)
         
         # Get transcript
-        transcript = project.transcripts[0].content if project.transcripts else ""
+        transcript = transcript_content or ""
         
         # Get analysis
         analysis = {}
-        if project.analyses:
-            analysis_obj = project.analyses[0]
+        if analysis_obj:
             analysis = {
                 'emotional_tone': analysis_obj.emotional_tone,
                 'emotional_summary': analysis_obj.emotional_summary,
@@ -292,7 +828,7 @@ def delete_project(project_id):
     Returns:
         bool: True if successful, False otherwise
     """
-    session = Session()
+    session = get_session()
     
     try:
         project = session.query(ResearchProject).filter(ResearchProject.id == project_id).first()
@@ -310,5 +846,275 @@ def delete_project(project_id):
     finally:
         session.close()
 
-# Initialize the database when this module is imported
-init_db()
\ No newline at end of file
+def normalize_segment(target_segment):
+    """
+    Normalize a target segment description for panel lookups.
+    
+    Case, surrounding punctuation and runs of whitespace are ignored, so
+    "Urban professionals, 25-40." and "urban  professionals, 25-40" match.
+    """
+    text = re.sub(r'\s+', ' ', str(target_segment)).strip().lower()
+    return text.strip(' .;:!?')
+
+def segment_hash(target_segment):
+    """Return the SHA-256 hash identifying a normalized target segment."""
+    return hashlib.sha256(normalize_segment(target_segment).encode('utf-8')).hexdigest()
+
+def _panel_dict(panel, include_personas=True):
+    data = {
+        'id': panel.id,
+        'target_segment': panel.target_segment,
+        'num_personas': panel.num_personas,
+        'token_count': panel.token_count or 0,
+        'use_count': panel.use_count or 0,
+        'created_at': panel.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'last_used_at': panel.last_used_at.strftime('%Y-%m-%d %H:%M:%S') if panel.last_used_at else None
+    }
+    if include_personas:
+        data['personas'] = panel.personas
+    return data
+
+def use_persona_panel(target_segment=None, num_personas=None, panel_id=None, max_age_days=None):
+    """
+    Look up a stored persona panel and record that it was reused.
+    
+    Args:
+        target_segment (str): Segment to match (after normalize_segment)
+        num_personas (int): Panel size to match
+        panel_id (int): Look the panel up by ID instead
+        max_age_days (float): Ignore a matching panel created longer ago than this
+            (not applied to lookups by ID)
+        
+    Returns:
+        dict: The panel, including its personas, or None if there is no match
+    """
+    if panel_id is not None:
+        condition = PersonaPanel.id == panel_id
+    else:
+        condition = and_(PersonaPanel.segment_hash == segment_hash(target_segment),
+                         PersonaPanel.num_personas == num_personas)
+        if max_age_days:
+            condition = and_(condition,
+                             PersonaPanel.created_at >= datetime.utcnow() - timedelta(days=max_age_days))
+    
+    session = get_session()
+    try:
+        panel = session.scalars(select(PersonaPanel).where(condition)).first()
+        if not panel:
+            return None
+        session.execute(
+            update(PersonaPanel)
+            .where(PersonaPanel.id == panel.id)
+            .values(use_count=PersonaPanel.use_count + 1, last_used_at=datetime.utcnow())
+        )
+        session.commit()
+        session.refresh(panel)
+        return _panel_dict(panel)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def save_persona_panel(target_segment, num_personas, personas, token_count=0, max_age_days=None):
+    """
+    Store a generated persona panel in the library.
+    
+    If a panel for the same segment and size already exists (for example one stored
+    concurrently by another request), it is kept and its ID is returned, unless it
+    is older than ``max_age_days``. A stale panel is replaced in place: the check and
+    the update are one statement, so a panel another request has just stored is
+    never overwritten, and the panel keeps its ID and use count.
+    
+    Args:
+        target_segment (str): Segment the panel was generated for
+        num_personas (int): Panel size that was requested
+        personas (list): List of persona dictionaries
+        token_count (int): Tokens spent generating the panel
+        max_age_days (float): Replace an existing panel created longer ago than this
+            (by default an existing panel is always kept)
+        
+    Returns:
+        int: ID of the stored panel
+    """
+    key = segment_hash(target_segment)
+    session = get_session()
+    try:
+        panel = PersonaPanel(
+            segment_hash=key,
+            num_personas=num_personas,
+            target_segment=target_segment,
+            personas=personas,
+            token_count=token_count,
+            use_count=0
+        )
+        session.add(panel)
+        session.commit()
+        return panel.id
+    except IntegrityError:
+        session.rollback()
+        panel_id = session.scalars(
+            select(PersonaPanel.id)
+            .where(PersonaPanel.segment_hash == key, PersonaPanel.num_personas == num_personas)
+        ).one()
+        if max_age_days:
+            session.execute(
+                update(PersonaPanel)
+                .where(PersonaPanel.id == panel_id,
+                       PersonaPanel.created_at < datetime.utcnow() - timedelta(days=max_age_days))
+                .values(target_segment=target_segment, personas=personas, token_count=token_count,
+                        created_at=datetime.utcnow())
+            )
+            session.commit()
+        return panel_id
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def get_persona_panels(limit=DEFAULT_PAGE_SIZE):
+    """
+    List stored persona panels, most reused first, without their personas.
+    
+    Args:
+        limit (int): Maximum number of panels (at most MAX_PAGE_SIZE)
+        
+    Returns:
+        list: Panel summaries
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    session = get_session()
+    try:
+        panels = session.scalars(
+            select(PersonaPanel).order_by(PersonaPanel.use_count.desc(), PersonaPanel.id.desc()).limit(limit)
+        ).all()
+        return [_panel_dict(panel, include_personas=False) for panel in panels]
+    finally:
+        session.close()
+
+def get_persona_panel(panel_id):
+    """Return a stored persona panel with its personas, or None if it does not exist."""
+    session = get_session()
+    try:
+        panel = session.get(PersonaPanel, panel_id)
+        return _panel_dict(panel) if panel else None
+    finally:
+        session.close()
+
+def get_persona_panel_stats():
+    """
+    Return persona panel library statistics.
+    
+    Every stored panel was generated once (a miss) and every reuse is a hit, so the
+    hit rate and the tokens saved by reuse are derived from the stored counters.
+    """
+    session = get_session()
+    try:
+        panels, hits, tokens_saved = session.execute(
+            select(
+                func.count(PersonaPanel.id),
+                func.coalesce(func.sum(PersonaPanel.use_count), 0),
+                func.coalesce(func.sum(PersonaPanel.use_count * PersonaPanel.token_count), 0)
+            )
+        ).one()
+    finally:
+        session.close()
+    lookups = panels + hits
+    return {
+        'panels': panels,
+        'hits': int(hits),
+        'misses': panels,
+        'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+        'tokens_saved': int(tokens_saved)
+    }
+
+def save_usage_records(records):
+    """
+    Write usage ledger records with one bulk INSERT.
+    
+    Args:
+        records (list): Dictionaries of UsageRecord columns
+    """
+    if not records:
+        return
+    with get_engine().begin() as connection:
+        connection.execute(insert(UsageRecord), records)
+
+# Ways usage can be grouped by get_usage_summary
+USAGE_GROUPS = ("project", "day", "key", "stage", "model")
+
+def get_usage_summary(group_by="stage", days=None, project_id=None, key_hash=None):
+    """
+    Aggregate the usage ledger.
+    
+    Rows are grouped by ``group_by`` and then by stage, so the most expensive stages
+    stand out within each project, day or key. Runs are attributed to a project once
+    it is saved with their run ids; usage from unsaved runs has a null project_id.
+    
+    Args:
+        group_by (str): One of USAGE_GROUPS
+        days (int): Only include calls from the last ``days`` days
+        project_id (int): Only include calls attributed to this project
+        key_hash (str): Only include calls made with this key (see hash_api_key)
+        
+    Returns:
+        list: Aggregates with calls, cache hits, prompt, completion and total tokens,
+        cost in USD and mean latency, most expensive first
+        
+    Raises:
+        ValueError: If ``group_by`` is not one of USAGE_GROUPS
+    """
+    if group_by not in USAGE_GROUPS:
+        raise ValueError(f"group_by must be one of: {', '.join(USAGE_GROUPS)}")
+    
+    group_columns = {
+        "project": ProjectRun.project_id.label('project_id'),
+        "day": func.date(UsageRecord.created_at).label('day'),
+        "key": UsageRecord.key_hash.label('key_hash'),
+        "stage": UsageRecord.stage.label('stage'),
+        "model": UsageRecord.model.label('model')
+    }
+    keys = [group_columns[group_by]]
+    if group_by != "stage":
+        keys.append(group_columns["stage"])
+    
+    total_tokens = func.coalesce(func.sum(UsageRecord.total_tokens), 0)
+    cost = func.coalesce(func.sum(UsageRecord.cost_usd), 0.0)
+    query = (
+        select(
+            *keys,
+            func.count(UsageRecord.id).label('calls'),
+            func.coalesce(func.sum(case((UsageRecord.cache_hit, 1), else_=0)), 0).label('cache_hits'),
+            func.coalesce(func.sum(UsageRecord.prompt_tokens), 0).label('prompt_tokens'),
+            func.coalesce(func.sum(UsageRecord.completion_tokens), 0).label('completion_tokens'),
+            total_tokens.label('total_tokens'),
+            cost.label('cost_usd'),
+            func.avg(UsageRecord.latency_ms).label('avg_latency_ms')
+        )
+        .select_from(UsageRecord)
+        .outerjoin(ProjectRun, ProjectRun.run_id == UsageRecord.run_id)
+        .group_by(*keys)
+        .order_by(cost.desc(), total_tokens.desc())
+    )
+    if days is not None:
+        query = query.where(UsageRecord.created_at >= datetime.utcnow() - timedelta(days=int(days)))
+    if project_id is not None:
+        query = query.where(ProjectRun.project_id == project_id)
+    if key_hash is not None:
+        query = query.where(UsageRecord.key_hash == key_hash)
+    
+    with get_engine().connect() as connection:
+        rows = connection.execute(query).mappings().all()
+    
+    summary = []
+    for row in rows:
+        item = dict(row)
+        if item.get('day') is not None:
+            item['day'] = str(item['day'])
+        item['cost_usd'] = round(float(item['cost_usd']), 6)
+        item['avg_latency_ms'] = round(float(item['avg_latency_ms']), 1) if item['avg_latency_ms'] is not None else None
+        for column in ('calls', 'cache_hits', 'prompt_tokens', 'completion_tokens', 'total_tokens'):
+            item[column] = int(item[column])
+        summary.append(item)
+    return summary
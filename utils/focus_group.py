@@ -1,32 +1,25 @@
 """Focus group simulator for the Synthetic Market Research Engine."""
 
 import logging
-from .openai_service import generate_openai_response, get_response_text, DEFAULT_FOCUS_GROUP_MODEL
+from .openai_service import (
+    generate_openai_response, stream_openai_response, get_response_text, DEFAULT_FOCUS_GROUP_MODEL
+)
+from .concurrency import map_concurrently
+from .metrics import timed_step
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def simulate_focus_group(personas, product_concept, research_questions):
-    """
-    Simulate a focus group discussion between the generated personas.
-    
-    Args:
-        personas (list): List of persona dictionaries
-        product_concept (str): Description of the product or service
-        research_questions (list): List of research questions to discuss
-        
-    Returns:
-        str: Structured transcript of the simulated focus group
-        int: Number of tokens used
-    """
-    logger.info(f"Simulating focus group discussion for {len(personas)} personas")
-    
-    # Format the research questions as a string
-    questions_text = "\n".join([f"{i+1}. {q}" for i, q in enumerate(research_questions)])
-    
-    # Format personas for the prompt
+# Heading prefix used to mark sections in a stitched transcript
+SECTION_MARKER = "## "
+
+# Output budget for each segment of a parallel focus group
+SEGMENT_MAX_TOKENS = 1500
+
+def _format_personas(personas):
+    """Format personas as a text block for focus group prompts."""
     personas_text = ""
     for i, persona in enumerate(personas):
         personas_text += f"Persona {i+1}: {persona['name']}, {persona['age']}, {persona['occupation']}\n"
@@ -35,6 +28,15 @@ def simulate_focus_group(personas, product_concept, research_questions):
         personas_text += f"Values: {persona.get('values', 'N/A')}\n"
         personas_text += f"Pain Points: {persona.get('pain_points', 'N/A')}\n"
         personas_text += f"Communication Style: {persona.get('communication_style', 'N/A')}\n\n"
+    return personas_text
+
+def _build_focus_group_messages(personas, product_concept, research_questions):
+    """Build the chat messages that ask the model for a focus group transcript."""
+    # Format the research questions as a string
+    questions_text = "\n".join([f"{i+1}. {q}" for i, q in enumerate(research_questions)])
+    
+    # Format personas for the prompt
+    personas_text = _format_personas(personas)
     
     # Construct the prompt for the OpenAI API
     system_message = """You are an expert market research moderator who can simulate realistic focus group discussions.
@@ -68,20 +70,191 @@ def simulate_focus_group(personas, product_concept, research_questions):
     values, and communication style. Include natural group dynamics and a mix of positive and negative feedback.
     """
     
+    return [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_message}
+    ]
+
+def build_focus_group_segments(research_questions):
+    """
+    Split a focus group session into independently generated segments.
+    
+    Args:
+        research_questions (list): List of research questions to discuss
+        
+    Returns:
+        list: Segment dictionaries with ``key``, ``title`` and, for question
+        segments, ``question``: an introduction, one per question, and a conclusion
+    """
+    segments = [{"key": "introduction", "title": "Introduction"}]
+    for i, question in enumerate(research_questions):
+        segments.append({
+            "key": f"question_{i+1}",
+            "title": f"Question {i+1}: {question}",
+            "question": question
+        })
+    segments.append({"key": "conclusion", "title": "Conclusion"})
+    return segments
+
+@timed_step("generate_focus_group_segment")
+def generate_focus_group_segment(segment, personas, product_concept, research_questions, api_key=None):
+    """
+    Generate the transcript for one segment of a focus group session.
+    
+    Every segment gets the same persona and concept context plus the full agenda, so
+    segments can be generated concurrently and still read as one session.
+    
+    Args:
+        segment (dict): A segment from build_focus_group_segments
+        personas (list): List of persona dictionaries
+        product_concept (str): Description of the product or service
+        research_questions (list): List of research questions to discuss
+        api_key (str): OpenAI API key for this request
+        
+    Returns:
+        str: Transcript text for the segment
+        int: Number of tokens used
+    """
+    questions_text = "\n".join([f"{i+1}. {q}" for i, q in enumerate(research_questions)])
+    personas_text = _format_personas(personas)
+    
+    if segment["key"] == "introduction":
+        task = """Write ONLY the opening of the session: the moderator welcomes the group and explains the format,
+    each persona briefly introduces themselves, and the moderator presents the product/service concept
+    and gathers first impressions. Stop before the first research question is asked."""
+    elif segment["key"] == "conclusion":
+        task = """Write ONLY the closing of the session: the moderator asks for final thoughts, each persona gives
+    a closing view of the product/service concept that is consistent with the discussion, and the moderator
+    thanks the group. Do not revisit the research questions in detail."""
+    else:
+        task = f"""Write ONLY the part of the session that covers this research question:
+    {segment["question"]}
+    The moderator introduces the question, each persona responds, and the group discusses it with
+    follow-up questions and natural back-and-forth. The introductions have already happened, so do not
+    repeat them, and do not cover the other research questions."""
+    
+    system_message = """You are an expert market research moderator who can simulate realistic focus group discussions.
+    You are writing one segment of a longer focus group transcript. Show each speaker with their name as a prefix,
+    keep personas true to their backgrounds, values, and communication styles, and include realistic group dynamics
+    like agreement, disagreement, and building on others' points. Do not add a section heading.
+    """
+    
+    user_message = f"""PRODUCT/SERVICE CONCEPT:
+    {product_concept}
+    
+    FULL SESSION AGENDA:
+    {questions_text}
+    
+    PERSONAS:
+    {personas_text}
+    
+    {task}
+    """
+    
     messages = [
         {"role": "system", "content": system_message},
         {"role": "user", "content": user_message}
     ]
     
+    response, token_count = generate_openai_response(
+        messages=messages,
+        model=DEFAULT_FOCUS_GROUP_MODEL,
+        temperature=0.8,
+        max_tokens=SEGMENT_MAX_TOKENS,
+        api_key=api_key
+    )
+    
+    return get_response_text(response).strip(), token_count
+
+def stitch_transcript(segments, texts):
+    """Join segment transcripts into one transcript with a heading per section."""
+    return "\n\n".join(
+        f"{SECTION_MARKER}{segment['title']}\n\n{text}" for segment, text in zip(segments, texts)
+    )
+
+@timed_step("simulate_focus_group")
+def simulate_focus_group(personas, product_concept, research_questions, api_key=None, parallel=False):
+    """
+    Simulate a focus group discussion between the generated personas.
+    
+    In parallel mode the introduction, each research question and the conclusion are
+    generated concurrently and stitched together with section headings, so wall time
+    follows the longest segment and long agendas are not truncated by one output limit.
+    
+    Args:
+        personas (list): List of persona dictionaries
+        product_concept (str): Description of the product or service
+        research_questions (list): List of research questions to discuss
+        api_key (str): OpenAI API key for this request
+        parallel (bool): Generate the session as concurrent per-question segments
+        
+    Returns:
+        str: Structured transcript of the simulated focus group
+        int: Number of tokens used
+    """
+    logger.info(f"Simulating focus group discussion for {len(personas)} personas")
+    
+    if parallel:
+        segments = build_focus_group_segments(research_questions)
+        results = map_concurrently(
+            lambda segment: generate_focus_group_segment(
+                segment, personas, product_concept, research_questions, api_key=api_key
+            ),
+            segments
+        )
+        transcript = stitch_transcript(segments, [text for text, _ in results])
+        token_count = sum(tokens for _, tokens in results)
+        logger.info(f"Generated {len(segments)} focus group segments using {token_count} tokens")
+        return transcript, token_count
+    
+    messages = _build_focus_group_messages(personas, product_concept, research_questions)
+    
     # Call the OpenAI API to generate the focus group transcript
     response, token_count = generate_openai_response(
         messages=messages,
         model=DEFAULT_FOCUS_GROUP_MODEL,
-        temperature=0.8
+        temperature=0.8,
+        api_key=api_key
     )
     
     # Get the transcript text
     transcript = get_response_text(response)
     
     logger.info(f"Generated focus group transcript using {token_count} tokens")
-    return transcript, token_count
\ No newline at end of file
+    return transcript, token_count
+
+def stream_focus_group(personas, product_concept, research_questions, api_key=None):
+    """
+    Simulate a focus group discussion, yielding the transcript as it is generated.
+    
+    Args:
+        personas (list): List of persona dictionaries
+        product_concept (str): Description of the product or service
+        research_questions (list): List of research questions to discuss
+        api_key (str): OpenAI API key for this request
+        
+    Yields:
+        dict: ``{"type": "chunk", "text": ...}`` for each piece of the transcript, then a
+        final ``{"type": "done", "transcript": ..., "token_count": ...}``
+    """
+    logger.info(f"Streaming focus group discussion for {len(personas)} personas")
+    
+    messages = _build_focus_group_messages(personas, product_concept, research_questions)
+    stream = stream_openai_response(
+        messages=messages,
+        model=DEFAULT_FOCUS_GROUP_MODEL,
+        temperature=0.8,
+        api_key=api_key
+    )
+    
+    chunks = []
+    try:
+        for text in stream:
+            chunks.append(text)
+            yield {"type": "chunk", "text": text}
+    finally:
+        stream.close()
+    
+    transcript = "".join(chunks)
+    logger.info(f"Streamed focus group transcript using {stream.token_count} tokens")
+    yield {"type": "done", "transcript": transcript, "token_count": stream.token_count}
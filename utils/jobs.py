@@ -0,0 +1,324 @@
+"""Background job queue for long-running research generation."""
+
+import os
+import json
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Job queue settings
+JOB_BACKEND = os.environ.get("JOB_BACKEND", "memory")  # "memory" or "sqlite"
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", "jobs.sqlite3")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", "100"))
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION", "3600"))  # seconds
+
+# Job and stage statuses
+STATUS_PENDING = "pending"
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def _new_job(kind, stages):
+    now = _now()
+    return {
+        'id': uuid.uuid4().hex,
+        'kind': kind,
+        'status': STATUS_QUEUED,
+        'stages': {
+            stage: {'status': STATUS_PENDING, 'started_at': None, 'finished_at': None}
+            for stage in stages
+        },
+        'result': None,
+        'error': None,
+        'created_at': now,
+        'updated_at': now
+    }
+
+class InMemoryJobStore:
+    """Job store that keeps jobs in process memory."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job):
+        with self._lock:
+            self._jobs[job['id']] = json.loads(json.dumps(job))
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job.update(fields)
+                job['updated_at'] = _now()
+
+    def update_stage(self, job_id, stage, status):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                _apply_stage(job, stage, status)
+
+    def purge(self, before):
+        """Delete finished jobs last updated before the given timestamp string."""
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job['status'] in (STATUS_COMPLETED, STATUS_FAILED) and job['updated_at'] < before
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+            return len(expired)
+
+def _process_alive(pid):
+    """Return True if a process with this id exists on this host."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+def _process_start_time(pid):
+    """
+    Return when a process started, in clock ticks since boot, or '' where that is unknown.
+
+    Together with the pid this identifies a process even after the pid is reused.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return ''
+    # The command name may contain spaces, so count fields from the end of it
+    fields = stat.rpartition(')')[2].split()
+    return fields[19] if len(fields) > 19 else ''
+
+def _owner_alive(owner_pid, owner_start):
+    """Return True if the process that recorded this pid and start time is still running."""
+    if not _process_alive(owner_pid):
+        return False
+    if not owner_start:
+        return True  # Recorded without a start time; the pid is all we can check
+    current_start = _process_start_time(owner_pid)
+    return not current_start or current_start == owner_start
+
+class SQLiteJobStore:
+    """
+    Job store backed by a local SQLite file, so job status survives restarts.
+
+    Several processes may share the file. Each job records the process that owns it
+    as "host:pid:start", where start is the process start time where the platform
+    reports it, and a new store only fails the in-flight jobs of owners on this host
+    that are no longer running. The start time tells a stopped owner apart from an
+    unrelated process that was later given the same pid.
+    """
+
+    def __init__(self, path=JOB_DB_PATH):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{_process_start_time(os.getpid())}"
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT, status TEXT, data TEXT, updated_at TEXT, owner TEXT)"
+            )
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+            if 'owner' not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            self._fail_orphaned_jobs()
+
+    def _fail_orphaned_jobs(self):
+        """Fail in-flight jobs whose owning process stopped, since they can never finish."""
+        host = socket.gethostname()
+        for data, owner in self._conn.execute(
+            "SELECT data, owner FROM jobs WHERE status IN (?, ?)", (STATUS_QUEUED, STATUS_RUNNING)
+        ).fetchall():
+            parts = (owner or '').split(':')
+            if len(parts) == 2:
+                parts.append('')  # Recorded before owners carried a start time
+            if owner and (len(parts) != 3 or parts[0] != host or not parts[1].isdigit()):
+                continue  # Owned by another host, whose processes we cannot check
+            if owner and owner != self._owner and _owner_alive(int(parts[1]), parts[2]):
+                continue  # Still being run by another live process
+            job = json.loads(data)
+            job['status'] = STATUS_FAILED
+            job['error'] = "Job interrupted by a server restart"
+            self._write(job, owner)
+
+    def _write(self, job, owner=None):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO jobs (id, kind, status, data, updated_at, owner) VALUES (?, ?, ?, ?, ?, ?)",
+            (job['id'], job['kind'], job['status'], json.dumps(job), job['updated_at'], owner or self._owner)
+        )
+
+    def _read(self, job_id):
+        row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def create(self, job):
+        with self._lock, self._conn:
+            self._write(job)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._read(job_id)
+
+    def update(self, job_id, **fields):
+        with self._lock, self._conn:
+            job = self._read(job_id)
+            if job:
+                job.update(fields)
+                job['updated_at'] = _now()
+                self._write(job)
+
+    def update_stage(self, job_id, stage, status):
+        with self._lock, self._conn:
+            job = self._read(job_id)
+            if job:
+                _apply_stage(job, stage, status)
+                self._write(job)
+
+    def purge(self, before):
+        """Delete finished jobs last updated before the given timestamp string."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (STATUS_COMPLETED, STATUS_FAILED, before)
+            )
+            return cursor.rowcount
+
+def _apply_stage(job, stage, status):
+    """Record a stage transition on a job dictionary."""
+    stage_info = job['stages'].setdefault(
+        stage, {'status': STATUS_PENDING, 'started_at': None, 'finished_at': None}
+    )
+    stage_info['status'] = status
+    if status == STATUS_RUNNING:
+        stage_info['started_at'] = _now()
+    elif status in (STATUS_COMPLETED, STATUS_FAILED):
+        stage_info['finished_at'] = _now()
+    job['updated_at'] = _now()
+
+class JobManager:
+    """
+    Runs jobs on a bounded worker pool and records their progress in a job store.
+
+    Submitting returns immediately with a job id. At most ``max_workers`` jobs run
+    at once; at most ``max_pending`` jobs may be queued or running before new
+    submissions are rejected with JobQueueFullError.
+    """
+
+    def __init__(self, store, max_workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING,
+                 retention=JOB_RETENTION):
+        self.store = store
+        self.max_pending = max_pending
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, kind, func, stages, **kwargs):
+        """
+        Queue a job.
+
+        Args:
+            kind (str): Job type, e.g. "research"
+            func (callable): Called as ``func(on_stage=callback, **kwargs)``; its return
+                value becomes the job result
+            stages (tuple): Stage names reported by the job
+            **kwargs: Arguments for ``func``. They are kept in memory only and never
+                written to the job store, so secrets such as API keys stay out of it.
+
+        Returns:
+            str: The job id
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFullError("Too many jobs in progress. Please try again later.")
+            self._pending += 1
+
+        self._purge_expired()
+        job = _new_job(kind, stages)
+        self.store.create(job)
+        try:
+            self._executor.submit(self._run, job['id'], func, kwargs)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return job['id']
+
+    def get(self, job_id):
+        """Return a job dictionary, or None if it does not exist."""
+        return self.store.get(job_id)
+
+    def stats(self):
+        """Return the number of queued or running jobs."""
+        with self._lock:
+            return {"pending": self._pending, "max_pending": self.max_pending}
+
+    def _run(self, job_id, func, kwargs):
+        current_stage = [None]
+
+        def on_stage(stage, status):
+            current_stage[0] = stage
+            self.store.update_stage(job_id, stage, status)
+
+        try:
+            self.store.update(job_id, status=STATUS_RUNNING)
+            result = func(on_stage=on_stage, **kwargs)
+            self.store.update(job_id, status=STATUS_COMPLETED, result=result)
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            if current_stage[0]:
+                self.store.update_stage(job_id, current_stage[0], STATUS_FAILED)
+            self.store.update(job_id, status=STATUS_FAILED, error=str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _purge_expired(self):
+        if self.retention <= 0:
+            return
+        before = (datetime.now(timezone.utc) - timedelta(seconds=self.retention)).strftime('%Y-%m-%d %H:%M:%S')
+        self.store.purge(before)
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+def get_job_manager():
+    """Return the process-wide job manager, creating it on first use."""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            if JOB_BACKEND == "sqlite":
+                store = SQLiteJobStore(JOB_DB_PATH)
+            else:
+                store = InMemoryJobStore()
+            _job_manager = JobManager(store)
+        return _job_manager
@@ -0,0 +1,356 @@
+"""In-process metrics with Prometheus text exposition."""
+
+import os
+import time
+import bisect
+import threading
+import functools
+from contextlib import contextmanager
+
+# Set METRICS_ENABLED=0 to turn every metric update into a no-op
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# Histogram bucket upper bounds in seconds, covering fast DB queries to long OpenAI calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    """
+    Base class for a metric family with optional labels.
+
+    Each combination of label values has its own child, created on first use. Label
+    values are passed positionally in the order of ``labelnames``.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        # A metric without labels is exposed (as zero) before its first update
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, *values):
+        """Return the child for these label values."""
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        """Child for a metric without labels."""
+        return self.labels()
+
+    def collect(self):
+        """Return the metric family in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            lines.extend(child.samples(self.name, self.labelnames, values))
+        return lines
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if METRICS_ENABLED:
+            with self._lock:
+                self._value += amount
+
+    def samples(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self._value)}"]
+
+class Counter(_Metric):
+    """A value that only goes up, such as a request or error count."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+class _GaugeChild:
+    def __init__(self):
+        self._value = 0.0
+        self._function = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if METRICS_ENABLED:
+            with self._lock:
+                self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def set_function(self, function):
+        """Read the value from ``function()`` at collection time instead."""
+        self._function = function
+
+    @contextmanager
+    def track_inprogress(self):
+        """Count the block as in progress while it runs."""
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+    def samples(self, name, labelnames, values):
+        value = self._value
+        if self._function is not None:
+            try:
+                value = float(self._function())
+            except Exception:
+                return []
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(value)}"]
+
+class Gauge(_Metric):
+    """A value that goes up and down, such as requests in flight."""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def set(self, value):
+        self._default().set(value)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+    def track_inprogress(self):
+        return self._default().track_inprogress()
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        if not METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self):
+        """Observe how long the block takes, in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def samples(self, name, labelnames, values):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._buckets + (float("inf"),), counts):
+            cumulative += count
+            le = f'le="{_format_value(float(bound))}"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {cumulative}")
+        return lines
+
+class Histogram(_Metric):
+    """
+    Counts observations (such as durations) in cumulative buckets.
+
+    Observing is a bisect over the bucket bounds and one locked increment, so it is
+    cheap enough for the request path.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+class Registry:
+    """A set of metric families rendered together."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Add a metric, or return the already registered metric of the same name."""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# Content type of render() output
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def counter(name, documentation, labelnames=()):
+    """Create (or return) a counter in the default registry."""
+    return registry.register(Counter(name, documentation, labelnames))
+
+def gauge(name, documentation, labelnames=()):
+    """Create (or return) a gauge in the default registry."""
+    return registry.register(Gauge(name, documentation, labelnames))
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """Create (or return) a histogram in the default registry."""
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+def render_metrics():
+    """Return the default registry in the Prometheus text format."""
+    return registry.render()
+
+# Metrics shared across modules
+
+STEP_DURATION = histogram(
+    "research_step_duration_seconds", "Duration of research steps", ("step",)
+)
+STEP_ERRORS = counter(
+    "research_step_errors_total", "Research steps that raised an exception", ("step",)
+)
+STEPS_IN_FLIGHT = gauge(
+    "research_steps_in_flight", "Research steps currently running", ("step",)
+)
+
+def timed_step(step):
+    """
+    Decorate a research function to record its duration, errors and concurrency.
+
+    Args:
+        step (str): Value of the ``step`` label, usually the function name
+    """
+    duration = STEP_DURATION.labels(step)
+    errors = STEP_ERRORS.labels(step)
+    in_flight = STEPS_IN_FLIGHT.labels(step)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            in_flight.inc()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                in_flight.dec()
+                duration.observe(time.perf_counter() - started)
+        return wrapper
+
+    return decorator
+
+DB_QUERY_DURATION = histogram(
+    "db_query_duration_seconds", "Duration of database statements", ("operation",)
+)
+DB_QUERY_ERRORS = counter("db_query_errors_total", "Database statements that raised an error", ("operation",))
+DB_QUERIES_IN_FLIGHT = gauge("db_queries_in_flight", "Database statements currently executing")
+
+_sqlalchemy_instrumented = False
+
+def _statement_operation(statement):
+    """Return the SQL verb of a statement (SELECT, INSERT, ...), as a low-cardinality label."""
+    verb = statement.lstrip().split(None, 1)[0] if statement.strip() else ""
+    return verb.upper() or "OTHER"
+
+def instrument_sqlalchemy():
+    """
+    Time every statement run by any SQLAlchemy engine in this process.
+
+    The listeners are attached to the Engine class, so engines created later (the
+    database module creates its engine lazily) are covered too. Safe to call more
+    than once.
+    """
+    global _sqlalchemy_instrumented
+    if _sqlalchemy_instrumented:
+        return
+    _sqlalchemy_instrumented = True
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    # executemany runs one statement for many rows, so each timing is one round trip
+    @event.listens_for(Engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+        DB_QUERIES_IN_FLIGHT.inc()
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_started"].pop()
+        DB_QUERIES_IN_FLIGHT.dec()
+        DB_QUERY_DURATION.labels(_statement_operation(statement)).observe(time.perf_counter() - started)
+
+    @event.listens_for(Engine, "handle_error")
+    def handle_error(exception_context):
+        stack = exception_context.connection.info.get("metrics_started") if exception_context.connection else None
+        if stack:
+            stack.pop()
+            DB_QUERIES_IN_FLIGHT.dec()
+        DB_QUERY_ERRORS.labels(_statement_operation(exception_context.statement or "")).inc()
@@ -1,63 +1,630 @@
 """OpenAI service utilities for the Synthetic Market Research Engine."""
 
 import os
-from openai import OpenAI
+import random
+import hashlib
+import threading
+import time
+from contextlib import ExitStack
+from email.utils import parsedate_to_datetime
+from collections import OrderedDict, deque
 import json
 import logging
+from .response_cache import response_cache, make_cache_key
+from .concurrency import call_slot
+from .usage import record_usage
+from .metrics import counter, gauge, histogram
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# The openai SDK takes about half a second to import, so it is only imported when a
+# client is first needed; entry points that never call OpenAI do not pay for it.
+
 # Constants
 DEFAULT_MODEL = "gpt-4o"  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024. do not change this unless explicitly requested by the user
 DEFAULT_PERSONAS_MODEL = "gpt-4o"
 DEFAULT_FOCUS_GROUP_MODEL = "gpt-4o"
 DEFAULT_ANALYSIS_MODEL = "gpt-4o"
 
-def get_openai_client():
-    """Initialize and return an OpenAI client."""
-    api_key = os.environ.get("OPENAI_API_KEY")
+# Context window sizes in tokens, for sizing prompts; unknown models get DEFAULT_CONTEXT_TOKENS
+MODEL_CONTEXT_TOKENS = {
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+
+# API key validation cache settings (seconds / entries)
+API_KEY_CACHE_TTL = float(os.environ.get("API_KEY_CACHE_TTL", "300"))
+API_KEY_CACHE_NEGATIVE_TTL = float(os.environ.get("API_KEY_CACHE_NEGATIVE_TTL", "60"))
+API_KEY_CACHE_MAX_SIZE = int(os.environ.get("API_KEY_CACHE_MAX_SIZE", "1024"))
+
+def hash_api_key(api_key):
+    """Return a stable, non-reversible identifier for an API key."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+class ApiKeyValidationCache:
+    """
+    Thread-safe cache of API key validation results.
+    
+    Entries are keyed by a SHA-256 hash of the key so raw keys are never held in
+    memory longer than the request that carried them. Valid keys are remembered for
+    ``ttl`` seconds and rejected keys for ``negative_ttl`` seconds; once ``max_size``
+    entries are stored the least recently used entry is evicted.
+    """
+    
+    def __init__(self, ttl=API_KEY_CACHE_TTL, negative_ttl=API_KEY_CACHE_NEGATIVE_TTL,
+                 max_size=API_KEY_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, api_key):
+        """Return the cached validation result for a key, or None if unknown or expired."""
+        key_hash = hash_api_key(api_key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key_hash)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[key_hash]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key_hash)
+            self.hits += 1
+            return entry[0]
+    
+    def set(self, api_key, is_valid):
+        """Remember the validation result for a key."""
+        ttl = self.ttl if is_valid else self.negative_ttl
+        if ttl <= 0:
+            return
+        key_hash = hash_api_key(api_key)
+        with self._lock:
+            self._entries[key_hash] = (is_valid, time.monotonic() + ttl)
+            self._entries.move_to_end(key_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Drop all cached results."""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0
+            }
+
+_api_key_cache = ApiKeyValidationCache()
+
+# OpenAI client registry settings (entries / seconds)
+OPENAI_CLIENT_POOL_SIZE = int(os.environ.get("OPENAI_CLIENT_POOL_SIZE", "64"))
+OPENAI_CLIENT_IDLE_TIMEOUT = float(os.environ.get("OPENAI_CLIENT_IDLE_TIMEOUT", "600"))
+
+def _create_client(api_key):
+    """Create an OpenAI client. Retries are handled by call_with_retry, not the SDK."""
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, max_retries=0)
+
+class OpenAIClientRegistry:
+    """
+    Thread-safe registry of OpenAI clients, one per API key.
+    
+    Each OpenAI client owns an HTTP connection pool, so handing out the same client for
+    a key lets every request and pipeline stage reuse its keep-alive connections
+    instead of paying a new TCP+TLS handshake per call. The registry holds at most
+    ``max_size`` clients and drops those unused for ``idle_timeout`` seconds. Dropped
+    clients are not closed explicitly, since another thread may still be using one;
+    their connections are released when the client is garbage collected.
+    """
+    
+    def __init__(self, max_size=OPENAI_CLIENT_POOL_SIZE, idle_timeout=OPENAI_CLIENT_IDLE_TIMEOUT,
+                 client_factory=_create_client):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._client_factory = client_factory
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.created = 0
+        self.evictions = 0
+    
+    def get(self, api_key):
+        """Return the pooled client for a key, creating it on first use."""
+        key_hash = hash_api_key(api_key)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.get(key_hash)
+            if entry is not None:
+                entry[1] = now
+                self._clients.move_to_end(key_hash)
+                self.hits += 1
+                return entry[0]
+            
+            client = self._client_factory(api_key=api_key)
+            self._clients[key_hash] = [client, now]
+            self.created += 1
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+                self.evictions += 1
+            return client
+    
+    def _evict_idle(self, now):
+        """Drop clients that have been idle longer than the idle timeout (lock held)."""
+        while self._clients:
+            key_hash, (_, last_used) = next(iter(self._clients.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            del self._clients[key_hash]
+            self.evictions += 1
+    
+    def clear(self):
+        """Drop all pooled clients."""
+        with self._lock:
+            self._clients.clear()
+    
+    def stats(self):
+        """Return pool size and reuse counters."""
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            return {
+                "size": len(self._clients),
+                "max_size": self.max_size,
+                "idle_timeout": self.idle_timeout,
+                "hits": self.hits,
+                "created": self.created,
+                "evictions": self.evictions
+            }
+
+_client_registry = OpenAIClientRegistry()
+
+def get_openai_client(api_key=None):
+    """
+    Return the pooled OpenAI client for an API key.
+    
+    Args:
+        api_key (str): The caller's OpenAI API key. Falls back to the OPENAI_API_KEY
+            environment variable for command-line use.
+    """
+    api_key = api_key or os.environ.get("OPENAI_API_KEY")
     if not api_key:
         logger.error("No OpenAI API key found in environment")
         raise ValueError("OpenAI API key not found. Please set the OPENAI_API_KEY environment variable.")
     
-    return OpenAI(api_key=api_key)
+    return _client_registry.get(api_key)
+
+def get_client_pool_stats():
+    """Return statistics for the OpenAI client registry."""
+    return _client_registry.stats()
 
-def validate_api_key():
-    """Check if the provided OpenAI API key is valid."""
+def get_response_cache_stats():
+    """Return statistics for the OpenAI response cache."""
+    return response_cache.stats()
+
+def validate_api_key(api_key=None, use_cache=True):
+    """
+    Check if the provided OpenAI API key is valid.
+    
+    Results are cached per key (see ApiKeyValidationCache), so a key is only checked
+    against the API once per cache window. Only authentication failures are cached;
+    transient errors such as timeouts are retried on the next call.
+    
+    Args:
+        api_key (str): The key to validate (defaults to OPENAI_API_KEY)
+        use_cache (bool): Whether to consult and update the validation cache
+        
+    Returns:
+        bool: True if the key is valid
+    """
+    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    if use_cache and api_key:
+        cached = _api_key_cache.get(api_key)
+        if cached is not None:
+            return cached
+    
+    from openai import AuthenticationError
+    
     try:
-        client = get_openai_client()
+        client = get_openai_client(api_key)
         # Make a minimal API call to verify the key
-        response = client.models.list()
-        return True
+        client.models.list()
+    except AuthenticationError as e:
+        logger.error(f"API key validation failed: {str(e)}")
+        if use_cache:
+            _api_key_cache.set(api_key, False)
+        return False
     except Exception as e:
         logger.error(f"API key validation failed: {str(e)}")
         return False
+    
+    if use_cache:
+        _api_key_cache.set(api_key, True)
+    return True
+
+def get_api_key_cache_stats():
+    """Return statistics for the API key validation cache."""
+    return _api_key_cache.stats()
+
+# Client-side rate limits per API key (0 disables a limit). Limits depend on the key's
+# usage tier, so they are off unless set to match it.
+OPENAI_RPM_LIMIT = int(os.environ.get("OPENAI_RPM_LIMIT", "0"))
+OPENAI_TPM_LIMIT = int(os.environ.get("OPENAI_TPM_LIMIT", "0"))
+OPENAI_RATE_LIMIT_TIMEOUT = float(os.environ.get("OPENAI_RATE_LIMIT_TIMEOUT", "120"))  # seconds
+# Completion size assumed when a call does not set max_tokens
+DEFAULT_COMPLETION_ESTIMATE = 1000
+
+class RateLimitTimeoutError(Exception):
+    """Raised when a call waits too long for client-side rate limit budget."""
+
+def estimate_tokens(messages, max_tokens=None):
+    """Roughly estimate the tokens a chat completion will use (about 4 characters per token)."""
+    prompt_chars = sum(len(str(message.get("content", ""))) for message in messages)
+    return prompt_chars // 4 + 4 * len(messages) + (max_tokens or DEFAULT_COMPLETION_ESTIMATE)
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute token buckets for one API key.
+    
+    Both buckets refill continuously and start full. Callers that find the budget
+    exhausted block in a FIFO queue, so requests are served in arrival order rather
+    than all waking up together once budget frees up. Token charges are estimates;
+    ``adjust`` settles them against actual usage once a response arrives.
+    """
+    
+    def __init__(self, rpm=OPENAI_RPM_LIMIT, tpm=OPENAI_TPM_LIMIT):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self.acquired = 0
+        self.waited = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+    
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(float(self.rpm), self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(float(self.tpm), self._tokens + elapsed * self.tpm / 60)
+    
+    def _wait_needed(self, tokens):
+        """Seconds until both buckets can cover a request (0 if they already can)."""
+        wait = 0.0
+        if self.rpm and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+        if self.tpm and self._tokens < tokens:
+            wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+        return wait
+    
+    def acquire(self, tokens, timeout=OPENAI_RATE_LIMIT_TIMEOUT):
+        """
+        Block until one request and ``tokens`` tokens of budget are available, then take them.
+        
+        Args:
+            tokens (int): Estimated tokens for the request
+            timeout (float): Maximum seconds to wait (None waits indefinitely)
+        """
+        if self.tpm:
+            # A request larger than the whole bucket would otherwise wait forever
+            tokens = min(tokens, self.tpm)
+        ticket = object()
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+        
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = self._wait_needed(tokens) if self._queue[0] is ticket else None
+                    if wait == 0:
+                        break
+                    if deadline is not None and now >= deadline:
+                        self.timeouts += 1
+                        raise RateLimitTimeoutError("Timed out waiting for OpenAI rate limit budget")
+                    # Callers behind the head of the queue wait to be notified
+                    limit = wait if wait is not None else 1.0
+                    if deadline is not None:
+                        limit = min(limit, deadline - now)
+                    self._cond.wait(timeout=limit)
+            except BaseException:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+                raise
+            
+            self._queue.popleft()
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+            self.acquired += 1
+            waited = time.monotonic() - started
+            if waited > 0.001:
+                self.waited += 1
+                self.wait_time += waited
+            self._cond.notify_all()
+    
+    def adjust(self, estimated, actual):
+        """Settle an estimated token charge against the tokens actually used."""
+        if not self.tpm:
+            return
+        with self._cond:
+            self._refill(time.monotonic())
+            self._tokens = min(float(self.tpm), self._tokens + min(estimated, self.tpm) - actual)
+            self._cond.notify_all()
+    
+    def stats(self):
+        """Return remaining budget, queue length and wait counters."""
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                "rpm_limit": self.rpm,
+                "tpm_limit": self.tpm,
+                "requests_available": round(self._requests, 2) if self.rpm else None,
+                "tokens_available": round(self._tokens) if self.tpm else None,
+                "requests_used_pct": round(100 * (1 - self._requests / self.rpm), 1) if self.rpm else None,
+                "tokens_used_pct": round(100 * (1 - self._tokens / self.tpm), 1) if self.tpm else None,
+                "queued": len(self._queue),
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "wait_time_seconds": round(self.wait_time, 3),
+                "timeouts": self.timeouts
+            }
+
+_rate_limiters = OrderedDict()
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(api_key):
+    """Return the shared rate limiter for an API key, or None if limits are disabled."""
+    if not OPENAI_RPM_LIMIT and not OPENAI_TPM_LIMIT:
+        return None
+    key_hash = hash_api_key(api_key)
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(key_hash)
+        if limiter is None:
+            limiter = _rate_limiters[key_hash] = RateLimiter()
+            while len(_rate_limiters) > OPENAI_CLIENT_POOL_SIZE:
+                _rate_limiters.popitem(last=False)
+        _rate_limiters.move_to_end(key_hash)
+        return limiter
+
+def get_rate_limit_stats():
+    """Return budget usage for each API key, identified by a prefix of its hash."""
+    with _rate_limiters_lock:
+        limiters = list(_rate_limiters.items())
+    return {key_hash[:12]: limiter.stats() for key_hash, limiter in limiters}
+
+# Retry settings (attempts / seconds)
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "5"))
+OPENAI_BACKOFF_BASE = float(os.environ.get("OPENAI_BACKOFF_BASE", "1.0"))
+OPENAI_BACKOFF_MAX = float(os.environ.get("OPENAI_BACKOFF_MAX", "30"))
+OPENAI_CALL_DEADLINE = float(os.environ.get("OPENAI_CALL_DEADLINE", "180"))
+
+class RetryStats:
+    """Thread-safe counters describing retries of OpenAI calls."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.retries_by_reason = {}
+        self.exhausted = 0
+        self.time_lost = 0.0
+    
+    def record_call(self):
+        with self._lock:
+            self.calls += 1
+    
+    def record_retry(self, reason, time_lost):
+        with self._lock:
+            self.retries += 1
+            self.retries_by_reason[reason] = self.retries_by_reason.get(reason, 0) + 1
+            self.time_lost += time_lost
+    
+    def record_exhausted(self, time_lost):
+        with self._lock:
+            self.exhausted += 1
+            self.time_lost += time_lost
+    
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "retries_by_reason": dict(self.retries_by_reason),
+                "exhausted": self.exhausted,
+                "time_lost_seconds": round(self.time_lost, 3)
+            }
+
+_retry_stats = RetryStats()
+
+def _retry_reason(error):
+    """Return why an error is worth retrying, or None if it is not."""
+    from openai import RateLimitError, APITimeoutError, APIConnectionError, APIStatusError
+    
+    if isinstance(error, RateLimitError):
+        # An exhausted quota will not recover by waiting
+        if getattr(error, "code", None) == "insufficient_quota":
+            return None
+        return "rate_limit"
+    if isinstance(error, APITimeoutError):
+        return "timeout"
+    if isinstance(error, APIConnectionError):
+        return "connection"
+    if isinstance(error, APIStatusError) and error.status_code >= 500:
+        return "server_error"
+    return None
+
+def _retry_after(error):
+    """Return the delay in seconds requested by Retry-After headers, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return None
+
+def call_with_retry(func, deadline=None, max_retries=None):
+    """
+    Call an OpenAI request function, retrying rate limits, timeouts and 5xx errors.
+    
+    Waits follow exponential backoff with jitter, and are never shorter than a
+    Retry-After header on the error. The whole call, including waits, is bounded by
+    ``deadline`` seconds; the remaining time is passed to ``func`` so it can be used
+    as the request timeout.
+    
+    Args:
+        func (callable): Called as ``func(timeout)`` to make one attempt
+        deadline (float): Total seconds allowed (defaults to OPENAI_CALL_DEADLINE)
+        max_retries (int): Maximum retries after the first attempt
+            (defaults to OPENAI_MAX_RETRIES)
+        
+    Returns:
+        The return value of ``func``
+    """
+    deadline = OPENAI_CALL_DEADLINE if deadline is None else deadline
+    max_retries = OPENAI_MAX_RETRIES if max_retries is None else max_retries
+    started = time.monotonic()
+    deadline_at = started + deadline
+    attempt = 0
+    _retry_stats.record_call()
+    
+    while True:
+        attempt_started = time.monotonic()
+        try:
+            return func(max(deadline_at - attempt_started, 1.0))
+        except Exception as e:
+            reason = _retry_reason(e)
+            if reason is None:
+                raise
+            
+            now = time.monotonic()
+            backoff = min(OPENAI_BACKOFF_MAX, OPENAI_BACKOFF_BASE * (2 ** attempt))
+            delay = backoff / 2 + random.uniform(0, backoff / 2)
+            retry_after = _retry_after(e)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            
+            if attempt >= max_retries or now + delay >= deadline_at:
+                _retry_stats.record_exhausted(now - attempt_started)
+                logger.error(f"OpenAI call failed after {attempt + 1} attempts ({reason}): {str(e)}")
+                raise
+            
+            _retry_stats.record_retry(reason, (now - attempt_started) + delay)
+            logger.warning(f"OpenAI call failed ({reason}), retrying in {delay:.1f}s: {str(e)}")
+            time.sleep(delay)
+            attempt += 1
+
+def get_retry_stats():
+    """Return retry counters for OpenAI calls."""
+    return _retry_stats.stats()
+
+# Metrics for calls to the OpenAI API
+OPENAI_DURATION = histogram(
+    "openai_request_duration_seconds", "Duration of OpenAI chat completion calls, including retries",
+    ("model", "cache")
+)
+OPENAI_IN_FLIGHT = gauge("openai_requests_in_flight", "OpenAI calls currently waiting for a response")
+OPENAI_ERRORS = counter("openai_request_errors_total", "OpenAI calls that failed after retries", ("model",))
 
 def generate_openai_response(
     messages, 
     model=DEFAULT_MODEL, 
     temperature=0.7,
     as_json=False,
-    max_tokens=None
+    max_tokens=None,
+    api_key=None,
+    use_cache=None,
+    deadline=None
 ):
     """
     Generate a response from OpenAI's API.
     
+    Identical requests (same model, messages, temperature, JSON mode and token limit)
+    are served from the response cache when it is enabled. By default only
+    deterministic (temperature 0) calls are cached (see ResponseCache.caches); callers
+    pass ``use_cache=True`` for sampled calls whose repeat is acceptable, such as
+    persona batches and analysis, so focus group transcripts stay new on every run.
+    A cache hit reports the token count of the original call.
+    
     Args:
         messages: List of message objects to send to the API
         model: The OpenAI model to use
         temperature: Controls randomness (0-1)
         as_json: Whether to request response as JSON
         max_tokens: Maximum tokens to generate
+        api_key: OpenAI API key for this request (defaults to OPENAI_API_KEY)
+        use_cache: True to cache this call even if it is sampled, False to bypass the
+            response cache (defaults to the cache's policy for the temperature)
+        deadline: Seconds allowed for the call including retries
+            (defaults to OPENAI_CALL_DEADLINE)
         
     Returns:
         ChatCompletion: The API response
         int: Approximate token count used
     """
-    client = get_openai_client()
+    started = time.monotonic()
+    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    key_hash = hash_api_key(api_key) if api_key else None
+    
+    if use_cache is None:
+        use_cache = response_cache.caches(temperature)
+    cache_key = None
+    if use_cache and response_cache.enabled:
+        cache_key = make_cache_key(model, messages, temperature, as_json, max_tokens)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            logger.debug(f"OpenAI response cache hit: {cache_key}")
+            from openai.types.chat import ChatCompletion
+            usage = cached["usage"]
+            OPENAI_DURATION.labels(model, "hit").observe(time.monotonic() - started)
+            record_usage(model, usage.get("prompt_tokens"), usage.get("completion_tokens"),
+                         time.monotonic() - started, cache_hit=True, key_hash=key_hash)
+            return ChatCompletion.model_validate(cached["response"]), usage["total_tokens"]
+    
+    client = get_openai_client(api_key)
+    limiter = get_rate_limiter(api_key)
+    estimated_tokens = estimate_tokens(messages, max_tokens)
     
     # Configure request parameters
     params = {
@@ -76,14 +643,163 @@ def generate_openai_response(
     # Log the request for debugging
     logger.debug(f"OpenAI request: {json.dumps(params, default=str)}")
     
-    # Make the API call
-    response = client.chat.completions.create(**params)
+    def attempt(timeout):
+        # Every attempt, including retries, draws from the key's shared budget
+        if limiter:
+            limiter.acquire(estimated_tokens)
+        with call_slot():
+            return client.chat.completions.create(**params, timeout=timeout)
+    
+    # Make the API call, retrying transient failures
+    try:
+        with OPENAI_IN_FLIGHT.track_inprogress():
+            response = call_with_retry(attempt, deadline=deadline)
+    except Exception:
+        OPENAI_ERRORS.labels(model).inc()
+        raise
+    OPENAI_DURATION.labels(model, "miss").observe(time.monotonic() - started)
     
     # Calculate approximate token usage
     token_count = response.usage.total_tokens
+    if limiter:
+        limiter.adjust(estimated_tokens, token_count)
+    record_usage(model, response.usage.prompt_tokens, response.usage.completion_tokens,
+                 time.monotonic() - started, key_hash=key_hash)
+    
+    # Only complete responses are cached, so truncated output is never replayed
+    if cache_key and response.choices and response.choices[0].finish_reason == "stop":
+        response_cache.set(cache_key, {
+            "response": response.model_dump(mode="json"),
+            "usage": {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens
+            }
+        })
     
     return response, token_count
 
+class ResponseStream:
+    """
+    Iterable over the text deltas of a streamed chat completion.
+    
+    After iteration finishes, ``token_count`` holds the total tokens reported by the
+    API for the whole completion, and ``on_usage`` has been called with its usage.
+    ``on_finish`` is called once, with the error if the stream failed, when iteration
+    ends or the stream is closed, whichever comes first.
+    """
+    
+    def __init__(self, stream, on_usage=None, on_finish=None):
+        self._stream = stream
+        self._on_usage = on_usage
+        self._on_finish = on_finish
+        self.token_count = 0
+    
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                if chunk.usage:
+                    self.token_count = chunk.usage.total_tokens
+                    if self._on_usage:
+                        self._on_usage(chunk.usage)
+                if chunk.choices:
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+        except Exception as e:
+            self._finish(e)
+            raise
+        self._finish()
+    
+    def _finish(self, error=None):
+        on_finish, self._on_finish = self._on_finish, None
+        if on_finish:
+            on_finish(error)
+    
+    def close(self):
+        """Close the underlying HTTP response."""
+        try:
+            self._stream.close()
+        finally:
+            self._finish()
+
+def stream_openai_response(
+    messages,
+    model=DEFAULT_MODEL,
+    temperature=0.7,
+    max_tokens=None,
+    api_key=None
+):
+    """
+    Generate a streamed response from OpenAI's API.
+    
+    Args:
+        messages: List of message objects to send to the API
+        model: The OpenAI model to use
+        temperature: Controls randomness (0-1)
+        max_tokens: Maximum tokens to generate
+        api_key: OpenAI API key for this request (defaults to OPENAI_API_KEY)
+        
+    Returns:
+        ResponseStream: Iterable of text chunks as they are generated
+    
+    Like generate_openai_response, the call counts towards the in-flight and duration
+    metrics and holds a slot of the enclosing limit_concurrent_calls; for a stream
+    these last until it is exhausted or closed.
+    """
+    started = time.monotonic()
+    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    client = get_openai_client(api_key)
+    limiter = get_rate_limiter(api_key)
+    estimated_tokens = estimate_tokens(messages, max_tokens)
+    
+    # Configure request parameters
+    params = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "stream": True,
+        "stream_options": {"include_usage": True}
+    }
+    
+    if max_tokens:
+        params["max_tokens"] = max_tokens
+    
+    # Held from the first attempt until the stream is finished
+    resources = ExitStack()
+    
+    def attempt(timeout):
+        if limiter:
+            limiter.acquire(estimated_tokens)
+        with ExitStack() as slot:
+            slot.enter_context(call_slot())
+            stream = client.chat.completions.create(**params, timeout=timeout)
+            # Keep the slot past this attempt, for as long as the stream is read
+            resources.enter_context(slot.pop_all())
+            return stream
+    
+    def on_usage(usage):
+        if limiter:
+            limiter.adjust(estimated_tokens, usage.total_tokens)
+        record_usage(model, usage.prompt_tokens, usage.completion_tokens, time.monotonic() - started,
+                     key_hash=hash_api_key(api_key) if api_key else None)
+    
+    def on_finish(error):
+        resources.close()
+        if error:
+            OPENAI_ERRORS.labels(model).inc()
+        else:
+            OPENAI_DURATION.labels(model, "miss").observe(time.monotonic() - started)
+    
+    # Only opening the stream is retried; a stream that fails midway is not restarted
+    resources.enter_context(OPENAI_IN_FLIGHT.track_inprogress())
+    try:
+        stream = call_with_retry(attempt)
+    except Exception as e:
+        on_finish(e)
+        raise
+    return ResponseStream(stream, on_usage=on_usage, on_finish=on_finish)
+
 def get_response_text(response):
     """Extract the text content from an OpenAI API response."""
     return response.choices[0].message.content
@@ -1,35 +1,47 @@
 """Persona generator for the Synthetic Market Research Engine."""
 
+import os
 import logging
 from .openai_service import generate_openai_response, get_response_json, DEFAULT_PERSONAS_MODEL
+from .concurrency import map_concurrently
+from .metrics import timed_step
 
 # Configure logging
-logging.basicConfig(level=logging.INFO, 
+logging.basicConfig(level=logging.INFO,
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def generate_personas(target_segment, num_personas=5):
-    """
-    Generate demographically relevant personas based on the target segment.
-    
-    Args:
-        target_segment (str): Description of the target demographic or psychographic segment
-        num_personas (int): Number of personas to generate
-        
-    Returns:
-        list: List of persona dictionaries
-        int: Number of tokens used
-    """
-    logger.info(f"Generating {num_personas} personas for segment: {target_segment}")
-    
-    # Construct the prompt for the OpenAI API
-    system_message = """You are an expert market research consultant with deep understanding of consumer demographics,
-    psychographics, and behavior. Your task is to create realistic, diverse, and detailed personas 
+# Reuse stored persona panels for segments that already have one (see get_or_generate_personas).
+# Off by default, so a study gets a fresh panel unless the caller asks for reuse_panel.
+PERSONA_PANEL_REUSE = os.environ.get("PERSONA_PANEL_REUSE", "0") == "1"
+# Stored panels older than this are regenerated rather than reused (0 for no limit)
+PERSONA_PANEL_MAX_AGE_DAYS = float(os.environ.get("PERSONA_PANEL_MAX_AGE_DAYS", "30"))
+
+# Panels larger than this are split into concurrent batches of at most this size
+PERSONA_SHARD_SIZE = int(os.environ.get("PERSONA_SHARD_SIZE", "8"))
+
+# Each batch of a sharded panel is steered towards a different part of the segment
+# so that independently generated batches do not converge on the same people
+DIVERSITY_HINTS = [
+    "younger members of the segment, early in their career or life stage",
+    "older or more established members of the segment",
+    "budget-conscious members with tight discretionary spending",
+    "affluent members who prioritize quality and convenience over price",
+    "early adopters who are enthusiastic about trying new products",
+    "skeptical late adopters who are hard to convince",
+    "members living in rural areas or small towns",
+    "members living in large cities",
+    "members with family or caregiving responsibilities",
+    "members living alone or without dependents",
+]
+
+SYSTEM_MESSAGE = """You are an expert market research consultant with deep understanding of consumer demographics,
+    psychographics, and behavior. Your task is to create realistic, diverse, and detailed personas
     based on a target market segment description.
-    
+
     Create detailed, realistic personas that match the target segment. Each persona should feel like a real person
     with consistent traits, backgrounds, and believable characteristics.
-    
+
     For each persona, include:
     1. Name and age
     2. Occupation
@@ -43,36 +55,200 @@ def generate_personas(target_segment, num_personas=5):
 
     Response should be formatted as a JSON array of persona objects.
     """
-    
+
+def _extract_personas(data):
+    """
+    Return the list of personas from a parsed response.
+
+    Accepts a bare list, {"personas": [...]}, a single persona object (one with a
+    name), or an object whose only useful value is a list of persona objects.
+    """
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        if isinstance(data.get('personas'), list):
+            return data['personas']
+        if 'name' in data:
+            return [data]
+        for value in data.values():
+            if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+                return value
+    raise ValueError("OpenAI response does not contain a list of personas")
+
+def _dedupe_personas(personas):
+    """Drop personas that repeat an earlier persona's name and occupation."""
+    seen = set()
+    unique = []
+    for persona in personas:
+        key = (
+            str(persona.get('name', '')).strip().lower(),
+            str(persona.get('occupation', '')).strip().lower()
+        )
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(persona)
+    return unique
+
+def _generate_persona_batch(target_segment, num_personas, api_key=None, diversity_hint=None, exclude_names=None,
+                            shard=None):
+    """Generate one batch of personas with a single OpenAI call."""
+    focus_text = ""
+    if shard:
+        # Naming the batch keeps every shard's request distinct, even when hints repeat
+        focus_text += f"\n    This is batch {shard[0]} of {shard[1]}; create people who are different from those in other batches.\n"
+    if diversity_hint:
+        focus_text += f"\n    Focus this group on {diversity_hint}, while still fitting the segment.\n"
+    if exclude_names:
+        focus_text += f"\n    Do not reuse these existing persona names: {', '.join(exclude_names)}\n"
+
     user_message = f"""Generate {num_personas} detailed personas that represent the target segment described below:
-    
+
     Target segment: {target_segment}
-    
+    {focus_text}
     Ensure the personas:
     - Are demographically and psychographically appropriate for the segment
     - Have diverse backgrounds, needs, and preferences while still fitting the segment
     - Include realistic details that would impact their purchasing decisions
     - Have consistent and coherent characteristics
     - Represent different perspectives within the segment
-    
+
     Format as a JSON array of persona objects with the fields mentioned in your instructions.
     """
-    
+
     messages = [
-        {"role": "system", "content": system_message},
+        {"role": "system", "content": SYSTEM_MESSAGE},
         {"role": "user", "content": user_message}
     ]
-    
+
     # Call the OpenAI API to generate personas
     response, token_count = generate_openai_response(
         messages=messages,
         model=DEFAULT_PERSONAS_MODEL,
         temperature=0.8,
-        as_json=True
+        as_json=True,
+        api_key=api_key,
+        use_cache=True  # A repeated shard may reuse its personas; the rest of the run is still sampled
+    )
+
+    return _extract_personas(get_response_json(response)), token_count
+
+@timed_step("generate_personas")
+def generate_personas(target_segment, num_personas=5, api_key=None, shard_size=None):
+    """
+    Generate demographically relevant personas based on the target segment.
+
+    Panels larger than ``shard_size`` are split into batches that are generated
+    concurrently, each numbered and steered towards a different slice of the segment, so
+    no two batches send the same request (or share a cached response). The batches
+    are merged and de-duplicated, and any shortfall is topped up with one more call.
+
+    Args:
+        target_segment (str): Description of the target demographic or psychographic segment
+        num_personas (int): Number of personas to generate
+        api_key (str): OpenAI API key for this request
+        shard_size (int): Maximum personas per OpenAI call (defaults to PERSONA_SHARD_SIZE)
+
+    Returns:
+        list: List of persona dictionaries
+        int: Number of tokens used
+    """
+    logger.info(f"Generating {num_personas} personas for segment: {target_segment}")
+
+    shard_size = shard_size or PERSONA_SHARD_SIZE
+    if num_personas <= shard_size:
+        personas, token_count = _generate_persona_batch(target_segment, num_personas, api_key=api_key)
+        logger.info(f"Generated {len(personas)} personas using {token_count} tokens")
+        return personas, token_count
+
+    # Split the panel into near-equal batches, each with its own diversity hint
+    num_shards = -(-num_personas // shard_size)
+    sizes = [num_personas // num_shards + (1 if i < num_personas % num_shards else 0) for i in range(num_shards)]
+    shards = [(i, size, DIVERSITY_HINTS[i % len(DIVERSITY_HINTS)]) for i, size in enumerate(sizes)]
+
+    results = map_concurrently(
+        lambda shard: _generate_persona_batch(
+            target_segment,
+            shard[1],
+            api_key=api_key,
+            diversity_hint=shard[2],
+            shard=(shard[0] + 1, num_shards)
+        ),
+        shards
     )
+
+    personas = _dedupe_personas([persona for batch, _ in results for persona in batch])
+    token_count = sum(tokens for _, tokens in results)
+
+    # Top up once if batches came back short or overlapped
+    missing = num_personas - len(personas)
+    if missing > 0:
+        extra, extra_tokens = _generate_persona_batch(
+            target_segment,
+            missing,
+            api_key=api_key,
+            exclude_names=[str(p.get('name', '')) for p in personas]
+        )
+        personas = _dedupe_personas(personas + extra)
+        token_count += extra_tokens
+
+    personas = personas[:num_personas]
+    logger.info(f"Generated {len(personas)} personas in {num_shards} shards using {token_count} tokens")
+    return personas, token_count
+
+def get_or_generate_personas(target_segment, num_personas=5, api_key=None, reuse=None, panel_id=None):
+    """
+    Return a persona panel from the panel library, generating and storing it if needed.
     
-    # Parse and return the generated personas
-    personas = get_response_json(response)
+    Panels are stored by normalized target segment and size (see
+    utils.database.use_persona_panel), so a later project researching the same
+    segment reuses the panel instead of calling OpenAI. A panel older than
+    PERSONA_PANEL_MAX_AGE_DAYS is regenerated and replaced. If the database is
+    unavailable, or reuse is off, the panel is generated without being stored.
     
-    logger.info(f"Generated {len(personas)} personas using {token_count} tokens")
-    return personas, token_count
\ No newline at end of file
+    Args:
+        target_segment (str): Description of the target demographic or psychographic segment
+        num_personas (int): Number of personas to generate
+        api_key (str): OpenAI API key for this request
+        reuse (bool): Look for a stored panel first (defaults to PERSONA_PANEL_REUSE)
+        panel_id (int): Use this stored panel rather than matching the segment
+        
+    Returns:
+        list: List of persona dictionaries
+        int: Number of tokens used (0 when a stored panel is reused)
+        dict: ``id`` of the stored panel (None if it could not be stored), whether it
+        was ``reused``, and the ``tokens_saved`` by reusing it
+        
+    Raises:
+        ValueError: If ``panel_id`` does not exist
+    """
+    from .database import use_persona_panel, save_persona_panel
+
+    reuse = PERSONA_PANEL_REUSE if reuse is None else reuse
+    if panel_id is not None:
+        panel = use_persona_panel(panel_id=int(panel_id))
+        if panel is None:
+            raise ValueError(f"Persona panel {panel_id} not found")
+        return panel['personas'], 0, {"id": panel['id'], "reused": True, "tokens_saved": panel['token_count']}
+
+    if reuse:
+        try:
+            panel = use_persona_panel(target_segment, num_personas,
+                                      max_age_days=PERSONA_PANEL_MAX_AGE_DAYS or None)
+        except Exception as e:
+            logger.warning(f"Persona panel lookup failed, generating a new panel: {str(e)}")
+            panel = None
+        if panel:
+            logger.info(f"Reusing persona panel {panel['id']} for segment: {target_segment}")
+            return panel['personas'], 0, {"id": panel['id'], "reused": True, "tokens_saved": panel['token_count']}
+
+    personas, token_count = generate_personas(target_segment, num_personas, api_key=api_key)
+    stored_id = None
+    if reuse:
+        try:
+            # Replaces a panel that was too old to reuse, but not one stored meanwhile
+            stored_id = save_persona_panel(target_segment, num_personas, personas, token_count,
+                                           max_age_days=PERSONA_PANEL_MAX_AGE_DAYS or None)
+        except Exception as e:
+            logger.warning(f"Could not store persona panel: {str(e)}")
+    return personas, token_count, {"id": stored_id, "reused": False, "tokens_saved": 0}
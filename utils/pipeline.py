@@ -0,0 +1,464 @@
+"""Complete research pipeline for the Synthetic Market Research Engine."""
+
+import os
+import time
+import asyncio
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from .persona_generator import get_or_generate_personas
+from .focus_group import simulate_focus_group
+from .analysis import analyze_transcript
+from .concurrency import MAX_CONCURRENT_REQUESTS, limit_concurrent_calls
+from .usage import usage_context, new_run_id
+from .metrics import histogram
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Pipeline stages, in execution order
+STAGES = ("personas", "focus_group", "analysis")
+
+# Most concept x segment combinations a batch may contain
+BATCH_MAX_COMBINATIONS = int(os.environ.get("BATCH_MAX_COMBINATIONS", "100"))
+
+# Stages reported by a batch run: the pipeline stages, then the bulk save
+BATCH_STAGES = STAGES + ("save",)
+
+# Wall-clock time from a stage's first step starting to its last step finishing
+STAGE_DURATION = histogram("research_stage_duration_seconds", "Duration of research pipeline stages", ("stage",))
+
+class Node:
+    """
+    One step of a pipeline graph.
+
+    Args:
+        name (str): Unique node name
+        func (callable): Called with a dict of dependency results by node name;
+            returns ``(value, tokens)``
+        deps (tuple): Names of the nodes whose results this node needs
+        stage (str): Stage the node belongs to, for progress and timing reports
+        blocking (bool): Run on the engine's thread pool (for OpenAI calls) rather
+            than on the event loop (for cheap steps such as stitching)
+    """
+
+    def __init__(self, name, func, deps=(), stage=None, blocking=True):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.stage = stage
+        self.blocking = blocking
+
+class PipelineEngine:
+    """
+    Run a graph of nodes on an asyncio event loop.
+
+    run_research_batch uses it to run the steps of many research runs at once.
+    Each node starts as soon as all of its dependencies have finished, so
+    independent branches overlap. Blocking nodes run on a thread pool of at most
+    ``max_concurrency`` threads. The engine records when each node started and how
+    long it took, and reports stage progress as nodes start and finish: a stage is
+    "running" when its first node starts and "completed" when its last node ends.
+    Nodes run in a copy of the caller's context with their stage as the usage
+    ledger stage, so every OpenAI call is recorded against the step that made it.
+    """
+
+    def __init__(self, nodes, max_concurrency=None, on_stage=None):
+        self.nodes = {node.name: node for node in nodes}
+        self.max_concurrency = max_concurrency or MAX_CONCURRENT_REQUESTS
+        self.on_stage = on_stage or (lambda stage, status: None)
+        self.results = {}
+        self.tokens = {}
+        self.timings = {}
+        self.total_duration = None
+        self._stage_remaining = {}
+        for node in nodes:
+            for dep in node.deps:
+                if dep not in self.nodes:
+                    raise ValueError(f"Node {node.name} depends on unknown node {dep}")
+            if node.stage:
+                self._stage_remaining[node.stage] = self._stage_remaining.get(node.stage, 0) + 1
+
+    async def run(self):
+        """
+        Run every node and return their results.
+
+        Returns:
+            dict: Node results by name. The first exception raised by a node is
+            re-raised after the remaining nodes are cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        run_started = time.perf_counter()
+        stages_started = set()
+        tasks = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="pipeline") as executor:
+
+            async def run_node(node):
+                if node.deps:
+                    await asyncio.gather(*(tasks[dep] for dep in node.deps))
+                inputs = {dep: self.results[dep] for dep in node.deps}
+
+                if node.stage and node.stage not in stages_started:
+                    stages_started.add(node.stage)
+                    self.on_stage(node.stage, "running")
+
+                def call():
+                    with usage_context(stage=node.stage):
+                        return node.func(inputs)
+
+                started = time.perf_counter()
+                if node.blocking:
+                    value, tokens = await loop.run_in_executor(executor, contextvars.copy_context().run, call)
+                else:
+                    value, tokens = call()
+                finished = time.perf_counter()
+
+                self.results[node.name] = value
+                self.tokens[node.name] = tokens
+                self.timings[node.name] = {
+                    "stage": node.stage,
+                    "started": round(started - run_started, 4),
+                    "duration": round(finished - started, 4)
+                }
+                if node.stage:
+                    self._stage_remaining[node.stage] -= 1
+                    if self._stage_remaining[node.stage] == 0:
+                        self.on_stage(node.stage, "completed")
+
+            # Dependencies are looked up by name, so every task exists before any of them runs
+            for name, node in self.nodes.items():
+                tasks[name] = asyncio.ensure_future(run_node(node))
+            try:
+                await asyncio.gather(*tasks.values())
+            except BaseException:
+                for task in tasks.values():
+                    task.cancel()
+                await asyncio.gather(*tasks.values(), return_exceptions=True)
+                raise
+
+        self.total_duration = round(time.perf_counter() - run_started, 4)
+        for stage, timing in self.stage_timings().items():
+            STAGE_DURATION.labels(stage).observe(timing["duration"])
+        return self.results
+
+    def stage_timings(self):
+        """Return when each stage started and finished (seconds from the start of the run)."""
+        stages = {}
+        for timing in self.timings.values():
+            stage = timing["stage"]
+            if not stage:
+                continue
+            finished = round(timing["started"] + timing["duration"], 4)
+            if stage not in stages:
+                stages[stage] = {"started": timing["started"], "finished": finished}
+            else:
+                stages[stage]["started"] = min(stages[stage]["started"], timing["started"])
+                stages[stage]["finished"] = max(stages[stage]["finished"], finished)
+        for timing in stages.values():
+            timing["duration"] = round(timing["finished"] - timing["started"], 4)
+        return stages
+
+    def stage_tokens(self, stage):
+        """Return the tokens used by the nodes of a stage."""
+        return sum(self.tokens.get(name, 0) for name, node in self.nodes.items() if node.stage == stage)
+
+def _research_nodes(prefix, personas_name, product_concept, research_questions, api_key=None,
+                    parallel=False):
+    """
+    Build the focus group and analysis steps of one research run in a batch graph.
+
+    Args:
+        prefix (str): Prepended to every node name, so several runs can share a graph
+        personas_name (str): Name of the node that produces the persona panel
+        parallel (bool): Generate the focus group as concurrent per-question segments
+
+    Returns:
+        list: Nodes named ``<prefix>focus_group`` and ``<prefix>analysis``
+    """
+    focus_group_name = f"{prefix}focus_group"
+
+    def focus_group_node(inputs):
+        return simulate_focus_group(
+            inputs[personas_name], product_concept, research_questions, api_key=api_key, parallel=parallel
+        )
+
+    def analysis_node(inputs):
+        return analyze_transcript(inputs[focus_group_name], product_concept, research_questions, api_key=api_key)
+
+    return [
+        Node(focus_group_name, focus_group_node, [personas_name], stage="focus_group"),
+        Node(f"{prefix}analysis", analysis_node, [focus_group_name], stage="analysis")
+    ]
+
+def run_research_pipeline(target_segment, product_concept, research_questions, num_personas=5,
+                          api_key=None, parallel=False, on_stage=None, on_result=None, reuse_panel=None,
+                          panel_id=None, run_id=None):
+    """
+    Run the complete research pipeline: personas, focus group, and analysis.
+
+    Each stage needs the whole output of the one before it (every focus group
+    segment needs the complete panel, and the analysis reads the whole transcript),
+    so the stages run one after another. The concurrency is inside the stages:
+    persona shards, focus group segments in parallel mode and analysis chunks are
+    each generated concurrently.
+
+    Args:
+        target_segment (str): Description of the target segment
+        product_concept (str): Description of the product or service
+        research_questions (list): List of research questions to discuss
+        num_personas (int): Number of personas to generate
+        api_key (str): OpenAI API key for this request
+        parallel (bool): Generate the focus group as concurrent per-question segments
+        on_stage (callable): Optional callback invoked as ``on_stage(stage, status)``
+            when a stage starts ("running") and finishes ("completed")
+        on_result (callable): Optional callback invoked as ``on_result(stage, value)``
+            with each stage's output as soon as it is available
+        reuse_panel (bool): Reuse a stored persona panel for the segment (defaults to
+            PERSONA_PANEL_REUSE)
+        panel_id (int): Use this stored persona panel
+        run_id (str): Identifies the run's calls in the usage ledger (a new id is
+            generated by default); save the project with it to attribute the usage
+
+    Returns:
+        dict: run_id, personas, transcript, analysis, per-stage token counts, the
+        persona panel used and timings
+    """
+    run_id = run_id or new_run_id()
+    on_stage = on_stage or (lambda stage, status: None)
+    on_result = on_result or (lambda stage, value: None)
+    token_count = {}
+    stage_timings = {}
+    run_started = time.perf_counter()
+
+    def run_stage(stage, func):
+        on_stage(stage, "running")
+        started = time.perf_counter()
+        with usage_context(stage=stage):
+            value, token_count[stage] = func()
+        finished = time.perf_counter()
+        STAGE_DURATION.labels(stage).observe(finished - started)
+        stage_timings[stage] = {
+            "started": round(started - run_started, 4),
+            "finished": round(finished - run_started, 4),
+            "duration": round(finished - started, 4)
+        }
+        on_result(stage, value)
+        on_stage(stage, "completed")
+        return value
+
+    panel_info = {}
+
+    def personas_stage():
+        personas, tokens, panel = get_or_generate_personas(
+            target_segment, num_personas, api_key=api_key, reuse=reuse_panel, panel_id=panel_id
+        )
+        panel_info.update(panel)
+        return personas, tokens
+
+    logger.info(f"Running research pipeline {run_id}")
+    with usage_context(run_id=run_id):
+        personas = run_stage("personas", personas_stage)
+        transcript = run_stage("focus_group", lambda: simulate_focus_group(
+            personas, product_concept, research_questions, api_key=api_key, parallel=parallel
+        ))
+        analysis = run_stage("analysis", lambda: analyze_transcript(
+            transcript, product_concept, research_questions, api_key=api_key
+        ))
+
+    # Combine token counts
+    token_count["total"] = sum(token_count.values())
+    total_duration = round(time.perf_counter() - run_started, 4)
+    logger.info(f"Research pipeline finished in {total_duration:.1f}s using {token_count['total']} tokens")
+
+    return {
+        "run_id": run_id,
+        "personas": personas,
+        "transcript": transcript,
+        "analysis": analysis,
+        "token_count": token_count,
+        "persona_panel": panel_info,
+        "timings": {
+            "total": total_duration,
+            "stages": stage_timings
+        }
+    }
+
+class _StepFailure:
+    """Result of a batch step that raised, passed on to the steps that depend on it."""
+
+    def __init__(self, error):
+        self.error = error
+
+def _isolate(node):
+    """
+    Make a node fail without stopping the rest of the graph.
+
+    The wrapped step returns a _StepFailure instead of raising, and is skipped when
+    any of its inputs failed, so one combination of a batch failing only fails the
+    combinations that depend on the same steps.
+    """
+    func = node.func
+
+    def run(inputs):
+        for value in inputs.values():
+            if isinstance(value, _StepFailure):
+                return value, 0
+        try:
+            return func(inputs)
+        except Exception as e:
+            logger.error(f"Batch step {node.name} failed: {str(e)}")
+            return _StepFailure(e), 0
+
+    return Node(node.name, run, node.deps, stage=node.stage, blocking=node.blocking)
+
+def _in_run(node, run_id):
+    """Record the OpenAI calls of a node in the usage ledger under ``run_id``."""
+    func = node.func
+
+    def run(inputs):
+        with usage_context(run_id=run_id):
+            return func(inputs)
+
+    return Node(node.name, run, node.deps, stage=node.stage, blocking=node.blocking)
+
+def _batch_project_name(product_concept, target_segment, max_length=200):
+    """Name a batch project after its concept and segment, within the project name column."""
+    name = f"{product_concept.strip()} | {target_segment.strip()}"
+    return name if len(name) <= max_length else name[:max_length - 3] + "..."
+
+def run_research_batch(product_concepts, target_segments, research_questions, num_personas=5,
+                       api_key=None, parallel=False, max_concurrency=None, on_stage=None, reuse_panel=None):
+    """
+    Run the research pipeline for every product concept against every target segment.
+
+    Each segment's persona panel is generated once (or taken from the persona panel
+    library) and shared by all the concepts tested against it. Every step of every
+    combination runs in one PipelineEngine graph. At most ``max_concurrency`` OpenAI
+    calls are in flight across the whole batch, including the calls that persona
+    shards, focus group segments and analysis chunks fan out to inside a step (see
+    limit_concurrent_calls). A failed combination does not stop the others. When the
+    graph has finished, the successful combinations are saved as research projects in
+    one transaction with save_research_projects.
+
+    Args:
+        product_concepts (list): Product or service descriptions
+        target_segments (list): Target segment descriptions
+        research_questions (list): Research questions asked in every focus group
+        num_personas (int): Number of personas per segment panel
+        api_key (str): OpenAI API key for this request
+        parallel (bool): Generate each focus group as concurrent segments
+        max_concurrency (int): Maximum concurrent OpenAI calls (defaults to
+            MAX_CONCURRENT_REQUESTS)
+        on_stage (callable): Optional callback invoked as ``on_stage(stage, status)``
+            for each of BATCH_STAGES
+        reuse_panel (bool): Reuse stored persona panels (defaults to PERSONA_PANEL_REUSE)
+
+    Returns:
+        dict: ``projects`` (one entry per combination with its concept, segment,
+        run_id and project_id or error), ``personas_reused`` (successful combinations that
+        used a panel generated or loaded for an earlier combination of the same segment),
+        ``panels_from_library`` (segments whose panel was already stored), per-stage
+        ``token_count`` and ``timings``
+
+    Raises:
+        ValueError: If the batch is empty or larger than BATCH_MAX_COMBINATIONS
+    """
+    from .database import save_research_projects
+
+    combinations = [(c, s) for c in range(len(product_concepts)) for s in range(len(target_segments))]
+    if not combinations:
+        raise ValueError("A batch needs at least one product concept and one target segment")
+    if len(combinations) > BATCH_MAX_COMBINATIONS:
+        raise ValueError(f"A batch may contain at most {BATCH_MAX_COMBINATIONS} combinations, "
+                         f"got {len(combinations)}")
+
+    on_stage = on_stage or (lambda stage, status: None)
+
+    panels = {}
+
+    def panel_node(index, target_segment):
+        def run(inputs):
+            personas, tokens, panels[index] = get_or_generate_personas(
+                target_segment, num_personas, api_key=api_key, reuse=reuse_panel
+            )
+            return personas, tokens
+        return run
+
+    # Each combination is a run in the usage ledger; a shared panel is charged to the
+    # first combination that uses it
+    run_ids = {combination: new_run_id() for combination in combinations}
+    nodes = [
+        _in_run(Node(f"personas:{s}", panel_node(s, target_segment), stage="personas"), run_ids[(0, s)])
+        for s, target_segment in enumerate(target_segments)
+    ]
+    for c, s in combinations:
+        nodes.extend(
+            _in_run(node, run_ids[(c, s)])
+            for node in _research_nodes(f"{c}:{s}:", f"personas:{s}", product_concepts[c], research_questions,
+                                        api_key=api_key, parallel=parallel)
+        )
+    engine = PipelineEngine([_isolate(node) for node in nodes], max_concurrency=max_concurrency,
+                            on_stage=on_stage)
+
+    logger.info(f"Running research batch of {len(combinations)} combinations with {len(nodes)} steps")
+    with limit_concurrent_calls(engine.max_concurrency):
+        results = asyncio.run(engine.run())
+
+    projects = []
+    rows = []
+    for c, s in combinations:
+        entry = {"product_concept": product_concepts[c], "target_segment": target_segments[s],
+                 "run_id": run_ids[(c, s)]}
+        personas = results[f"personas:{s}"]
+        transcript = results[f"{c}:{s}:focus_group"]
+        analysis = results[f"{c}:{s}:analysis"]
+        failure = next((value for value in (personas, transcript, analysis)
+                        if isinstance(value, _StepFailure)), None)
+        if failure:
+            entry["error"] = str(failure.error)
+        else:
+            rows.append((entry, {
+                "name": _batch_project_name(product_concepts[c], target_segments[s]),
+                "product_concept": product_concepts[c],
+                "target_segment": target_segments[s],
+                "research_questions": research_questions,
+                "personas": personas,
+                "transcript": transcript,
+                "analysis": analysis,
+                "run_ids": [run_ids[(c, s)]]
+            }))
+        projects.append(entry)
+
+    # Save every successful combination at once; the whole batch is saved or none of it
+    on_stage("save", "running")
+    if rows:
+        project_ids = save_research_projects([row for _, row in rows])
+        for (entry, _), project_id in zip(rows, project_ids):
+            entry["project_id"] = project_id
+    on_stage("save", "completed")
+
+    token_count = {stage: engine.stage_tokens(stage) for stage in STAGES}
+    token_count["total"] = sum(token_count.values())
+    failed = sum(1 for entry in projects if "error" in entry)
+    succeeded_by_segment = {}
+    for (c, s), entry in zip(combinations, projects):
+        if "error" not in entry:
+            succeeded_by_segment[s] = succeeded_by_segment.get(s, 0) + 1
+    logger.info(f"Research batch finished in {engine.total_duration:.1f}s: {len(rows)} saved, "
+                f"{failed} failed, {token_count['total']} tokens")
+
+    return {
+        "projects": projects,
+        "saved": len(rows),
+        "failed": failed,
+        "personas_reused": sum(max(0, count - 1) for count in succeeded_by_segment.values()),
+        "panels_from_library": sum(1 for panel in panels.values() if panel["reused"]),
+        "token_count": token_count,
+        "timings": {
+            "total": engine.total_duration,
+            "stages": engine.stage_timings()
+        }
+    }
@@ -0,0 +1,267 @@
+"""Content-addressed cache for OpenAI chat completion responses."""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Response cache settings
+RESPONSE_CACHE_ENABLED = os.environ.get("OPENAI_RESPONSE_CACHE", "1") == "1"
+# Sampled (temperature > 0) calls are only cached when this is set, or when the caller
+# passes use_cache=True for a call whose repeat is acceptable (persona batches and
+# analysis); focus group transcripts stay new on every run
+RESPONSE_CACHE_SAMPLED = os.environ.get("OPENAI_RESPONSE_CACHE_SAMPLED", "0") == "1"
+RESPONSE_CACHE_TTL = float(os.environ.get("OPENAI_RESPONSE_CACHE_TTL", "86400"))  # seconds
+RESPONSE_CACHE_MEMORY_ENTRIES = int(os.environ.get("OPENAI_RESPONSE_CACHE_MEMORY_ENTRIES", "256"))
+# Set to an empty string to disable the disk tier
+RESPONSE_CACHE_DIR = os.environ.get(
+    "OPENAI_RESPONSE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "synthetic-market-research", "responses")
+)
+RESPONSE_CACHE_DISK_BYTES = int(os.environ.get("OPENAI_RESPONSE_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+
+def make_cache_key(model, messages, temperature, as_json, max_tokens):
+    """Return the SHA-256 hash identifying a chat completion request."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "as_json": bool(as_json),
+            "max_tokens": max_tokens
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class MemoryTier:
+    """In-process LRU tier holding at most ``max_entries`` entries."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            entry, expires_at = item
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, expires_at):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (entry, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class DiskTier:
+    """
+    Local disk tier storing one JSON file per entry.
+
+    Files are written atomically and their modification time is refreshed on every
+    hit, so when the directory grows past ``max_bytes`` the least recently used
+    files are deleted first.
+    """
+
+    def __init__(self, directory=RESPONSE_CACHE_DIR, max_bytes=RESPONSE_CACHE_DISK_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".json"):
+                    yield os.path.join(root, name)
+
+    def _current_size(self):
+        if self._size is None:
+            self._size = sum(os.path.getsize(path) for path in self._files())
+        return self._size
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                item = json.load(f)
+            expired = item["expires_at"] <= time.time()
+            entry = item["entry"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+        if expired:
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def set(self, key, entry, expires_at):
+        path = self._path(key)
+        data = json.dumps({"expires_at": expires_at, "entry": entry}).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            with self._lock:
+                # Measure before replacing, so a first scan does not count the new file twice
+                size = self._current_size()
+                previous = os.path.getsize(path) if os.path.exists(path) else 0
+                os.replace(tmp_path, path)
+                self._size = size - previous + len(data)
+                if self._size > self.max_bytes:
+                    self._evict()
+        except OSError as e:
+            logger.warning(f"Could not write response cache entry: {str(e)}")
+
+    def _remove(self, path):
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                if self._size is not None:
+                    self._size -= size
+            except OSError:
+                pass
+
+    def _evict(self):
+        """Delete least recently used files until the tier is below 90% of its budget (lock held)."""
+        files = []
+        for path in self._files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+
+        target = self.max_bytes * 0.9
+        size = sum(file_size for _, file_size, _ in files)
+        for _, file_size, path in files:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+                size -= file_size
+            except OSError:
+                pass
+        self._size = size
+
+    def clear(self):
+        with self._lock:
+            for path in list(self._files()):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._size = 0
+
+class ResponseCache:
+    """
+    Two-tier (memory, then disk) cache of chat completion responses.
+
+    Entries are dictionaries holding the serialized response and its token usage, so
+    callers can report the original token counts on a hit.
+    """
+
+    def __init__(self, memory=None, disk=None, ttl=RESPONSE_CACHE_TTL, enabled=RESPONSE_CACHE_ENABLED,
+                 cache_sampled=RESPONSE_CACHE_SAMPLED):
+        self.memory = memory if memory is not None else MemoryTier()
+        self.disk = disk
+        self.ttl = ttl
+        self.enabled = enabled
+        self.cache_sampled = cache_sampled
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def caches(self, temperature):
+        """Return whether calls at this temperature are cached by default."""
+        return self.enabled and (temperature == 0 or self.cache_sampled)
+
+    def get(self, key):
+        """Return the cached entry for a key, or None."""
+        entry = self.memory.get(key)
+        if entry is not None:
+            with self._lock:
+                self.memory_hits += 1
+            return entry
+
+        if self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                # Promote to the memory tier for the remainder of the TTL window
+                self.memory.set(key, entry, time.time() + self.ttl)
+                with self._lock:
+                    self.disk_hits += 1
+                return entry
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, entry):
+        """Store an entry in every tier."""
+        expires_at = time.time() + self.ttl
+        self.memory.set(key, entry, expires_at)
+        if self.disk is not None:
+            self.disk.set(key, entry, expires_at)
+
+    def clear(self):
+        """Drop all cached entries."""
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        """Return hit/miss counters and tier sizes."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "cache_sampled": self.cache_sampled,
+                "memory_entries": len(self.memory),
+                "disk_bytes": self.disk._size if self.disk is not None else None,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": ((self.memory_hits + self.disk_hits) / lookups) if lookups else 0.0
+            }
+
+response_cache = ResponseCache(disk=DiskTier() if RESPONSE_CACHE_DIR else None)
@@ -0,0 +1,185 @@
+"""Token and cost ledger for OpenAI calls."""
+
+import os
+import json
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from datetime import datetime
+from contextlib import contextmanager
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Ledger settings
+USAGE_LEDGER_ENABLED = os.environ.get("USAGE_LEDGER", "1") == "1"
+USAGE_FLUSH_INTERVAL = float(os.environ.get("USAGE_FLUSH_INTERVAL", "2"))  # seconds
+USAGE_BATCH_SIZE = int(os.environ.get("USAGE_BATCH_SIZE", "200"))
+USAGE_QUEUE_SIZE = int(os.environ.get("USAGE_QUEUE_SIZE", "10000"))
+
+# USD per million (prompt, completion) tokens. Override or extend with a JSON object
+# such as {"gpt-4o": [2.5, 10.0]} in OPENAI_PRICES; unknown models are costed at 0.
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+MODEL_PRICES.update({
+    model: tuple(prices) for model, prices in json.loads(os.environ.get("OPENAI_PRICES", "{}")).items()
+})
+
+# Labels attached to every call recorded in the current context (see usage_context)
+_labels = contextvars.ContextVar("usage_labels", default={})
+
+@contextmanager
+def usage_context(**labels):
+    """
+    Attach labels (``stage``, ``run_id``) to the OpenAI calls made inside the block.
+
+    Labels nest: an inner block adds to or overrides the outer block's labels. They
+    follow the work onto worker threads started with map_concurrently and
+    PipelineEngine, which run each call in a copy of the caller's context.
+    """
+    token = _labels.set({**_labels.get(), **{k: v for k, v in labels.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+def current_labels():
+    """Return the labels of the current context."""
+    return dict(_labels.get())
+
+def new_run_id():
+    """Return a new identifier grouping the calls of one research run."""
+    return uuid.uuid4().hex
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """Return the cost in USD of a call, using MODEL_PRICES."""
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return round((prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000, 6)
+
+class UsageLedger:
+    """
+    Buffers usage records and writes them to the database in batches.
+
+    record() only enqueues, so it never waits on the database. A background thread
+    (started on the first record) writes everything queued every ``flush_interval``
+    seconds, or sooner once ``batch_size`` records are waiting, with a single bulk
+    insert. Records are dropped, and counted, when the queue is full or a write
+    fails, so accounting never fails a request.
+    """
+
+    def __init__(self, flush_interval=USAGE_FLUSH_INTERVAL, batch_size=USAGE_BATCH_SIZE,
+                 max_queued=USAGE_QUEUE_SIZE):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+    def record(self, entry):
+        """Queue one usage record (a dict of UsageRecord columns)."""
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        with self._lock:
+            self.recorded += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="usage-ledger", daemon=True)
+                self._thread.start()
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write every queued record now, in the calling thread."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return 0
+
+        from .database import save_usage_records
+        try:
+            save_usage_records(batch)
+        except Exception as e:
+            logger.warning(f"Dropped {len(batch)} usage records: {str(e)}")
+            with self._lock:
+                self.dropped += len(batch)
+            return 0
+        with self._lock:
+            self.written += len(batch)
+            self.batches += 1
+        return len(batch)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def stats(self):
+        """Return ledger counters."""
+        with self._lock:
+            return {
+                "enabled": USAGE_LEDGER_ENABLED,
+                "recorded": self.recorded,
+                "written": self.written,
+                "dropped": self.dropped,
+                "queued": self._queue.qsize(),
+                "batches": self.batches
+            }
+
+usage_ledger = UsageLedger()
+atexit.register(usage_ledger.flush)
+
+def record_usage(model, prompt_tokens, completion_tokens, latency, cache_hit=False, key_hash=None):
+    """
+    Record one OpenAI call in the usage ledger.
+
+    The stage and run id come from the current usage_context. Cache hits are
+    recorded with the original call's token counts and no cost.
+
+    Args:
+        model (str): Model name
+        prompt_tokens (int): Prompt tokens reported by the API
+        completion_tokens (int): Completion tokens reported by the API
+        latency (float): Seconds the call took, including retries
+        cache_hit (bool): Whether the response came from the response cache
+        key_hash (str): hash_api_key of the key used
+    """
+    if not USAGE_LEDGER_ENABLED:
+        return
+    labels = _labels.get()
+    usage_ledger.record({
+        "created_at": datetime.utcnow(),
+        "run_id": labels.get("run_id"),
+        "stage": labels.get("stage"),
+        "model": model,
+        "key_hash": key_hash,
+        "prompt_tokens": prompt_tokens or 0,
+        "completion_tokens": completion_tokens or 0,
+        "total_tokens": (prompt_tokens or 0) + (completion_tokens or 0),
+        "cost_usd": 0.0 if cache_hit else estimate_cost(model, prompt_tokens or 0, completion_tokens or 0),
+        "latency_ms": round(latency * 1000, 1),
+        "cache_hit": bool(cache_hit)
+    })
+
+def get_usage_ledger_stats():
+    """Return statistics for the usage ledger writer."""
+    return usage_ledger.stats()